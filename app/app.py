@@ -1,727 +1,153 @@
 import streamlit as st
 import oracledb
-import hashlib
 import datetime
-import pandas as pd
 import os
 import time
-
-
-
-DB_USER = os.getenv("DB_USER", "new_user")
-DB_PASSWORD = os.getenv("DB_PASSWORD", "password")
-DB_HOST = os.getenv("DB_HOST", "localhost")
-DB_PORT = os.getenv("DB_PORT", "1521")
-DB_SERVICE = os.getenv("DB_SERVICE", "XEPDB1")
-
-
-def init_db():
-    try:
-        with oracledb.connect(user="new_user", password="password", dsn="localhost:1521/XEPDB1") as conn:
-            with conn.cursor() as cursor:
-                # Create users table
-                try:
-                    cursor.execute("SELECT COUNT(*) FROM user_tables WHERE table_name = 'USERS'")
-                    (table_exists,) = cursor.fetchone()
-
-                    if not table_exists:
-                        cursor.execute('''
-                            CREATE TABLE users (
-                                user_id NUMBER GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
-                                username VARCHAR2(100) UNIQUE NOT NULL,
-                                password VARCHAR2(255) NOT NULL,
-                                user_type VARCHAR2(50) NOT NULL,
-                                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                            )
-                        ''')
-                    
-                    
-                except oracledb.DatabaseError as e:
-                    error, = e.args
-                    if error.code != 955:  
-                        raise
-                
-                # Create donors table
-                try:
-                    cursor.execute("SELECT COUNT(*) FROM user_tables WHERE table_name = 'DONORS'")
-                    (table_exists,) = cursor.fetchone()
-
-                    if not table_exists:
-                        cursor.execute('''
-                        CREATE TABLE donors (
-                            donor_id NUMBER GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
-                            user_id NUMBER NOT NULL,
-                            name VARCHAR2(100) NOT NULL,
-                            email VARCHAR2(100),
-                            phone VARCHAR2(50),
-                            street VARCHAR2(200),
-                            city VARCHAR2(100),
-                            CONSTRAINT fk_donors_user_id FOREIGN KEY (user_id) REFERENCES users(user_id)
-                        )
-                        ''')
-                except oracledb.DatabaseError as e:
-                    error, = e.args
-                    if error.code != 955:
-                        raise
-                
-                
-                
-                # Create ngos table
-                try:
-                    cursor.execute("SELECT COUNT(*) FROM user_tables WHERE table_name = 'NGOS'")
-                    (table_exists,) = cursor.fetchone()
-
-                    if not table_exists:
-                        cursor.execute('''
-                        CREATE TABLE ngos (
-                            ngo_id NUMBER GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
-                            user_id NUMBER NOT NULL,
-                            name VARCHAR2(100) NOT NULL,
-                            email VARCHAR2(100),
-                            phone VARCHAR2(50),
-                            street VARCHAR2(200),
-                            city VARCHAR2(100),
-                            CONSTRAINT fk_ngos_user_id FOREIGN KEY (user_id) REFERENCES users(user_id)
-                        )
-                        ''')
-                except oracledb.DatabaseError as e:
-                    error, = e.args
-                    if error.code != 955:
-                        raise
-                
-                
-                
-                # Create food_donations table
-                try:
-                    cursor.execute("SELECT COUNT(*) FROM user_tables WHERE table_name = 'FOOD_DONATIONS'")
-                    (table_exists,) = cursor.fetchone()
-
-                    if not table_exists:
-                        cursor.execute('''
-                        CREATE TABLE food_donations (
-                            donation_id NUMBER GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
-                            donor_id NUMBER NOT NULL,
-                            ngo_id NUMBER,
-                            food_type VARCHAR2(100) NOT NULL,
-                            donation_date DATE NOT NULL,
-                            expiry_date DATE NOT NULL,
-                            quantity NUMBER NOT NULL,
-                            status VARCHAR2(50) DEFAULT 'Available',
-                            CONSTRAINT fk_food_donations_donor_id FOREIGN KEY (donor_id) REFERENCES donors(donor_id),
-                            CONSTRAINT fk_food_donations_ngo_id FOREIGN KEY (ngo_id) REFERENCES ngos(ngo_id)
-                        )
-                        ''')
-                except oracledb.DatabaseError as e:
-                    error, = e.args
-                    if error.code != 955:
-                        raise
-
-                # Add trigger to check donation date
-                try:
-                    cursor.execute("""
-                    CREATE OR REPLACE TRIGGER check_donation_date
-                    BEFORE INSERT ON food_donations
-                    FOR EACH ROW
-                    DECLARE
-                        v_days NUMBER;
-                    BEGIN
-                        v_days := :NEW.expiry_date - :NEW.donation_date;
-                        IF v_days < 0 THEN
-                            RAISE_APPLICATION_ERROR(-20001, 'Expiry date cannot be before donation date');
-                        END IF;
-                    END;
-                    """)
-                    
-                except oracledb.DatabaseError as e:
-                    error, = e.args
-                    if error.code != 955:
-                        raise
-                
-                # Create requests table
-                try:
-                    cursor.execute("SELECT COUNT(*) FROM user_tables WHERE table_name = 'REQUESTS'")
-                    (table_exists,) = cursor.fetchone()
-
-                    if not table_exists:
-                        cursor.execute('''
-                        CREATE TABLE requests (
-                            request_id NUMBER GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
-                            ngo_id NUMBER NOT NULL,
-                            food_type VARCHAR2(100) NOT NULL,
-                            quantity NUMBER NOT NULL,
-                            request_date DATE NOT NULL,
-                            status VARCHAR2(50) DEFAULT 'Pending',
-                            donation_id NUMBER,
-                            CONSTRAINT fk_requests_ngo_id FOREIGN KEY (ngo_id) REFERENCES ngos(ngo_id),
-                            CONSTRAINT fk_requests_donation_id FOREIGN KEY (donation_id) REFERENCES food_donations(donation_id)
-                        )
-                        ''')
-                except oracledb.DatabaseError as e:
-                    error, = e.args
-                    if error.code != 955:
-                        raise
-                
-                
-                
-                
-                conn.commit()
-                
-    except oracledb.DatabaseError as e:
-        print(f"Database error: {e}")
-        raise
-
-# Authentication functions
-def hash_password(password):
-    return hashlib.sha256(password.encode()).hexdigest()
-
-def register_user(username, password, user_type):
-    dsn = f"{DB_HOST}:{DB_PORT}/{DB_SERVICE}"
-    
-    try:
-        with oracledb.connect(user=DB_USER, password=DB_PASSWORD, dsn=dsn) as conn:
-            with conn.cursor() as cursor:
-                user_id_var = cursor.var(oracledb.NUMBER)  # Create bind variable
-                cursor.execute(
-                    "INSERT INTO users (username, password, user_type) VALUES (:1, :2, :3) RETURNING user_id INTO :4",
-                    [username, hash_password(password), user_type, user_id_var]
-                )
-                user_id = user_id_var.getvalue()[0]  
-                conn.commit()
-                return user_id
-    except oracledb.IntegrityError:
-        return None
-
-def authenticate(username, password):
-    dsn = f"{DB_HOST}:{DB_PORT}/{DB_SERVICE}"
-    
-    try:
-        with oracledb.connect(user=DB_USER, password=DB_PASSWORD, dsn=dsn) as conn:
-            with conn.cursor() as cursor:
-                cursor.execute(
-                    "SELECT user_id, user_type FROM users WHERE username = :1 AND password = :2",
-                    [username, hash_password(password)]
-                )
-                result = cursor.fetchone()
-                
-                if result:
-                    return {"user_id": result[0], "user_type": result[1]}
-                return None
-    except oracledb.DatabaseError:
-        return None
-
-# Donor functions
-def register_donor(user_id, name, email, phone, street, city):
-    dsn = f"{DB_HOST}:{DB_PORT}/{DB_SERVICE}"
-    
-    try:
-        with oracledb.connect(user=DB_USER, password=DB_PASSWORD, dsn=dsn) as conn:
-            with conn.cursor() as cursor:
-                # Create the bind variable for donor_id
-                donor_id_var = cursor.var(oracledb.NUMBER)
-                
-                # Insert into donors table
-                cursor.execute(
-                    "INSERT INTO donors (user_id, name, email, phone, street, city) VALUES (:1, :2, :3, :4, :5, :6) RETURNING donor_id INTO :7",
-                    [user_id, name, email, phone, street, city, donor_id_var]
-                )
-                
-                donor_id = donor_id_var.getvalue()[0]  # Get the returned donor_id
-                
-                conn.commit()
-                return donor_id
-    except oracledb.DatabaseError as e:
-        print(f"Error in register_donor: {e}")
-        return None
-
-
-def get_donor_id_by_user_id(user_id):
-    dsn = f"{DB_HOST}:{DB_PORT}/{DB_SERVICE}"
-    
-    try:
-        with oracledb.connect(user=DB_USER, password=DB_PASSWORD, dsn=dsn) as conn:
-            with conn.cursor() as cursor:
-                cursor.execute("SELECT donor_id FROM donors WHERE user_id = :1", [user_id])
-                result = cursor.fetchone()
-                
-                if result:
-                    return result[0]
-                return None
-    except oracledb.DatabaseError:
-        return None
-
-def get_donor_info(donor_id):
-    dsn = f"{DB_HOST}:{DB_PORT}/{DB_SERVICE}"
-    
-    try:
-        with oracledb.connect(user=DB_USER, password=DB_PASSWORD, dsn=dsn) as conn:
-            with conn.cursor() as cursor:
-                cursor.execute('''
-                SELECT d.name, d.email, d.phone, d.street, d.city
-                FROM donors d
-                WHERE d.donor_id = :1
-                ''', [donor_id])
-                
-                result = cursor.fetchone()
-                
-                if result:
-                    return {
-                        "name": result[0],
-                        "email": result[1],
-                        "phone": result[2],
-                        "street": result[3],
-                        "city": result[4]
-                    }
-                return None
-    except oracledb.DatabaseError as e:
-        print(f"Error in get_donor_info: {e}")
-        return None
-
-def create_donation(donor_id, food_type, donation_date, expiry_date, quantity, ngo_id=None):
-    dsn = f"{DB_HOST}:{DB_PORT}/{DB_SERVICE}"
-    
-    try:
-        with oracledb.connect(user=DB_USER, password=DB_PASSWORD, dsn=dsn) as conn:
-            with conn.cursor() as cursor:
-                status = 'Assigned' if ngo_id else 'Available'
-                
-                # Create a bind variable to capture the donation_id
-                donation_id_var = cursor.var(oracledb.NUMBER)
-                
-                cursor.execute('''
-                    INSERT INTO food_donations 
-                    (donor_id, food_type, donation_date, expiry_date, quantity, ngo_id, status) 
-                    VALUES (:1, :2, TO_DATE(:3, 'YYYY-MM-DD'), TO_DATE(:4, 'YYYY-MM-DD'), :5, :6, :7)
-                    RETURNING donation_id INTO :8
-                ''', [donor_id, food_type, donation_date, expiry_date, quantity, ngo_id, status, donation_id_var])
-                
-                donation_id = donation_id_var.getvalue()[0]
-                conn.commit()
-                return donation_id
-    except oracledb.DatabaseError as e:
-        print(f"Error in create_donation: {e}")
-        return None
-
-
-def get_donor_donations(donor_id):
-    dsn = f"{DB_HOST}:{DB_PORT}/{DB_SERVICE}"
-    
-    try:
-        with oracledb.connect(user=DB_USER, password=DB_PASSWORD, dsn=dsn) as conn:
-            with conn.cursor() as cursor:
-                cursor.execute('''
-                SELECT fd.donation_id, fd.food_type, 
-                       TO_CHAR(fd.donation_date, 'YYYY-MM-DD') as donation_date, 
-                       TO_CHAR(fd.expiry_date, 'YYYY-MM-DD') as expiry_date, 
-                       fd.quantity, fd.status, NVL(n.name, 'None') as ngo_name
-                FROM food_donations fd
-                LEFT JOIN ngos n ON fd.ngo_id = n.ngo_id
-                WHERE fd.donor_id = :1
-                ORDER BY fd.donation_date DESC
-                ''', [donor_id])
-                
-                columns = ['donation_id', 'food_type', 'donation_date', 'expiry_date', 
-                           'quantity', 'status', 'ngo_name']
-                
-                result = []
-                for row in cursor:
-                    result.append(dict(zip(columns, row)))
-                
-                return result
-    except oracledb.DatabaseError as e:
-        print(f"Error in get_donor_donations: {e}")
-        return []
-
-# NGO functions
-def register_ngo(user_id, name, email, phone, street, city):
-    dsn = f"{DB_HOST}:{DB_PORT}/{DB_SERVICE}"
-    
-    try:
-        with oracledb.connect(user=DB_USER, password=DB_PASSWORD, dsn=dsn) as conn:
-            with conn.cursor() as cursor:
-                # Create bind variable for ngo_id
-                ngo_id_var = cursor.var(oracledb.NUMBER)
-
-                # Insert into ngos table
-                cursor.execute(
-                    "INSERT INTO ngos (user_id, name, email, phone, street, city) VALUES (:1, :2, :3, :4, :5, :6) RETURNING ngo_id INTO :7",
-                    [user_id, name, email, phone, street, city, ngo_id_var]
-                )
-                ngo_id = ngo_id_var.getvalue()[0]  # Get actual value
-
-                conn.commit()
-                return ngo_id
-    except oracledb.DatabaseError as e:
-        print(f"Error in register_ngo: {e}")
-        return None
-
-
-def get_ngo_id_by_user_id(user_id):
-    dsn = f"{DB_HOST}:{DB_PORT}/{DB_SERVICE}"
-    
-    try:
-        with oracledb.connect(user=DB_USER, password=DB_PASSWORD, dsn=dsn) as conn:
-            with conn.cursor() as cursor:
-                cursor.execute("SELECT ngo_id FROM ngos WHERE user_id = :1", [user_id])
-                result = cursor.fetchone()
-                
-                if result:
-                    return result[0]
-                return None
-    except oracledb.DatabaseError:
-        return None
-
-def get_ngo_info(ngo_id):
-    dsn = f"{DB_HOST}:{DB_PORT}/{DB_SERVICE}"
-    
-    try:
-        with oracledb.connect(user=DB_USER, password=DB_PASSWORD, dsn=dsn) as conn:
-            with conn.cursor() as cursor:
-                
-                cursor.execute('''
-                SELECT n.name, n.email, n.phone, n.street, n.city
-                FROM ngos n
-                WHERE n.ngo_id = :1
-                ''', [ngo_id])
-                
-                result = cursor.fetchone()
-                
-                if result:
-                    return {
-                        "name": result[0],
-                        "email": result[1],
-                        "phone": result[2],
-                        "street": result[3],
-                        "city": result[4]
-                    }
-                return None
-    except oracledb.DatabaseError as e:
-        print(f"Error in get_ngo_info: {e}")
-        return None
-
-def create_request(ngo_id, food_type, quantity):
-    dsn = f"{DB_HOST}:{DB_PORT}/{DB_SERVICE}"
-    
-    try:
-        with oracledb.connect(user=DB_USER, password=DB_PASSWORD, dsn=dsn) as conn:
-            with conn.cursor() as cursor:
-                request_date = datetime.date.today().isoformat()
-                
-                # Create bind variable for request_id
-                request_id_var = cursor.var(oracledb.NUMBER)
-                
-                cursor.execute('''
-                    INSERT INTO requests (ngo_id, food_type, quantity, request_date, status) 
-                    VALUES (:1, :2, :3, TO_DATE(:4, 'YYYY-MM-DD'), 'Pending')
-                    RETURNING request_id INTO :5
-                ''', [ngo_id, food_type, quantity, request_date, request_id_var])
-                
-                request_id = request_id_var.getvalue()[0]  # Retrieve actual ID
-                conn.commit()
-                return request_id
-    except oracledb.DatabaseError as e:
-        print(f"Error in create_request: {e}")
-        return None
-
-def get_all_pending_requests():
-    dsn = f"{DB_HOST}:{DB_PORT}/{DB_SERVICE}"
-    
-    try:
-        with oracledb.connect(user=DB_USER, password=DB_PASSWORD, dsn=dsn) as conn:
-            with conn.cursor() as cursor:
-                cursor.execute('''
-                SELECT r.request_id, r.food_type, r.quantity, 
-                       TO_CHAR(r.request_date, 'YYYY-MM-DD') as request_date, 
-                       r.status, n.ngo_id, n.name as ngo_name
-                FROM requests r
-                JOIN ngos n ON r.ngo_id = n.ngo_id
-                WHERE r.status = 'Pending'
-                ORDER BY r.request_date
-                ''')
-                
-                columns = ['request_id', 'food_type', 'quantity', 'request_date', 
-                           'status', 'ngo_id', 'ngo_name']
-                
-                result = []
-                for row in cursor:
-                    result.append(dict(zip(columns, row)))
-                
-                return result
-    except oracledb.DatabaseError as e:
-        print(f"Error in get_all_pending_requests: {e}")
-        return []
-
-def create_donation(donor_id, food_type, donation_date, expiry_date, quantity, ngo_id):
-    dsn = f"{DB_HOST}:{DB_PORT}/{DB_SERVICE}"
-    
-    try:
-        with oracledb.connect(user=DB_USER, password=DB_PASSWORD, dsn=dsn) as conn:
-            with conn.cursor() as cursor:
-                # Create a bind variable to capture the donation_id
-                donation_id_var = cursor.var(oracledb.NUMBER)
-                
-                cursor.execute('''
-                    INSERT INTO food_donations 
-                    (donor_id, food_type, donation_date, expiry_date, quantity, ngo_id, status) 
-                    VALUES (:1, :2, TO_DATE(:3, 'YYYY-MM-DD'), TO_DATE(:4, 'YYYY-MM-DD'), :5, :6, 'Assigned')
-                    RETURNING donation_id INTO :7
-                ''', [donor_id, food_type, donation_date, expiry_date, quantity, ngo_id, donation_id_var])
-                
-                donation_id = donation_id_var.getvalue()[0]
-                conn.commit()
-                return donation_id
-    except oracledb.DatabaseError as e:
-        print(f"Error in create_donation: {e}")
-        return None
-
-def create_donation_for_request(donor_id, food_type, donation_date, expiry_date, quantity, ngo_id, request_id):
-    dsn = f"{DB_HOST}:{DB_PORT}/{DB_SERVICE}"
-    
-    try:
-        with oracledb.connect(user=DB_USER, password=DB_PASSWORD, dsn=dsn) as conn:
-            with conn.cursor() as cursor:
-                # Create a bind variable to capture the donation_id
-                donation_id_var = cursor.var(oracledb.NUMBER)
-                
-                # Insert the donation
-                cursor.execute('''
-                    INSERT INTO food_donations 
-                    (donor_id, food_type, donation_date, expiry_date, quantity, ngo_id, status) 
-                    VALUES (:1, :2, TO_DATE(:3, 'YYYY-MM-DD'), TO_DATE(:4, 'YYYY-MM-DD'), :5, :6, 'Assigned')
-                    RETURNING donation_id INTO :7
-                ''', [donor_id, food_type, donation_date, expiry_date, quantity, ngo_id, donation_id_var])
-                
-                donation_id = donation_id_var.getvalue()[0]
-                
-                # Update request with donation_id and status
-                cursor.execute('''
-                    UPDATE requests 
-                    SET status = 'Fulfilled',
-                        donation_id = :1
-                    WHERE request_id = :2
-                ''', [donation_id, request_id])
-                
-                conn.commit()
-                return donation_id
-    except oracledb.DatabaseError as e:
-        print(f"Error in create_donation_for_request: {e}")
-        return None
-
-
-
-
-
-def get_ngo_requests(ngo_id):
-    dsn = f"{DB_HOST}:{DB_PORT}/{DB_SERVICE}"
-    
-    try:
-        with oracledb.connect(user=DB_USER, password=DB_PASSWORD, dsn=dsn) as conn:
-            with conn.cursor() as cursor:
-                # Create and call PL/SQL procedure
-                plsql = """
-                CREATE OR REPLACE PROCEDURE get_ngo_request_count(
-                    p_ngo_id IN NUMBER,
-                    p_count OUT NUMBER
-                ) IS
-                BEGIN
-                    SELECT COUNT(*) INTO p_count 
-                    FROM requests 
-                    WHERE ngo_id = p_ngo_id;
-                END;
-                """
-                
-                # Create procedure
-                cursor.execute(plsql)
-                
-                # Create output variable
-                count_var = cursor.var(oracledb.NUMBER)
-                
-                # Execute procedure
-                cursor.callproc("get_ngo_request_count", [ngo_id, count_var])
-                
-                # If no requests, return empty list
-                if count_var.getvalue() == 0:
-                    return []
-                    
-                # If has requests, get them with regular SQL
-                cursor.execute('''
-                    SELECT request_id, food_type, quantity, 
-                           TO_CHAR(request_date, 'YYYY-MM-DD') as request_date, 
-                           status
-                    FROM requests
-                    WHERE ngo_id = :1
-                    ORDER BY request_date DESC
-                ''', [ngo_id])
-                
-                columns = ['request_id', 'food_type', 'quantity', 'request_date', 'status']
-                return [dict(zip(columns, row)) for row in cursor.fetchall()]
-                
-    except oracledb.DatabaseError as e:
-        print(f"Error in get_ngo_requests: {e}")
-        return []
-
-def get_all_ngos():
-    dsn = f"{DB_HOST}:{DB_PORT}/{DB_SERVICE}"
-    
-    try:
-        with oracledb.connect(user=DB_USER, password=DB_PASSWORD, dsn=dsn) as conn:
-            with conn.cursor() as cursor:
-                cursor.execute("SELECT ngo_id, name FROM ngos ORDER BY name")
-                return cursor.fetchall()
-    except oracledb.DatabaseError as e:
-        print(f"Error in get_all_ngos: {e}")
-        return []
-
-# Analytics functions
-def get_donation_statistics():
-    dsn = f"{DB_HOST}:{DB_PORT}/{DB_SERVICE}"
-    
-    try:
-        with oracledb.connect(user=DB_USER, password=DB_PASSWORD, dsn=dsn) as conn:
-            with conn.cursor() as cursor:
-                # Using GROUP BY for analytics
-                cursor.execute('''
-                SELECT 
-                    food_type, 
-                    COUNT(donation_id) as total_donations,
-                    SUM(quantity) as total_quantity,
-                    AVG(quantity) as avg_quantity,
-                    TO_CHAR(MIN(donation_date), 'YYYY-MM-DD') as first_donation,
-                    TO_CHAR(MAX(donation_date), 'YYYY-MM-DD') as last_donation
-                FROM food_donations
-                GROUP BY food_type
-                ORDER BY total_quantity DESC
-                ''')
-                
-                columns = ['food_type', 'total_donations', 'total_quantity', 
-                           'avg_quantity', 'first_donation', 'last_donation']
-                
-                result = []
-                for row in cursor:
-                    result.append(dict(zip(columns, row)))
-                
-                return result
-    except oracledb.DatabaseError as e:
-        print(f"Error in get_donation_statistics: {e}")
-        return []
-
-def get_donation_trends():
-    dsn = f"{DB_HOST}:{DB_PORT}/{DB_SERVICE}"
-    
-    try:
-        with oracledb.connect(user=DB_USER, password=DB_PASSWORD, dsn=dsn) as conn:
-            with conn.cursor() as cursor:
-                # Using Oracle's date functions for analytics
-                cursor.execute('''
-                SELECT 
-                    TO_CHAR(donation_date, 'YYYY-MM') as month,
-                    COUNT(donation_id) as donation_count,
-                    SUM(quantity) as total_quantity,
-                    (SELECT COUNT(DISTINCT donor_id) 
-                     FROM food_donations fd2 
-                     WHERE TO_CHAR(fd2.donation_date, 'YYYY-MM') = TO_CHAR(fd.donation_date, 'YYYY-MM')
-                    ) as active_donors
-                FROM food_donations fd
-                WHERE donation_date >= ADD_MONTHS(TRUNC(SYSDATE), -12)
-                GROUP BY TO_CHAR(donation_date, 'YYYY-MM')
-                ORDER BY month
-                ''')
-                
-                columns = ['month', 'donation_count', 'total_quantity', 'active_donors']
-                
-                result = []
-                for row in cursor:
-                    result.append(dict(zip(columns, row)))
-                
-                return result
-    except oracledb.DatabaseError as e:
-        print(f"Error in get_donation_trends: {e}")
-        return []
-
-def get_ngo_donation_distribution():
-    dsn = f"{DB_HOST}:{DB_PORT}/{DB_SERVICE}"
-    
-    try:
-        with oracledb.connect(user=DB_USER, password=DB_PASSWORD, dsn=dsn) as conn:
-            with conn.cursor() as cursor:
-                # Using JOIN and GROUP BY together
-                cursor.execute('''
-                SELECT 
-                    n.name as ngo_name,
-                    COUNT(fd.donation_id) as donations_received,
-                    SUM(fd.quantity) as total_quantity
-                FROM ngos n
-                JOIN food_donations fd ON n.ngo_id = fd.ngo_id
-                GROUP BY n.ngo_id, n.name
-                ORDER BY total_quantity DESC
-                ''')
-                
-                columns = ['ngo_name', 'donations_received', 'total_quantity']
-                
-                result = []
-                for row in cursor:
-                    result.append(dict(zip(columns, row)))
-                
-                return result
-    except oracledb.DatabaseError as e:
-        print(f"Error in get_ngo_donation_distribution: {e}")
-        return []
-
-def get_top_donors():
-    dsn = f"{DB_HOST}:{DB_PORT}/{DB_SERVICE}"
-    
-    try:
-        with oracledb.connect(user=DB_USER, password=DB_PASSWORD, dsn=dsn) as conn:
-            with conn.cursor() as cursor:
-                # Create PL/SQL function
-                plsql = """
-                CREATE OR REPLACE FUNCTION get_donor_count
-                RETURN NUMBER IS
-                    v_count NUMBER;
-                BEGIN
-                    SELECT COUNT(DISTINCT donor_id) 
-                    INTO v_count 
-                    FROM food_donations;
-                    RETURN v_count;
-                END;
-                """
-                
-                # Create function
-                cursor.execute(plsql)
-                
-                # Create output variable and execute function correctly
-                result = cursor.var(oracledb.NUMBER)
-                cursor.execute("BEGIN :result := get_donor_count(); END;", {'result': result})
-                donor_count = result.getvalue()
-                
-                # If no donors, return empty list
-                if donor_count == 0:
-                    return []
-                    
-                # If has donors, get them with regular SQL
-                cursor.execute('''
-                    SELECT 
-                        d.name as donor_name,
-                        COUNT(fd.donation_id) as donation_count,
-                        SUM(fd.quantity) as total_donated
-                    FROM donors d
-                    JOIN food_donations fd ON d.donor_id = fd.donor_id
-                    GROUP BY d.donor_id, d.name
-                    ORDER BY total_donated DESC
-                    FETCH FIRST 10 ROWS ONLY
-                ''')
-                
-                columns = ['donor_name', 'donation_count', 'total_donated']
-                return [dict(zip(columns, row)) for row in cursor.fetchall()]
-                
-    except oracledb.DatabaseError as e:
-        print(f"Error in get_top_donors: {e}")
-        return []
+import json
+import secrets
+import tempfile
+
+# The data layer lives in imported modules so that its pool, caches and
+# queues persist across reruns instead of being rebuilt with this script
+from db import (
+    DB_CALL_TIMEOUT,
+    WRITE_PENDING,
+    authenticate,
+    call_timeout,
+    claim_donation,
+    claim_next_available,
+    create_donation,
+    create_donation_for_request,
+    create_request,
+    get_all_ngos,
+    get_all_pending_requests,
+    get_available_donations,
+    get_columnar_since,
+    get_donation_statistics,
+    get_donation_statistics_approx,
+    get_donation_statistics_columnar,
+    get_donation_trends,
+    get_donation_trends_approx,
+    get_donation_trends_columnar,
+    get_donor_donations,
+    get_donor_id_by_user_id,
+    get_donor_info,
+    get_expected_shortfalls,
+    get_nearest_ngos,
+    get_ngo_donation_distribution,
+    get_ngo_donation_distribution_columnar,
+    get_ngo_id_by_user_id,
+    get_ngo_info,
+    get_ngo_requests,
+    get_ngo_shortfalls,
+    get_proximity_index,
+    get_top_donors,
+    get_top_donors_columnar,
+    register_account,
+    search_available_donations,
+    search_pending_requests,
+    track_stale_reads,
+    warm_up,
+)
+from export import EXPORT_FORMATS, export_rows
+from passwords import PasswordHasherBusy
+from prefetch import start_prefetch, take_prefetched
+from profiler import profiling_enabled, run_profiled
+from shards import shard_for_city, use_shard
+import streamlit.components.v1 as components
+from store import get_store
+
+
+CSS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static", "style.css")
+
+SESSION_TTL = int(os.getenv("SESSION_TTL", str(8 * 60 * 60)))
+SESSION_COOKIE = "session"
+
+# Where the analytics tabs get their numbers: the database, this process's
+# in-memory columns (exact, refreshed every few seconds) or the sketches
+ANALYTICS_MODES = ["Database", "In-memory (fastest)", "Approximate (~1% error)"]
+
+# Status colours for the My Requests grid (orange, green, red)
+STATUS_MARKERS = {"Pending": "🟠", "Fulfilled": "🟢", "Cancelled": "🔴"}
+
+# Session state that has to survive a request landing on another replica
+SESSION_KEYS = ("authenticated", "user_id", "user_type", "entity_id", "shard", "donating_to_request")
+
+
+# Shared session functions
+def start_session():
+    token = secrets.token_urlsafe(32)
+    st.session_state.session_token = token
+    save_session()
+
+def save_session():
+    token = st.session_state.get("session_token")
+    if token:
+        get_store().set(
+            f"session:{token}",
+            {key: st.session_state.get(key) for key in SESSION_KEYS},
+            SESSION_TTL
+        )
+
+def restore_session():
+    # The cookie is sent when the browser opens the app's websocket, so a
+    # reload or a request landing on another replica finds the session
+    token = st.context.cookies.get(SESSION_COOKIE)
+    if not token:
+        return
+
+    session = get_store().get(f"session:{token}")
+    if session:
+        for key, value in session.items():
+            st.session_state[key] = value
+        st.session_state.session_token = token
+
+def sync_session_cookie():
+    # Streamlit can only set cookies from the page, so a one-pixel frame
+    # writes (or expires) it. The markup is the same on every rerun, so the
+    # frame is only reloaded when the token changes
+    token = st.session_state.get("session_token")
+    if token:
+        value, max_age = token, SESSION_TTL
+    elif st.context.cookies.get(SESSION_COOKIE):
+        value, max_age = "", 0
+    else:
+        return
+    script = (
+        "<script>"
+        "const secure = window.parent.location.protocol === 'https:' ? '; Secure' : '';"
+        f"window.parent.document.cookie = {json.dumps(f'{SESSION_COOKIE}={value}')}"
+        f" + '; Max-Age={max_age}; Path=/; SameSite=Strict' + secure;"
+        "</script>"
+    )
+    if hasattr(st, "iframe"):
+        st.iframe(script, height=1)
+    else:
+        components.html(script, height=0)
+
+def end_session():
+    token = st.session_state.get("session_token")
+    if token:
+        get_store().delete(f"session:{token}")
+        st.session_state.session_token = None
+
+    st.session_state.authenticated = False
+    st.session_state.user_id = None
+    st.session_state.user_type = None
+    st.session_state.entity_id = None
+    st.session_state.shard = None
+    st.session_state.donating_to_request = None
+    st.session_state.prefetch = None
+
+@st.cache_resource
+def load_css():
+    # Read and minified once per process rather than on every rerun
+    with open(CSS_PATH, encoding="utf-8") as f:
+        return " ".join(f.read().split())
 
 # Main Streamlit app
 def main():
     
-    # Initialize the database
-    init_db()
     # Set page configuration and custom CSS
     st.set_page_config(
         page_title="Food Waste Management System",
@@ -731,81 +157,7 @@ def main():
     )
     
     # Custom CSS for a professional look
-    st.markdown("""
-    <style>
-    .main {
-        background-color: #f8f9fa;
-    }
-    .stButton button {
-        background-color: #1E88E5;
-        color: white;
-        border-radius: 5px;
-        padding: 0.5rem 1rem;
-        font-weight: bold;
-    }
-    .stTextInput > div > div > input {
-        border-radius: 5px;
-    }
-    .st-eb {
-        border-radius: 5px;
-    }
-    h1, h2, h3 {
-        color: #1E3A8A;
-    }
-    .highlight {
-        background-color: #f0f7ff;
-        padding: 20px;
-        border-radius: 10px;
-        border-left: 5px solid #1E88E5;
-        color: black;
-    }
-    .card {
-        background-color: white;
-        border-radius: 10px;
-        padding: 20px;
-        box-shadow: 0 4px 6px rgba(0, 0, 0, 0.1);
-        margin-bottom: 20px;
-        color: black;
-    }
-    .success-message {
-        background-color: #D5F5E3;
-        color: #196F3D;
-        padding: 10px;
-        border-radius: 5px;
-        margin: 10px 0;
-    }
-    .error-message {
-        background-color: #FADBD8;
-        color: #943126;
-        padding: 10px;
-        border-radius: 5px;
-        margin: 10px 0;
-    }
-    .info-message {
-        background-color: #D6EAF8;
-        color: #21618C;
-        padding: 10px;
-        border-radius: 5px;
-        margin: 10px 0;
-    }
-    .dashboard-stats {
-        display: flex;
-        justify-content: space-between;
-        flex-wrap: wrap;
-    }
-    .stat-card {
-        background-color: white;
-        border-radius: 10px;
-        padding: 15px;
-        box-shadow: 0 4px 6px rgba(0, 0, 0, 0.1);
-        margin: 10px 0;
-        min-width: 200px;
-        flex: 1;
-        margin-right: 10px;
-        color: black;
-    }
-    </style>
-    """, unsafe_allow_html=True)
+    st.markdown(f"<style>{load_css()}</style>", unsafe_allow_html=True)
     
     # Session state initialization
     if 'authenticated' not in st.session_state:
@@ -816,15 +168,45 @@ def main():
         st.session_state.user_type = None
     if 'entity_id' not in st.session_state:
         st.session_state.entity_id = None
+    if 'shard' not in st.session_state:
+        st.session_state.shard = None
     
-    # Navigation based on authentication state
+    # Pick up a session started on another replica
     if not st.session_state.authenticated:
-        show_login_page()
-    else:
-        if st.session_state.user_type == 'Donor':
-            show_donor_dashboard()
-        elif st.session_state.user_type == 'NGO':
-            show_ngo_dashboard()
+        restore_session()
+    sync_session_cookie()
+    
+    # Schema probes, pool and reference data are set up once per process. The
+    # login page doesn't touch the database, so it renders without waiting
+    warm_up(wait=st.session_state.authenticated)
+    
+    # Filled in below if any read view had to fall back to saved data
+    stale_banner = st.empty()
+    stale_reads = track_stale_reads()
+    
+    # Navigation based on authentication state; every data call below goes
+    # to the shard that owns this user's city and gives up on a round trip
+    # that takes longer than DB_CALL_TIMEOUT
+    with use_shard(st.session_state.shard), call_timeout(DB_CALL_TIMEOUT):
+        if not st.session_state.authenticated:
+            show_login_page()
+        else:
+            try:
+                if st.session_state.user_type == 'Donor':
+                    show_donor_dashboard()
+                elif st.session_state.user_type == 'NGO':
+                    show_ngo_dashboard()
+            finally:
+                # Prefetched results are only good for the first render,
+                # including one cut short by st.rerun()
+                st.session_state.prefetch = None
+
+    if stale_reads:
+        minutes = int((time.time() - min(stale_reads.values())) // 60)
+        stale_banner.warning(
+            f"⚠️ The database is not responding. Some of this page is stale: it shows data "
+            f"saved {f'{minutes} min' if minutes else 'less than a minute'} ago."
+        )
 
 def show_login_page():
     st.title("Food Waste Management System")
@@ -863,17 +245,28 @@ def show_login_page():
             with login_col1:
                 if st.button("Login", key="login_button"):
                     if login_username and login_password:
-                        user = authenticate(login_username, login_password)
+                        warm_up()
+                        try:
+                            user = authenticate(login_username, login_password)
+                        except PasswordHasherBusy as e:
+                            print(f"Error in authenticate: {e}")
+                            st.error("We're handling a lot of sign-ins right now. Please try again in a moment.")
+                            st.stop()
                         if user:
                             st.session_state.authenticated = True
                             st.session_state.user_id = user["user_id"]
                             st.session_state.user_type = user["user_type"]
+                            st.session_state.shard = user["shard"]
+
+                            with use_shard(user["shard"]):
+                                if user["user_type"] == "Donor":
+                                    st.session_state.entity_id = get_donor_id_by_user_id(user["user_id"])
+                                else:
+                                    st.session_state.entity_id = get_ngo_id_by_user_id(user["user_id"])
+                                # Dashboard queries run while the success message and rerun go by
+                                st.session_state.prefetch = start_prefetch(user["user_type"], st.session_state.entity_id)
                             
-                            if user["user_type"] == "Donor":
-                                st.session_state.entity_id = get_donor_id_by_user_id(user["user_id"])
-                            else:
-                                st.session_state.entity_id = get_ngo_id_by_user_id(user["user_id"])
-                            
+                            start_session()
                             st.success(f"Welcome back! You're logged in as a {user['user_type']}.")
                             st.rerun()
                         else:
@@ -905,30 +298,136 @@ def show_login_page():
                 elif not (signup_username and signup_password and name and email and phone and street and city):
                     st.warning("Please fill in all fields.")
                 else:
-                    user_id = register_user(signup_username, signup_password, user_type)
-                    
-                    if user_id:
-                        if user_type == "Donor":
-                            entity_id = register_donor(user_id, name, email, phone, street, city)
-                            st.session_state.entity_id = entity_id
-                        else:  # NGO
-                            entity_id = register_ngo(user_id, name, email, phone, street, city)
-                            st.session_state.entity_id = entity_id
-                        
+                    warm_up()
+                    # The account and everything it creates live in its city's shard
+                    shard = shard_for_city(city)
+                    with use_shard(shard):
+                        try:
+                            account = register_account(signup_username, signup_password, user_type,
+                                                       name, email, phone, street, city)
+                        except PasswordHasherBusy as e:
+                            print(f"Error in register_account: {e}")
+                            st.error("We're handling a lot of sign-ups right now. Please try again in a moment.")
+                            st.stop()
+                        if account:
+                            st.session_state.prefetch = start_prefetch(user_type, account[1])
+
+                    if account:
+                        user_id, entity_id = account
                         st.session_state.authenticated = True
                         st.session_state.user_id = user_id
+                        st.session_state.entity_id = entity_id
                         st.session_state.user_type = user_type
+                        st.session_state.shard = shard
+                        start_session()
                         
                         st.success("Account created successfully!")
                         st.rerun()
                     else:
                         st.error("Username already exists. Please choose a different username.")
 
+def show_export_controls(dataset, statuses, key, **scope):
+    with st.expander("Export history"):
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            start_date = st.date_input("From", datetime.date.today() - datetime.timedelta(days=365), key=f"{key}_from")
+        with col2:
+            end_date = st.date_input("To", datetime.date.today(), key=f"{key}_to")
+        with col3:
+            fmt = st.selectbox("Format", list(EXPORT_FORMATS), key=f"{key}_format")
+
+        col1, col2 = st.columns(2)
+        with col1:
+            food_type = st.text_input("Food Type (optional)", key=f"{key}_food_type")
+        with col2:
+            status = st.selectbox("Status", ["All"] + statuses, key=f"{key}_status")
+
+        filters = dict(
+            start_date=start_date,
+            end_date=end_date,
+            food_type=food_type or None,
+            status=None if status == "All" else status,
+            **scope
+        )
+        shard = st.session_state.shard
+        mime, extension = EXPORT_FORMATS[fmt]
+        # A deferred download: nothing is queried or buffered on reruns, only
+        # when the button is clicked
+        st.download_button(
+            "Download",
+            data=lambda: export_download(shard, fmt, dataset, filters),
+            file_name=f"{dataset}_{start_date}_{end_date}.{extension}",
+            mime=mime,
+            on_click="ignore",
+            key=f"{key}_download"
+        )
+
+def export_download(shard, fmt, dataset, filters):
+    # Runs on a server thread outside the script run, so the session's shard
+    # is passed in. Rows are streamed from the database into a temporary file
+    # chunk by chunk, and the file is closed once its bytes are handed over
+    with use_shard(shard), tempfile.TemporaryFile() as export_file:
+        try:
+            export_rows(export_file, fmt, dataset, **filters)
+        except (oracledb.DatabaseError, RuntimeError) as e:
+            print(f"Error in export_rows: {e}")
+            raise
+        export_file.seek(0)
+        return export_file.read()
+
+def prefetched(func, *args):
+    # Awaits the result of a query started at login, if there is one
+    return take_prefetched(st.session_state.get("prefetch"), func, *args)
+
+def search_page(key, query):
+    # Page of results for the current query; a new query starts on page one
+    if st.session_state.get(f"{key}_query") != query:
+        st.session_state[f"{key}_query"] = query
+        st.session_state[f"{key}_page"] = 0
+    return st.session_state[f"{key}_page"]
+
+def show_search_pager(key, has_more):
+    page = st.session_state[f"{key}_page"]
+    col1, col2, col3 = st.columns([1, 2, 1])
+    with col1:
+        if page > 0 and st.button("Previous", key=f"{key}_prev"):
+            st.session_state[f"{key}_page"] = page - 1
+            st.rerun()
+    with col2:
+        st.caption(f"Page {page + 1}")
+    with col3:
+        if has_more and st.button("Next", key=f"{key}_next"):
+            st.session_state[f"{key}_page"] = page + 1
+            st.rerun()
+
+def show_columnar_coverage():
+    since = get_columnar_since()
+    if since:
+        st.caption(f"In-memory figures cover donations from {since:%b %d, %Y} on; "
+                   f"older ones don't fit the memory budget. Switch to Database for full history.")
+
+def show_profile_unavailable():
+    # The profile lookup failed (or the row is gone); keep a way out instead of a traceback
+    st.error("Your profile is temporarily unavailable. Please try again in a moment.")
+    col1, col2 = st.columns(2)
+    with col1:
+        if st.button("Try again"):
+            st.rerun()
+    with col2:
+        if st.button("Logout"):
+            end_session()
+            st.rerun()
+
 def show_donor_dashboard():
+    import pandas as pd
+    
     st.title("Donor Dashboard")
     
     # Get donor information
-    donor_info = get_donor_info(st.session_state.entity_id)
+    donor_info = prefetched(get_donor_info, st.session_state.entity_id)
+    if donor_info is None:
+        show_profile_unavailable()
+        return
     
     # Sidebar with donor info and logout button
     with st.sidebar:
@@ -938,10 +437,7 @@ def show_donor_dashboard():
         st.write(f"📍 {donor_info['street']}, {donor_info['city']}")
         
         if st.button("Logout"):
-            st.session_state.authenticated = False
-            st.session_state.user_id = None
-            st.session_state.user_type = None
-            st.session_state.entity_id = None
+            end_session()
             st.rerun()
     
     # Main content
@@ -966,31 +462,41 @@ def show_donor_dashboard():
             donation_date = st.date_input("Donation Date", datetime.date.today())
             expiry_date = st.date_input("Expiry Date", datetime.date.today() + datetime.timedelta(days=3))
         
-        # Get list of all NGOs
-        ngos = get_all_ngos()
-        ngo_options = ngos  # Remove the optional empty selection
-        if not ngo_options:
-            st.error("No NGOs are registered in the system. Donations cannot be made at this time.")
-        else:
-            selected_ngo = st.selectbox("Select NGO to donate to (Required)", ngo_options, format_func=lambda x: x[1])
-        
+        # Get list of all NGOs, nearest NGOs with open requests first
+        ngos = prefetched(get_all_ngos)
+        nearest = dict(get_nearest_ngos(donor_info['latitude'], donor_info['longitude']))
+        ngo_options = sorted(ngos, key=lambda x: (x[0] not in nearest, nearest.get(x[0], 0)))
+
+        def format_ngo(ngo):
+            if ngo is None:
+                return "Any NGO (list as Available for NGOs to claim)"
+            if ngo[0] in nearest:
+                return f"{ngo[1]} ({nearest[ngo[0]]:.1f} km, has open requests)"
+            return ngo[1]
+
+        # Leaving the NGO open lists the donation under Available Food
+        selected_ngo = st.selectbox("Select NGO to donate to", [None] + ngo_options, format_func=format_ngo)
+
         if st.button("Submit Donation"):
-            if food_type and quantity > 0 and donation_date and expiry_date and selected_ngo:
+            if food_type and quantity > 0 and donation_date and expiry_date:
                 if expiry_date < donation_date:
                     st.error("Expiry date cannot be before donation date.")
                 else:
-                    ngo_id = selected_ngo[0]
+                    ngo_id = selected_ngo[0] if selected_ngo else None
                     
                     donation_id = create_donation(
                         st.session_state.entity_id,
                         food_type,
-                        donation_date.isoformat(),
-                        expiry_date.isoformat(),
+                        donation_date,
+                        expiry_date,
                         quantity,
                         ngo_id
                     )
                     
-                    if donation_id:
+                    if donation_id == WRITE_PENDING:
+                        st.info("Your donation is being saved and will appear under My Donations shortly. "
+                                "There's no need to submit it again.")
+                    elif donation_id:
                         st.success("Donation submitted successfully! Thank you for your contribution.")
                     else:
                         st.error("Failed to submit donation. Please try again.")
@@ -1000,7 +506,7 @@ def show_donor_dashboard():
     with tab2:
         st.header("My Donations")
         
-        donations = get_donor_donations(st.session_state.entity_id)
+        donations = prefetched(get_donor_donations, st.session_state.entity_id)
         
         if not donations:
             st.info("You haven't made any donations yet.")
@@ -1024,6 +530,9 @@ def show_donor_dashboard():
                 }),
                 use_container_width=True
             )
+            
+            show_export_controls("donations", ["Available", "Assigned"], "donor_export",
+                                 donor_id=st.session_state.entity_id)
 
     with tab3:
         st.header("NGO Food Requests")
@@ -1034,35 +543,86 @@ def show_donor_dashboard():
         </div>
         """, unsafe_allow_html=True)
         
-        # Get all pending requests from NGOs
-        all_requests = get_all_pending_requests()
+        # A search goes through the text index a page at a time; without one
+        # all pending requests from NGOs are listed
+        search = st.text_input("Search by food type, NGO or city", key="pending_search").strip()
+        if search:
+            all_requests, has_more = search_pending_requests(search, search_page("pending_search", search))
+        else:
+            all_requests = prefetched(get_all_pending_requests)
         
         if not all_requests:
-            st.info("There are no pending requests from NGOs at the moment.")
+            if search:
+                st.info("No pending request matches your search.")
+            else:
+                st.info("There are no pending requests from NGOs at the moment.")
         else:
-            for req in all_requests:
-                col1, col2, col3 = st.columns([3, 2, 1])
-                
-                with col1:
-                    st.markdown(f"""
-                    <div class="card">
-                        <h3>{req['food_type']}</h3>
-                        <p><strong>NGO:</strong> {req['ngo_name']}</p>
-                        <p><strong>Quantity Needed:</strong> {req['quantity']} kg</p>
-                    </div>
-                    """, unsafe_allow_html=True)
-                
-                with col2:
-                    st.markdown(f"""
-                    <div class="card">
-                        <p><strong>Request Date:</strong> {req['request_date']}</p>
-                    </div>
-                    """, unsafe_allow_html=True)
-                
-                with col3:
-                    if st.button("Donate This", key=f"donate_req_{req['request_id']}"):
-                        st.session_state.donating_to_request = req
-                        st.rerun()
+            sort_options = ["Request Date", "Distance"]
+            if search:
+                sort_options.insert(0, "Relevance")
+            sort_by = st.radio("Sort by", sort_options, horizontal=True, key="pending_sort")
+            # The rows are shared with every other session through the cache,
+            # so distances and orderings go on this page's own copies
+            proximity_index = prefetched(get_proximity_index)
+            all_requests = [
+                dict(req, distance_km=proximity_index.distance_to(req['ngo_id'], donor_info['latitude'], donor_info['longitude']))
+                for req in all_requests
+            ]
+
+            if sort_by == "Distance":
+                all_requests.sort(key=lambda r: (r['distance_km'] is None, r['distance_km'] or 0))
+            elif sort_by == "Request Date" and search:
+                all_requests.sort(key=lambda r: r['request_date'])
+
+            # One grid widget instead of a row of cards and a button per
+            # request; the browser only draws the rows scrolled into view
+            df = pd.DataFrame(all_requests, columns=['request_id', 'food_type', 'ngo_name', 'quantity',
+                                                     'request_date', 'distance_km'])
+            df['request_date'] = pd.to_datetime(df['request_date'])
+
+            # Grid selections are row positions, so the choice is kept as a
+            # request_id, read against the rows as they were drawn. Another
+            # sort or search is a new grid and starts with nothing selected
+            grid_key = f"pending_requests_grid:{sort_by}:{search}"
+            if st.session_state.get("pending_grid_key") != grid_key:
+                st.session_state.pending_grid_key = grid_key
+                st.session_state.pending_selected_id = None
+
+            def select_request():
+                rows = st.session_state[grid_key].selection.rows
+                drawn = st.session_state.get("pending_grid_ids", [])
+                st.session_state.pending_selected_id = drawn[rows[0]] if rows and rows[0] < len(drawn) else None
+
+            st.session_state.pending_grid_ids = [req['request_id'] for req in all_requests]
+            st.dataframe(
+                df,
+                key=grid_key,
+                on_select=select_request,
+                selection_mode="single-row",
+                hide_index=True,
+                use_container_width=True,
+                column_config={
+                    'request_id': None,
+                    'food_type': "Food Type",
+                    'ngo_name': "NGO",
+                    'quantity': st.column_config.NumberColumn("Quantity Needed", format="%.1f kg"),
+                    'request_date': st.column_config.DateColumn("Request Date", format="MMM DD, YYYY"),
+                    'distance_km': st.column_config.NumberColumn("Distance", format="%.1f km"),
+                },
+            )
+
+            selected = next((req for req in all_requests
+                             if req['request_id'] == st.session_state.pending_selected_id), None)
+            if selected is None:
+                st.caption("Select a request to donate towards it.")
+            elif st.button(f"Donate to {selected['ngo_name']}'s request for {selected['food_type']}",
+                           key="donate_selected_request"):
+                st.session_state.donating_to_request = selected
+                save_session()
+                st.rerun()
+
+        if search:
+            show_search_pager("pending_search", has_more)
                         
         # Handle donation form for request
         if 'donating_to_request' in st.session_state and st.session_state.donating_to_request:
@@ -1096,8 +656,8 @@ def show_donor_dashboard():
                             donation_id = create_donation_for_request(
                                 st.session_state.entity_id,
                                 req['food_type'],
-                                donation_date.isoformat(),
-                                expiry_date.isoformat(),
+                                donation_date,
+                                expiry_date,
                                 req['quantity'],
                                 req['ngo_id'],
                                 req['request_id']
@@ -1106,22 +666,34 @@ def show_donor_dashboard():
                             if donation_id:
                                 st.success("Donation submitted successfully! Thank you for your contribution.")
                                 del st.session_state.donating_to_request
+                                save_session()
                                 time.sleep(1)
                                 st.rerun()
                             else:
-                                st.error("Failed to submit donation. Please try again.")
+                                st.error("Failed to submit donation. The request may have been fulfilled already; "
+                                         "please check the list and try again.")
             
             with col2:
                 if st.button("Cancel"):
                     del st.session_state.donating_to_request
+                    save_session()
                     st.rerun()
     
     with tab4:
         st.header("Donation Analytics")
+        mode = st.radio("Source", ANALYTICS_MODES, horizontal=True, key="donor_analytics_mode")
         
         # Get analytics data
-        donation_stats = get_donation_statistics()
-        top_donors = get_top_donors()
+        if mode == ANALYTICS_MODES[1]:
+            donation_stats = get_donation_statistics_columnar()
+            top_donors = get_top_donors_columnar()
+            show_columnar_coverage()
+        elif mode == ANALYTICS_MODES[2]:
+            donation_stats = get_donation_statistics_approx()
+            top_donors = prefetched(get_top_donors)
+        else:
+            donation_stats = prefetched(get_donation_statistics)
+            top_donors = prefetched(get_top_donors)
         
         col1, col2 = st.columns([2, 1])
         
@@ -1136,7 +708,7 @@ def show_donor_dashboard():
         
         with col2:
             st.subheader("Your Contribution")
-            donor_donations = get_donor_donations(st.session_state.entity_id)
+            donor_donations = prefetched(get_donor_donations, st.session_state.entity_id)
             
             # Calculate total quantity donated by the current donor
             total_donated = sum(float(d['quantity']) for d in donor_donations) if donor_donations else 0
@@ -1171,11 +743,34 @@ def show_donor_dashboard():
         else:
             st.info("No donor data available for ranking.")
 
+        st.subheader("Most Needed Next Week")
+        shortfalls = prefetched(get_expected_shortfalls)
+        if shortfalls:
+            st.caption(f"Forecast for the week of {shortfalls[0]['forecast_week']}: expected requests "
+                       f"beyond what NGOs are expected to receive")
+            st.dataframe(
+                pd.DataFrame(shortfalls)[['food_type', 'shortfall', 'ngos_short']],
+                hide_index=True,
+                use_container_width=True,
+                column_config={
+                    'food_type': "Food Type",
+                    'shortfall': st.column_config.NumberColumn("Expected Shortfall", format="%.1f kg"),
+                    'ngos_short': st.column_config.NumberColumn("NGOs Short", format="%d"),
+                },
+            )
+        else:
+            st.info("No shortfall is forecast for next week.")
+
 def show_ngo_dashboard():
+    import pandas as pd
+    
     st.title("NGO Dashboard")
     
     # Get NGO information
-    ngo_info = get_ngo_info(st.session_state.entity_id)
+    ngo_info = prefetched(get_ngo_info, st.session_state.entity_id)
+    if ngo_info is None:
+        show_profile_unavailable()
+        return
     
     # Sidebar with NGO info and logout button
     with st.sidebar:
@@ -1185,53 +780,121 @@ def show_ngo_dashboard():
         st.write(f"📍 {ngo_info['street']}, {ngo_info['city']}")
         
         if st.button("Logout"):
-            st.session_state.authenticated = False
-            st.session_state.user_id = None
-            st.session_state.user_type = None
-            st.session_state.entity_id = None
+            end_session()
             st.rerun()
     
     # Main content
-    # Replace the tab definition line in show_ngo_dashboard():
-    # Main content
-    tab1, tab2, tab3 = st.tabs(["My Requests", "Make Request", "Analytics"])
-    
+    tab1, tab2, tab3, tab4 = st.tabs(["My Requests", "Available Food", "Make Request", "Analytics"])
+
     with tab1:
         st.header("My Requests")
         
-        requests = get_ngo_requests(st.session_state.entity_id)
+        requests = prefetched(get_ngo_requests, st.session_state.entity_id)
         
         if not requests:
             st.info("You haven't made any requests yet.")
         else:
-            for request in requests:
-                col1, col2 = st.columns([3, 1])
-                
+            status_filter = st.multiselect("Status", ["Pending", "Fulfilled", "Cancelled"],
+                                           default=["Pending", "Fulfilled"], key="ngo_requests_status")
+
+            df = pd.DataFrame(requests, columns=['request_id', 'food_type', 'quantity', 'request_date', 'status'])
+            df = df[df['status'].isin(status_filter)].copy()
+            df['request_date'] = pd.to_datetime(df['request_date'])
+            df['status'] = df['status'].map(lambda status: f"{STATUS_MARKERS.get(status, '🔵')} {status}")
+
+            st.dataframe(
+                df,
+                key="ngo_requests_grid",
+                hide_index=True,
+                use_container_width=True,
+                column_config={
+                    'request_id': st.column_config.NumberColumn("ID", format="%d"),
+                    'food_type': "Food Type",
+                    'quantity': st.column_config.NumberColumn("Quantity", format="%.1f kg"),
+                    'request_date': st.column_config.DateColumn("Date", format="MMM DD, YYYY"),
+                    'status': "Status",
+                },
+            )
+            
+            show_export_controls("requests", ["Pending", "Fulfilled"], "ngo_export",
+                                 ngo_id=st.session_state.entity_id)
+
+    with tab2:
+        st.header("Available Food")
+
+        st.markdown("""
+        <div class="highlight">
+        Donations not yet assigned to an NGO, soonest expiry first. Claim what you can collect.
+        </div>
+        """, unsafe_allow_html=True)
+
+        # Start keys of the pages visited so far; the last one is the current page
+        if "available_page_keys" not in st.session_state:
+            st.session_state.available_page_keys = [None]
+        page_keys = st.session_state.available_page_keys
+
+        if st.button("Claim soonest-expiring donation", key="claim_next"):
+            if claim_next_available(st.session_state.entity_id):
+                st.success("Donation claimed. It now appears as Assigned to you.")
+            else:
+                st.info("There is no unclaimed donation left right now.")
+
+        search = st.text_input("Search by food type, donor or city", key="available_search").strip()
+        if search:
+            available, has_more = search_available_donations(search, search_page("available_search", search))
+        else:
+            available, next_key = prefetched(get_available_donations, page_keys[-1])
+
+        if not available:
+            if search:
+                st.info("No available food matches your search.")
+            else:
+                st.info("There is no available food at the moment.")
+        else:
+            for donation in available:
+                col1, col2, col3 = st.columns([3, 2, 1])
+
                 with col1:
                     st.markdown(f"""
                     <div class="card">
-                        <h3>{request['food_type']}</h3>
-                        <p><strong>Quantity:</strong> {request['quantity']} kg</p>
-                        <p><strong>Date:</strong> {request['request_date']}</p>
+                        <h3>{donation['food_type']}</h3>
+                        <p><strong>Donor:</strong> {donation['donor_name']} ({donation['donor_city']})</p>
+                        <p><strong>Quantity:</strong> {donation['quantity']} kg</p>
                     </div>
                     """, unsafe_allow_html=True)
-                
+
                 with col2:
-                    status_color = {
-                        "Pending": "#FFB74D",  # Orange
-                        "Fulfilled": "#81C784",  # Green
-                        "Cancelled": "#E57373"  # Red
-                    }.get(request['status'], "#64B5F6")  # Default blue
-                    
                     st.markdown(f"""
                     <div class="card">
-                        <p style="background-color: {status_color}; padding: 10px; border-radius: 5px; text-align: center; color: white;">
-                            <strong>{request['status']}</strong>
-                        </p>
+                        <p><strong>Expires:</strong> {donation['expiry_date']}</p>
+                        <p><strong>Donated:</strong> {donation['donation_date']}</p>
                     </div>
                     """, unsafe_allow_html=True)
-    
-    with tab2:
+
+                with col3:
+                    if st.button("Claim", key=f"claim_{donation['donation_id']}"):
+                        if claim_donation(donation['donation_id'], st.session_state.entity_id):
+                            st.success("Donation claimed.")
+                            st.rerun()
+                        else:
+                            st.warning("Another NGO has already claimed this donation.")
+
+        if search:
+            show_search_pager("available_search", has_more)
+        else:
+            col1, col2, col3 = st.columns([1, 2, 1])
+            with col1:
+                if len(page_keys) > 1 and st.button("Previous", key="available_prev"):
+                    page_keys.pop()
+                    st.rerun()
+            with col2:
+                st.caption(f"Page {len(page_keys)}")
+            with col3:
+                if next_key is not None and st.button("Next", key="available_next"):
+                    page_keys.append(next_key)
+                    st.rerun()
+
+    with tab3:
         st.header("Make Request")
         
         st.markdown("""
@@ -1256,19 +919,31 @@ def show_ngo_dashboard():
                     request_quantity
                 )
                 
-                if request_id:
+                if request_id == WRITE_PENDING:
+                    st.info("Your request is being saved and will appear under My Requests shortly. "
+                            "There's no need to submit it again.")
+                elif request_id:
                     st.success("Request submitted successfully! We will try to match you with available donations.")
                 else:
                     st.error("Failed to submit request. Please try again.")
             else:
                 st.warning("Please fill in all required fields.")
     
-    with tab3:
+    with tab4:
         st.header("Donation Analytics")
+        mode = st.radio("Source", ANALYTICS_MODES, horizontal=True, key="ngo_analytics_mode")
         
         # Get analytics data
-        donation_trends = get_donation_trends()
-        ngo_distribution = get_ngo_donation_distribution()
+        if mode == ANALYTICS_MODES[1]:
+            donation_trends = get_donation_trends_columnar()
+            ngo_distribution = get_ngo_donation_distribution_columnar()
+            show_columnar_coverage()
+        elif mode == ANALYTICS_MODES[2]:
+            donation_trends = get_donation_trends_approx()
+            ngo_distribution = prefetched(get_ngo_donation_distribution)
+        else:
+            donation_trends = prefetched(get_donation_trends)
+            ngo_distribution = prefetched(get_ngo_donation_distribution)
         
         col1, col2 = st.columns([1, 1])
         
@@ -1288,5 +963,27 @@ def show_ngo_dashboard():
             else:
                 st.info("No NGO distribution data available.")
 
+        st.subheader("Your Expected Shortfall Next Week")
+        shortfalls = prefetched(get_ngo_shortfalls, st.session_state.entity_id)
+        if shortfalls:
+            st.caption(f"Forecast for the week of {shortfalls[0]['forecast_week']}, "
+                       f"from your past requests and the donations you received")
+            st.dataframe(
+                pd.DataFrame(shortfalls)[['food_type', 'expected_demand', 'expected_supply', 'shortfall']],
+                hide_index=True,
+                use_container_width=True,
+                column_config={
+                    'food_type': "Food Type",
+                    'expected_demand': st.column_config.NumberColumn("Expected Need", format="%.1f kg"),
+                    'expected_supply': st.column_config.NumberColumn("Expected Donations", format="%.1f kg"),
+                    'shortfall': st.column_config.NumberColumn("Shortfall", format="%.1f kg"),
+                },
+            )
+        else:
+            st.info("No shortfall is forecast for next week.")
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    if profiling_enabled():
+        run_profiled(main)
+    else:
+        main()
\ No newline at end of file
@@ -0,0 +1,148 @@
+import argparse
+import datetime
+import random
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import oracledb
+
+import db
+
+PASSWORD = "bench-password"
+
+_lock = threading.Lock()
+latencies = []
+outcomes = Counter()
+claimed = []
+
+
+def ensure_entity(username, user_type, name):
+    # Reuses the account from an earlier run if it already exists
+    user_id = db.register_user(username, PASSWORD, user_type)
+    if user_id is None:
+        user = db.authenticate(username, PASSWORD)
+        lookup = db.get_donor_id_by_user_id if user_type == "Donor" else db.get_ngo_id_by_user_id
+        return lookup(user["user_id"])
+    register = db.register_donor if user_type == "Donor" else db.register_ngo
+    return register(user_id, name, f"{username}@example.com", "9800000000", "Main Road", "Kathmandu")
+
+
+def seed_donations(donor_id, count):
+    today = datetime.date.today()
+    with db.get_connection() as conn:
+        with conn.cursor() as cursor:
+            food_type_ids = [db.get_food_type_id(cursor, name) for name in ("Rice", "Bread", "Vegetables", "Fruits")]
+            rows = [[donor_id, random.choice(food_type_ids), today,
+                     today + datetime.timedelta(days=random.randint(0, 7)), round(random.uniform(1, 20), 1)]
+                    for _ in range(count)]
+            cursor.executemany('''
+                INSERT INTO food_donations (donor_id, food_type_id, donation_date, expiry_date, quantity, status)
+                VALUES (:1, :2, :3, :4, :5, 'Available')
+            ''', rows)
+            conn.commit()
+
+
+def record(outcome, elapsed, donation_id=None):
+    with _lock:
+        latencies.append(elapsed)
+        outcomes[outcome] += 1
+        if donation_id is not None:
+            claimed.append(int(donation_id))
+
+
+def claim_next_worker(ngo_id, deadline):
+    # Every worker asks for "the soonest-expiring one"; SKIP LOCKED hands
+    # each of them a different row instead of making them queue
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        donation_id = db.claim_next_available(ngo_id)
+        if donation_id is None:
+            record("empty", time.perf_counter() - start)
+            return
+        record("claimed", time.perf_counter() - start, donation_id)
+
+
+def pick_worker(ngo_id, deadline):
+    # Browses the first page like the UI and clicks a random item; workers
+    # collide on the same few rows, which is the worst case for claim_donation
+    while time.perf_counter() < deadline:
+        page, _ = db.get_available_donations()
+        if not page:
+            return
+        donation = random.choice(page[:5])
+        start = time.perf_counter()
+        donation_id = db.claim_donation(donation["donation_id"], ngo_id)
+        if donation_id is None:
+            record("conflict", time.perf_counter() - start)
+        else:
+            record("claimed", time.perf_counter() - start, donation_id)
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def assigned_count(donation_ids):
+    # Each successful claim must have assigned exactly one distinct donation
+    count = 0
+    with db.get_connection() as conn:
+        with conn.cursor() as cursor:
+            for start in range(0, len(donation_ids), 1000):
+                chunk = donation_ids[start:start + 1000]
+                placeholders = ", ".join(f":{i + 1}" for i in range(len(chunk)))
+                cursor.execute(
+                    f"SELECT COUNT(*) FROM food_donations WHERE status = 'Assigned' AND donation_id IN ({placeholders})",
+                    chunk
+                )
+                count += cursor.fetchone()[0]
+    return count
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark concurrent donation claims. Run against a scratch database: "
+                    "the workers claim every Available donation they can find."
+    )
+    parser.add_argument("--mode", choices=["next", "pick"], default="next",
+                        help="next: claim_next_available; pick: claim a random item from the first page")
+    parser.add_argument("--donations", type=int, default=2000, help="Available donations to seed")
+    parser.add_argument("--workers", type=int, default=16, help="Concurrent claimers (one NGO each)")
+    parser.add_argument("--duration", type=float, default=60, help="Stop after this many seconds")
+    args = parser.parse_args()
+
+    db.warm_up()
+    donor_id = ensure_entity("bench_claim_donor", "Donor", "Bench Donor")
+    ngo_ids = [ensure_entity(f"bench_claim_ngo_{i}", "NGO", f"Bench NGO {i}") for i in range(args.workers)]
+
+    try:
+        seed_donations(donor_id, args.donations)
+    except oracledb.DatabaseError as e:
+        print(f"Error seeding donations: {e}")
+        raise SystemExit(1)
+    print(f"Seeded {args.donations} available donations; {args.workers} workers in {args.mode} mode")
+
+    worker = claim_next_worker if args.mode == "next" else pick_worker
+    deadline = time.perf_counter() + args.duration
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        futures = [pool.submit(worker, ngo_id, deadline) for ngo_id in ngo_ids]
+        # A worker that died would otherwise leave partial numbers behind
+        for future in futures:
+            future.result()
+    wall_time = time.perf_counter() - start
+
+    print(f"\nFinished in {wall_time:.1f}s")
+    print(f"Claims: {outcomes['claimed']} ({outcomes['claimed'] / wall_time:.0f}/s), "
+          f"conflicts: {outcomes['conflict']}, empty polls: {outcomes['empty']}")
+    if latencies:
+        print(f"Claim latency ms: p50 {percentile(latencies, 50) * 1000:.1f}  "
+              f"p90 {percentile(latencies, 90) * 1000:.1f}  p99 {percentile(latencies, 99) * 1000:.1f}  "
+              f"max {max(latencies) * 1000:.1f}")
+
+    duplicates = [donation_id for donation_id, count in Counter(claimed).items() if count > 1]
+    print(f"Double claims: {len(duplicates)}")
+    if claimed:
+        print(f"Assigned in database: {assigned_count(sorted(set(claimed)))} of {len(set(claimed))} claimed")
@@ -0,0 +1,80 @@
+import argparse
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import passwords
+
+PASSWORD = "bench-password"
+
+_lock = threading.Lock()
+latencies = []
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def login_worker(login, deadline):
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        login()
+        with _lock:
+            latencies.append(time.perf_counter() - start)
+
+
+def run(login, clients, duration):
+    latencies.clear()
+    deadline = time.perf_counter() + duration
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        futures = [pool.submit(login_worker, login, deadline) for _ in range(clients)]
+        # A client that died would otherwise leave partial numbers behind
+        for future in futures:
+            future.result()
+    return len(latencies), time.perf_counter() - start
+
+
+def report(label, count, wall_time, workers):
+    rate = count / wall_time
+    print(f"{label}: {count} logins in {wall_time:.1f}s, {rate:.1f}/s, {rate / workers:.1f}/s per core")
+    if latencies:
+        print(f"  latency ms: p50 {percentile(latencies, 50) * 1000:.1f}  "
+              f"p90 {percentile(latencies, 90) * 1000:.1f}  p99 {percentile(latencies, 99) * 1000:.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark password checks per second per core for a scrypt cost setting"
+    )
+    parser.add_argument("--n", type=int, default=passwords.PASSWORD_SCRYPT_N, help="scrypt CPU/memory cost (power of 2)")
+    parser.add_argument("--r", type=int, default=passwords.PASSWORD_SCRYPT_R, help="scrypt block size")
+    parser.add_argument("--p", type=int, default=passwords.PASSWORD_SCRYPT_P, help="scrypt parallelism")
+    parser.add_argument("--workers", type=int, default=passwords.PASSWORD_HASH_WORKERS, help="Hashing threads (cores to use)")
+    parser.add_argument("--clients", type=int, default=32, help="Concurrent logins")
+    parser.add_argument("--duration", type=float, default=10, help="Seconds per run")
+    parser.add_argument("--db", action="store_true",
+                        help="Also time full logins through db.authenticate, using the PASSWORD_* settings")
+    args = parser.parse_args()
+
+    print(f"scrypt N={args.n} r={args.r} p={args.p}: {128 * args.n * args.r / 2 ** 20:.0f} MiB per hash, "
+          f"{os.cpu_count()} cores available")
+
+    # One worker first, so the per core figure isn't skewed by contention
+    for workers in sorted({1, args.workers}):
+        hasher = passwords.PasswordHasher(args.n, args.r, args.p, workers=workers, max_pending=args.clients)
+        stored = hasher.hash(PASSWORD)
+        count, wall_time = run(lambda: hasher.verify(PASSWORD, stored), args.clients, args.duration)
+        report(f"{workers} worker{'s' if workers != 1 else ''}", count, wall_time, workers)
+
+    if args.db:
+        import db
+
+        db.warm_up()
+        db.register_user("bench_login_user", PASSWORD, "Donor")
+        if db.authenticate("bench_login_user", PASSWORD) is None:
+            raise SystemExit("Could not log in as bench_login_user")
+        count, wall_time = run(lambda: db.authenticate("bench_login_user", PASSWORD), args.clients, args.duration)
+        report("db.authenticate", count, wall_time, passwords.PASSWORD_HASH_WORKERS)
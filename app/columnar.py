@@ -0,0 +1,222 @@
+import numpy as np
+
+# Column layout of a ColumnStore; ids are dictionary-encoded to dense
+# int32 codes and dates are days since 1970-01-01
+COLUMNS = {
+    "donation_id": np.int64,
+    "food_type": np.int32,
+    "donor": np.int32,
+    "ngo": np.int32,       # -1 while unassigned
+    "day": np.int32,
+    "quantity": np.float32,
+}
+ROW_BYTES = sum(np.dtype(dtype).itemsize for dtype in COLUMNS.values())
+# Largest month x donor bitmap used to count distinct donors per month
+BITMAP_MAX_CELLS = 64 * 1024 * 1024
+
+
+def to_days(dates):
+    return np.array(dates, dtype="datetime64[D]").astype(np.int32)
+
+def from_day(day):
+    return np.datetime64(int(day), "D").astype(object)
+
+def month_of(days):
+    # Months since 1970-01 for an array of days
+    return days.astype("datetime64[D]").astype("datetime64[M]").astype(np.int32)
+
+def month_label(month):
+    return str(np.datetime64(int(month), "M"))
+
+
+# Maps database ids to dense codes, so group-bys are a bincount over
+# 0..n-1 however sparse the ids are
+class Dictionary:
+    def __init__(self):
+        self.ids = np.empty(0, dtype=np.int64)
+        self._codes = {}
+
+    def __len__(self):
+        return len(self._codes)
+
+    def encode(self, ids):
+        unique, inverse = np.unique(np.asarray(ids, dtype=np.int64), return_inverse=True)
+        new = [i for i in unique.tolist() if i not in self._codes]
+        if new:
+            for i in new:
+                self._codes[i] = len(self._codes)
+            self.ids = np.concatenate([self.ids, np.array(new, dtype=np.int64)])
+        codes = np.array([self._codes[i] for i in unique.tolist()], dtype=np.int32)
+        return codes[inverse]
+
+    def decode(self, codes):
+        return self.ids[codes]
+
+
+# Donations held as one NumPy array per column, appended to in place and
+# kept in donation_id order. Past max_bytes the oldest days are evicted and
+# `since` records the first day still complete; aggregates then cover
+# donations from that day on
+class ColumnStore:
+    def __init__(self, max_bytes):
+        self.max_rows = max(1, max_bytes // ROW_BYTES)
+        self.size = 0
+        self.since = None
+        self.last_id = 0
+        self.last_event_id = 0
+        self.built_at = 0.0
+        self.refreshed_at = 0.0
+        self.food_types = Dictionary()
+        self.donors = Dictionary()
+        self.ngos = Dictionary()
+        self._columns = {name: np.empty(0, dtype=dtype) for name, dtype in COLUMNS.items()}
+
+    def __getitem__(self, name):
+        return self._columns[name][:self.size]
+
+    def nbytes(self):
+        return sum(column.nbytes for column in self._columns.values())
+
+    def _reserve(self, rows):
+        capacity = len(self._columns["donation_id"])
+        if rows <= capacity:
+            return
+        # Doubling keeps appends amortized O(1) per row, capped by the budget
+        capacity = max(rows, min(2 * capacity, self.max_rows))
+        for name, column in self._columns.items():
+            grown = np.empty(capacity, dtype=column.dtype)
+            grown[:self.size] = column[:self.size]
+            self._columns[name] = grown
+
+    def _keep(self, mask):
+        kept = int(mask.sum())
+        for name, column in self._columns.items():
+            column[:kept] = column[:self.size][mask]
+        self.size = kept
+
+    def contains(self, donation_ids):
+        ids = self["donation_id"]
+        positions = np.searchsorted(ids, donation_ids)
+        found = positions < len(ids)
+        found[found] = ids[positions[found]] == np.asarray(donation_ids)[found]
+        return found, positions
+
+    def append(self, donation_ids, food_type_ids, donor_ids, ngo_ids, days, quantities):
+        # ngo_ids uses 0 for unassigned. Rows already held, or older than
+        # the evicted days, are skipped. Returns the number appended
+        donation_ids = np.asarray(donation_ids, dtype=np.int64)
+        days = np.asarray(days, dtype=np.int32)
+        new = ~self.contains(donation_ids)[0]
+        if self.since is not None:
+            new &= days >= self.since
+        if not new.any():
+            return 0
+
+        if self.size + int(new.sum()) > self.max_rows:
+            self.evict(self.max_rows * 9 // 10, incoming_days=days[new])
+            new &= days >= self.since
+        n = int(new.sum())
+        if not n:
+            return 0
+        self._reserve(self.size + n)
+
+        ngo_ids = np.asarray(ngo_ids, dtype=np.int64)[new]
+        ngo_codes = np.full(n, -1, dtype=np.int32)
+        assigned = ngo_ids > 0
+        if assigned.any():
+            ngo_codes[assigned] = self.ngos.encode(ngo_ids[assigned])
+
+        end = self.size + n
+        self._columns["donation_id"][self.size:end] = donation_ids[new]
+        self._columns["food_type"][self.size:end] = self.food_types.encode(np.asarray(food_type_ids)[new])
+        self._columns["donor"][self.size:end] = self.donors.encode(np.asarray(donor_ids)[new])
+        self._columns["ngo"][self.size:end] = ngo_codes
+        self._columns["day"][self.size:end] = days[new]
+        self._columns["quantity"][self.size:end] = np.asarray(quantities, dtype=np.float32)[new]
+
+        # Ids usually arrive in order; one that committed late is sorted in
+        start = max(self.size - 1, 0)
+        self.size = end
+        if (np.diff(self["donation_id"][start:]) < 0).any():
+            order = np.argsort(self["donation_id"], kind="stable")
+            for name, column in self._columns.items():
+                column[:self.size] = column[:self.size][order]
+        self.last_id = max(self.last_id, int(donation_ids.max()))
+        return n
+
+    def assign(self, donation_ids, ngo_ids):
+        # Applies claims; donations not held are ignored
+        found, positions = self.contains(donation_ids)
+        if found.any():
+            self._columns["ngo"][positions[found]] = self.ngos.encode(np.asarray(ngo_ids)[found])
+        return int(found.sum())
+
+    def evict(self, keep_rows, incoming_days=()):
+        # Drops whole days, oldest first, until at most keep_rows remain
+        # counting the rows about to be appended, which may be older than
+        # some already held and on their own may not fit
+        days = np.concatenate([self["day"], np.asarray(incoming_days, dtype=np.int32)])
+        if len(days) <= keep_rows:
+            return
+        cutoff = int(np.partition(days, len(days) - keep_rows)[len(days) - keep_rows]) if keep_rows > 0 else int(days.max())
+        self._keep(self["day"] > cutoff)
+        self.since = cutoff + 1
+
+    def by_food_type(self):
+        # (food type ids, counts, totals, first days, last days)
+        food, days = self["food_type"], self["day"]
+        k = len(self.food_types)
+        counts = np.bincount(food, minlength=k)
+        totals = np.bincount(food, weights=self["quantity"], minlength=k)
+        first = np.full(k, np.iinfo(np.int32).max, dtype=np.int32)
+        last = np.full(k, np.iinfo(np.int32).min, dtype=np.int32)
+        np.minimum.at(first, food, days)
+        np.maximum.at(last, food, days)
+        present = counts > 0
+        return self.food_types.ids[present], counts[present], totals[present], first[present], last[present]
+
+    def by_month(self, since_day):
+        # (months, counts, totals, distinct donors) for donations on or
+        # after since_day
+        mask = self["day"] >= since_day
+        if not mask.any():
+            return (np.empty(0, dtype=np.int32),) + (np.empty(0),) * 3
+        months = month_of(self["day"][mask])
+        first = months.min()
+        months = months - first
+        counts = np.bincount(months)
+        totals = np.bincount(months, weights=self["quantity"][mask])
+        # Each distinct (month, donor) pair is one active donor in that month.
+        # A month x donor bitmap finds them without sorting while it is small
+        n_donors = max(len(self.donors), 1)
+        pairs = months.astype(np.int64) * n_donors + self["donor"][mask]
+        if len(counts) * n_donors <= BITMAP_MAX_CELLS:
+            seen = np.zeros(len(counts) * n_donors, dtype=bool)
+            seen[pairs] = True
+            donors = seen.reshape(len(counts), n_donors).sum(axis=1)
+        else:
+            donors = np.bincount(np.unique(pairs) // n_donors, minlength=len(counts))
+        present = counts > 0
+        return np.nonzero(present)[0] + first, counts[present], totals[present], donors[present]
+
+    def by_ngo(self):
+        # (ngo ids, counts, totals) over assigned donations
+        ngo = self["ngo"]
+        mask = ngo >= 0
+        k = len(self.ngos)
+        counts = np.bincount(ngo[mask], minlength=k)
+        totals = np.bincount(ngo[mask], weights=self["quantity"][mask], minlength=k)
+        present = counts > 0
+        return self.ngos.ids[present], counts[present], totals[present]
+
+    def top_donors(self, limit):
+        # (donor ids, counts, totals) of the `limit` largest donors by quantity
+        donor = self["donor"]
+        k = len(self.donors)
+        counts = np.bincount(donor, minlength=k)
+        totals = np.bincount(donor, weights=self["quantity"], minlength=k)
+        present = np.nonzero(counts)[0]
+        if len(present) > limit:
+            present = present[np.argpartition(-totals[present], limit - 1)[:limit]]
+        present = present[np.argsort(-totals[present], kind="stable")]
+        return self.donors.ids[present], counts[present], totals[present]
@@ -0,0 +1,2358 @@
+import oracledb
+import calendar
+import contextlib
+import contextvars
+import datetime
+import os
+import time
+import functools
+import json
+import re
+import threading
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+import numpy as np
+
+import sketches
+import sql
+from columnar import ColumnStore, from_day, month_label
+from geo import ProximityIndex, geocode
+from passwords import burn_password_check, hash_password, verify_password
+from resilience import CircuitBreaker, CircuitOpenError, backoff, is_retryable, is_transient
+from singleflight import SingleFlight
+from shards import SHARDS, current_shard, run_in_shard, scatter, shard_names, use_shard
+from store import LRUCache, get_store
+from writebehind import QueueFullError, WriteBehindQueue
+
+
+DB_USER = os.getenv("DB_USER", "new_user")
+DB_PASSWORD = os.getenv("DB_PASSWORD", "password")
+DB_HOST = os.getenv("DB_HOST", "localhost")
+DB_PORT = os.getenv("DB_PORT", "1521")
+DB_SERVICE = os.getenv("DB_SERVICE", "XEPDB1")
+
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", "2"))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "20"))
+DB_POOL_INCREMENT = int(os.getenv("DB_POOL_INCREMENT", "2"))
+DB_POOL_WAIT_TIMEOUT = int(os.getenv("DB_POOL_WAIT_TIMEOUT", "5000"))
+DB_CONNECT_TIMEOUT = float(os.getenv("DB_CONNECT_TIMEOUT", "5"))
+# Parsed statements kept per pooled connection; sql.py has about 25
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "64"))
+
+# Per round trip limit (ms) for interactive requests; app.py applies it with
+# call_timeout(), batch jobs run without one
+DB_CALL_TIMEOUT = int(os.getenv("DB_CALL_TIMEOUT", "5000"))
+READ_RETRIES = int(os.getenv("READ_RETRIES", "2"))
+BREAKER_THRESHOLD = int(os.getenv("BREAKER_THRESHOLD", "5"))
+BREAKER_RESET_TIMEOUT = float(os.getenv("BREAKER_RESET_TIMEOUT", "30"))
+# How long a read view's last good result is kept to serve during an outage
+STALE_TTL = int(os.getenv("STALE_TTL", str(24 * 60 * 60)))
+# A successful read only rewrites its stale copy once the copy this process
+# saved is older than this (s), so hot views don't write the store every call
+STALE_REFRESH_INTERVAL = float(os.getenv("STALE_REFRESH_INTERVAL", "60"))
+# How long (s) a caller waits on an identical in-flight query before
+# running its own
+SINGLE_FLIGHT_WAIT = float(os.getenv("SINGLE_FLIGHT_WAIT", "30"))
+
+QUERY_CACHE_TTL = int(os.getenv("QUERY_CACHE_TTL", "30"))
+ENTITY_CACHE_MAX_BYTES = int(os.getenv("ENTITY_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+# Optional write-behind path for donation/request inserts during bursts
+WRITE_BEHIND = os.getenv("WRITE_BEHIND", "0") == "1"
+WRITE_BEHIND_QUEUE_SIZE = int(os.getenv("WRITE_BEHIND_QUEUE_SIZE", "1000"))
+WRITE_BEHIND_BATCH_SIZE = int(os.getenv("WRITE_BEHIND_BATCH_SIZE", "100"))
+WRITE_BEHIND_TIMEOUT = float(os.getenv("WRITE_BEHIND_TIMEOUT", "10"))
+# Returned by a write-behind insert still queued when the caller stopped
+# waiting; the row will most likely commit, so the caller must not retry
+WRITE_PENDING = "pending"
+
+STARTUP_PROFILE = os.getenv("STARTUP_PROFILE", "0") == "1"
+
+_pools = {}
+_pool_lock = threading.Lock()
+_breakers = {}
+
+_call_timeout = contextvars.ContextVar("call_timeout", default=0)
+_call_errors = contextvars.ContextVar("call_errors", default=None)
+_stale_reads = contextvars.ContextVar("stale_reads", default=None)
+
+_flights = SingleFlight(SINGLE_FLIGHT_WAIT)
+
+_warm = threading.Event()
+_warm_up_started = False
+_warm_up_lock = threading.Lock()
+
+
+# Connection functions
+def get_pool(shard=None):
+    # One pool per shard; shards not overriding user/password/dsn in
+    # SHARD_CONFIG use the DB_* settings
+    shard = shard or current_shard()
+    if shard not in _pools:
+        with _pool_lock:
+            if shard not in _pools:
+                params = {"user": DB_USER, "password": DB_PASSWORD, "dsn": f"{DB_HOST}:{DB_PORT}/{DB_SERVICE}"}
+                params.update(SHARDS[shard])
+                _pools[shard] = oracledb.create_pool(
+                    **params,
+                    min=DB_POOL_MIN,
+                    max=DB_POOL_MAX,
+                    increment=DB_POOL_INCREMENT,
+                    getmode=oracledb.POOL_GETMODE_TIMEDWAIT,
+                    wait_timeout=DB_POOL_WAIT_TIMEOUT,
+                    tcp_connect_timeout=DB_CONNECT_TIMEOUT,
+                    stmtcachesize=DB_STATEMENT_CACHE_SIZE
+                )
+    return _pools[shard]
+
+def get_breaker(shard=None):
+    shard = shard or current_shard()
+    if shard not in _breakers:
+        with _pool_lock:
+            _breakers.setdefault(shard, CircuitBreaker(shard, BREAKER_THRESHOLD, BREAKER_RESET_TIMEOUT))
+    return _breakers[shard]
+
+@contextlib.contextmanager
+def call_timeout(ms):
+    # Bounds every round trip made in this context; 0 means no limit
+    token = _call_timeout.set(ms)
+    try:
+        yield
+    finally:
+        _call_timeout.reset(token)
+
+@contextlib.contextmanager
+def get_connection():
+    # Connects to the current shard; pooled connections go back to the pool
+    # when the with-block exits. While the shard's circuit breaker is open
+    # this fails at once with CircuitOpenError instead of waiting on the
+    # database
+    breaker = get_breaker()
+    try:
+        breaker.check()
+        with get_pool().acquire() as conn:
+            conn.call_timeout = _call_timeout.get()
+            yield conn
+    except oracledb.DatabaseError as e:
+        errors = _call_errors.get()
+        if errors is not None:
+            errors.append(e)
+        if is_transient(e):
+            breaker.record_failure()
+        elif not isinstance(e, CircuitOpenError):
+            # The database answered, it just didn't like the statement
+            breaker.record_success()
+        raise
+    else:
+        breaker.record_success()
+
+# Read view functions
+def track_stale_reads():
+    # Starts collecting, for this context, the read views that were served
+    # from their last good result: {function name: time it was saved}
+    reads = {}
+    _stale_reads.set(reads)
+    return reads
+
+def merge_stale_reads(reads):
+    current = _stale_reads.get()
+    if current is not None:
+        for name, saved_at in reads.items():
+            current[name] = min(saved_at, current.get(name, saved_at))
+
+def _call_with_retries(func, args):
+    # Returns (result, ok). Data functions report errors by returning an
+    # empty value, so the errors get_connection saw during the call are
+    # what tell a failure apart from "no data"
+    for attempt in range(READ_RETRIES + 1):
+        errors = []
+        token = _call_errors.set(errors)
+        try:
+            result = func(*args)
+        finally:
+            _call_errors.reset(token)
+        if not errors:
+            return result, True
+        if attempt == READ_RETRIES or not is_retryable(errors[-1]):
+            return result, False
+        time.sleep(backoff(attempt))
+
+_stale_saved = {}
+_stale_saved_lock = threading.Lock()
+
+def _save_stale(store, key, result):
+    now = time.time()
+    with _stale_saved_lock:
+        if now - _stale_saved.get(key, 0) < STALE_REFRESH_INTERVAL:
+            return
+        _stale_saved[key] = now
+        if len(_stale_saved) > 10000:
+            for old in [k for k, saved_at in _stale_saved.items() if now - saved_at >= STALE_REFRESH_INTERVAL]:
+                del _stale_saved[old]
+    store.set(f"stale:{key}", (now, result), STALE_TTL)
+
+def _read_through(key, func, args):
+    # Returns (result, fresh, stale_at); stale_at is when a stale fallback
+    # was saved. Nothing is reported here, since under single flight the
+    # caller that runs this isn't the only one getting the result
+    result, ok = _call_with_retries(func, args)
+    store = get_store()
+    if ok:
+        _save_stale(store, key, result)
+        return result, True, None
+
+    saved = store.get(f"stale:{key}")
+    if saved is None:
+        return result, False, None
+    saved_at, result = saved
+    return result, False, saved_at
+
+def coalesced(key, func, load):
+    # Runs load() once for every concurrent caller of the same key and
+    # reports a stale result to each of them
+    result, stale_at = _flights.do(key, load)
+    if stale_at is not None:
+        merge_stale_reads({func.__name__: stale_at})
+    return result
+
+def resilient(func):
+    # For read views: transient errors are retried with jitter, and if the
+    # call still fails the last good result is served and reported through
+    # track_stale_reads() instead of an empty page. Identical calls already
+    # running in another session are joined rather than repeated. Keep it to
+    # views with a bounded set of arguments: every distinct call keeps its own
+    # stale copy, so paged and free-text reads are left undecorated
+    @functools.wraps(func)
+    def wrapper(*args):
+        key = f"{current_shard()}:{func.__name__}:{args!r}"
+        def load():
+            result, _, stale_at = _read_through(key, func, args)
+            return result, stale_at
+        return coalesced(key, func, load)
+    return wrapper
+
+# Text indexed for a request (food type, NGO name and city) and for a
+# donation (food type, donor name and city)
+REQUEST_SEARCH_BODY = "ft.name || ' ' || n.name || ' ' || n.city"
+DONATION_SEARCH_BODY = "ft.name || ' ' || d.name || ' ' || d.city"
+
+def init_db():
+    try:
+        with get_connection() as conn:
+            with conn.cursor() as cursor:
+                # Create users table
+                try:
+                    cursor.execute("SELECT COUNT(*) FROM user_tables WHERE table_name = 'USERS'")
+                    (table_exists,) = cursor.fetchone()
+
+                    if not table_exists:
+                        cursor.execute('''
+                            CREATE TABLE users (
+                                user_id NUMBER GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+                                username VARCHAR2(100) UNIQUE NOT NULL,
+                                password VARCHAR2(255) NOT NULL,
+                                user_type VARCHAR2(50) NOT NULL,
+                                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                            )
+                        ''')
+                    
+                    
+                except oracledb.DatabaseError as e:
+                    error, = e.args
+                    if error.code != 955:  
+                        raise
+                
+                # Create donors table
+                try:
+                    cursor.execute("SELECT COUNT(*) FROM user_tables WHERE table_name = 'DONORS'")
+                    (table_exists,) = cursor.fetchone()
+
+                    if not table_exists:
+                        cursor.execute('''
+                        CREATE TABLE donors (
+                            donor_id NUMBER GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+                            user_id NUMBER NOT NULL,
+                            name VARCHAR2(100) NOT NULL,
+                            email VARCHAR2(100),
+                            phone VARCHAR2(50),
+                            street VARCHAR2(200),
+                            city VARCHAR2(100),
+                            latitude NUMBER,
+                            longitude NUMBER,
+                            CONSTRAINT fk_donors_user_id FOREIGN KEY (user_id) REFERENCES users(user_id)
+                        )
+                        ''')
+                except oracledb.DatabaseError as e:
+                    error, = e.args
+                    if error.code != 955:
+                        raise
+                
+                
+                
+                # Create ngos table
+                try:
+                    cursor.execute("SELECT COUNT(*) FROM user_tables WHERE table_name = 'NGOS'")
+                    (table_exists,) = cursor.fetchone()
+
+                    if not table_exists:
+                        cursor.execute('''
+                        CREATE TABLE ngos (
+                            ngo_id NUMBER GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+                            user_id NUMBER NOT NULL,
+                            name VARCHAR2(100) NOT NULL,
+                            email VARCHAR2(100),
+                            phone VARCHAR2(50),
+                            street VARCHAR2(200),
+                            city VARCHAR2(100),
+                            latitude NUMBER,
+                            longitude NUMBER,
+                            CONSTRAINT fk_ngos_user_id FOREIGN KEY (user_id) REFERENCES users(user_id)
+                        )
+                        ''')
+                except oracledb.DatabaseError as e:
+                    error, = e.args
+                    if error.code != 955:
+                        raise
+                
+                
+                
+                # Add coordinate columns to donor/NGO tables created before geocoding
+                added_location_columns = False
+                for table_name in ("DONORS", "NGOS"):
+                    try:
+                        cursor.execute(
+                            "SELECT COUNT(*) FROM user_tab_columns WHERE table_name = :1 AND column_name = 'LATITUDE'",
+                            [table_name]
+                        )
+                        (column_exists,) = cursor.fetchone()
+
+                        if not column_exists:
+                            cursor.execute(f"ALTER TABLE {table_name} ADD (latitude NUMBER, longitude NUMBER)")
+                            added_location_columns = True
+                    except oracledb.DatabaseError as e:
+                        error, = e.args
+                        if error.code != 1430:
+                            raise
+
+                if added_location_columns:
+                    geocode_missing_locations(cursor)
+                
+                # Create food type catalogue tables
+                try:
+                    cursor.execute("SELECT COUNT(*) FROM user_tables WHERE table_name = 'FOOD_TYPES'")
+                    (table_exists,) = cursor.fetchone()
+
+                    if not table_exists:
+                        cursor.execute('''
+                        CREATE TABLE food_types (
+                            food_type_id NUMBER GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+                            name VARCHAR2(100) UNIQUE NOT NULL
+                        )
+                        ''')
+                except oracledb.DatabaseError as e:
+                    error, = e.args
+                    if error.code != 955:
+                        raise
+
+                try:
+                    cursor.execute("SELECT COUNT(*) FROM user_tables WHERE table_name = 'FOOD_TYPE_ALIASES'")
+                    (table_exists,) = cursor.fetchone()
+
+                    if not table_exists:
+                        cursor.execute('''
+                        CREATE TABLE food_type_aliases (
+                            alias VARCHAR2(100) PRIMARY KEY,
+                            food_type_id NUMBER NOT NULL,
+                            CONSTRAINT fk_food_type_aliases_type_id FOREIGN KEY (food_type_id) REFERENCES food_types(food_type_id)
+                        ) ORGANIZATION INDEX
+                        ''')
+                except oracledb.DatabaseError as e:
+                    error, = e.args
+                    if error.code != 955:
+                        raise
+                
+                # Create food_donations table
+                try:
+                    cursor.execute("SELECT COUNT(*) FROM user_tables WHERE table_name = 'FOOD_DONATIONS'")
+                    (table_exists,) = cursor.fetchone()
+
+                    if not table_exists:
+                        cursor.execute('''
+                        CREATE TABLE food_donations (
+                            donation_id NUMBER GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+                            donor_id NUMBER NOT NULL,
+                            ngo_id NUMBER,
+                            food_type_id NUMBER NOT NULL,
+                            donation_date DATE NOT NULL,
+                            expiry_date DATE NOT NULL,
+                            quantity NUMBER NOT NULL,
+                            status VARCHAR2(50) DEFAULT 'Available',
+                            CONSTRAINT fk_food_donations_donor_id FOREIGN KEY (donor_id) REFERENCES donors(donor_id),
+                            CONSTRAINT fk_food_donations_ngo_id FOREIGN KEY (ngo_id) REFERENCES ngos(ngo_id),
+                            CONSTRAINT fk_food_donations_food_type_id FOREIGN KEY (food_type_id) REFERENCES food_types(food_type_id)
+                        )
+                        ''')
+                        cursor.execute("CREATE INDEX idx_food_donations_food_type_id ON food_donations(food_type_id)")
+                except oracledb.DatabaseError as e:
+                    error, = e.args
+                    if error.code != 955:
+                        raise
+
+                # Index behind the Available Food list, soonest expiry first
+                try:
+                    cursor.execute("SELECT COUNT(*) FROM user_indexes WHERE index_name = 'IDX_FOOD_DONATIONS_STATUS_EXPIRY'")
+                    (index_exists,) = cursor.fetchone()
+
+                    if not index_exists:
+                        cursor.execute(
+                            "CREATE INDEX idx_food_donations_status_expiry "
+                            "ON food_donations(status, expiry_date, donation_id)"
+                        )
+                except oracledb.DatabaseError as e:
+                    error, = e.args
+                    if error.code != 955:
+                        raise
+
+                # Add trigger to check donation date
+                try:
+                    cursor.execute("""
+                    CREATE OR REPLACE TRIGGER check_donation_date
+                    BEFORE INSERT ON food_donations
+                    FOR EACH ROW
+                    DECLARE
+                        v_days NUMBER;
+                    BEGIN
+                        v_days := :NEW.expiry_date - :NEW.donation_date;
+                        IF v_days < 0 THEN
+                            RAISE_APPLICATION_ERROR(-20001, 'Expiry date cannot be before donation date');
+                        END IF;
+                    END;
+                    """)
+                    
+                except oracledb.DatabaseError as e:
+                    error, = e.args
+                    if error.code != 955:
+                        raise
+                
+                # Create requests table
+                try:
+                    cursor.execute("SELECT COUNT(*) FROM user_tables WHERE table_name = 'REQUESTS'")
+                    (table_exists,) = cursor.fetchone()
+
+                    if not table_exists:
+                        cursor.execute('''
+                        CREATE TABLE requests (
+                            request_id NUMBER GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+                            ngo_id NUMBER NOT NULL,
+                            food_type_id NUMBER NOT NULL,
+                            quantity NUMBER NOT NULL,
+                            request_date DATE NOT NULL,
+                            status VARCHAR2(50) DEFAULT 'Pending',
+                            donation_id NUMBER,
+                            CONSTRAINT fk_requests_ngo_id FOREIGN KEY (ngo_id) REFERENCES ngos(ngo_id),
+                            CONSTRAINT fk_requests_donation_id FOREIGN KEY (donation_id) REFERENCES food_donations(donation_id),
+                            CONSTRAINT fk_requests_food_type_id FOREIGN KEY (food_type_id) REFERENCES food_types(food_type_id)
+                        )
+                        ''')
+                        cursor.execute("CREATE INDEX idx_requests_food_type_id ON requests(food_type_id)")
+                except oracledb.DatabaseError as e:
+                    error, = e.args
+                    if error.code != 955:
+                        raise
+                
+                # One-off migration of tables that still store free-text food types
+                for table_name in ("FOOD_DONATIONS", "REQUESTS"):
+                    cursor.execute(
+                        "SELECT COUNT(*) FROM user_tab_columns WHERE table_name = :1 AND column_name = 'FOOD_TYPE_ID'",
+                        [table_name]
+                    )
+                    (column_exists,) = cursor.fetchone()
+
+                    if not column_exists:
+                        migrate_food_types(cursor, table_name.lower())
+                
+                # Create tables for the approximate analytics sketches
+                try:
+                    cursor.execute("SELECT COUNT(*) FROM user_tables WHERE table_name = 'DONATION_SKETCHES'")
+                    (table_exists,) = cursor.fetchone()
+
+                    if not table_exists:
+                        cursor.execute('''
+                        CREATE TABLE donation_sketches (
+                            month VARCHAR2(7) NOT NULL,
+                            food_type_id NUMBER NOT NULL,
+                            donation_count NUMBER NOT NULL,
+                            total_quantity NUMBER NOT NULL,
+                            first_donation DATE,
+                            last_donation DATE,
+                            donors_hll BLOB,
+                            quantity_quantiles BLOB,
+                            CONSTRAINT pk_donation_sketches PRIMARY KEY (month, food_type_id),
+                            CONSTRAINT fk_donation_sketches_type_id FOREIGN KEY (food_type_id) REFERENCES food_types(food_type_id)
+                        )
+                        ''')
+                except oracledb.DatabaseError as e:
+                    error, = e.args
+                    if error.code != 955:
+                        raise
+
+                try:
+                    cursor.execute("SELECT COUNT(*) FROM user_tables WHERE table_name = 'ANALYTICS_WATERMARKS'")
+                    (table_exists,) = cursor.fetchone()
+
+                    if not table_exists:
+                        cursor.execute('''
+                        CREATE TABLE analytics_watermarks (
+                            name VARCHAR2(50) PRIMARY KEY,
+                            last_id NUMBER DEFAULT 0 NOT NULL
+                        )
+                        ''')
+                except oracledb.DatabaseError as e:
+                    error, = e.args
+                    if error.code != 955:
+                        raise
+
+                # Donations folded into the sketches whose ids are still in
+                # the overlap window re-read below the watermark
+                try:
+                    cursor.execute("SELECT COUNT(*) FROM user_tables WHERE table_name = 'SKETCHED_DONATIONS'")
+                    (table_exists,) = cursor.fetchone()
+
+                    if not table_exists:
+                        cursor.execute('''
+                        CREATE TABLE sketched_donations (
+                            donation_id NUMBER PRIMARY KEY
+                        ) ORGANIZATION INDEX
+                        ''')
+                        # Everything up to the watermark was folded before
+                        # the window was tracked
+                        cursor.execute('''
+                        INSERT INTO sketched_donations (donation_id)
+                        SELECT d.donation_id
+                        FROM food_donations d
+                        JOIN analytics_watermarks w ON w.name = 'donation_sketches'
+                        WHERE d.donation_id > w.last_id - :1 AND d.donation_id <= w.last_id
+                        ''', [SKETCH_OVERLAP])
+                except oracledb.DatabaseError as e:
+                    error, = e.args
+                    if error.code != 955:
+                        raise
+
+                # Sketches written before the current format were pickled and
+                # are never loaded; they are derived data, so they are dropped
+                # and the next refresh rebuilds them from food_donations
+                cursor.execute(
+                    "SELECT COUNT(*) FROM donation_sketches WHERE DBMS_LOB.SUBSTR(donors_hll, :1, 1) <> :2",
+                    [len(sketches.MAGIC), sketches.MAGIC]
+                )
+                (legacy_sketches,) = cursor.fetchone()
+                if legacy_sketches:
+                    cursor.execute("DELETE FROM donation_sketches")
+                    cursor.execute("DELETE FROM sketched_donations")
+                    cursor.execute("UPDATE analytics_watermarks SET last_id = 0 WHERE name = 'donation_sketches'")
+                
+                # Create entity_versions table used to validate per-entity caches
+                try:
+                    cursor.execute("SELECT COUNT(*) FROM user_tables WHERE table_name = 'ENTITY_VERSIONS'")
+                    (table_exists,) = cursor.fetchone()
+
+                    if not table_exists:
+                        cursor.execute('''
+                        CREATE TABLE entity_versions (
+                            entity_type VARCHAR2(10) NOT NULL,
+                            entity_id NUMBER NOT NULL,
+                            version NUMBER DEFAULT 0 NOT NULL,
+                            CONSTRAINT pk_entity_versions PRIMARY KEY (entity_type, entity_id)
+                        ) ORGANIZATION INDEX
+                        ''')
+                except oracledb.DatabaseError as e:
+                    error, = e.args
+                    if error.code != 955:
+                        raise
+
+                # Create append-only change event log and consumer checkpoints
+                try:
+                    cursor.execute("SELECT COUNT(*) FROM user_tables WHERE table_name = 'CHANGE_EVENTS'")
+                    (table_exists,) = cursor.fetchone()
+
+                    if not table_exists:
+                        cursor.execute('''
+                        CREATE TABLE change_events (
+                            event_id NUMBER GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+                            event_type VARCHAR2(50) NOT NULL,
+                            entity_type VARCHAR2(20) NOT NULL,
+                            entity_id NUMBER NOT NULL,
+                            payload VARCHAR2(4000),
+                            created_at TIMESTAMP DEFAULT SYSTIMESTAMP NOT NULL
+                        )
+                        ''')
+                except oracledb.DatabaseError as e:
+                    error, = e.args
+                    if error.code != 955:
+                        raise
+
+                try:
+                    cursor.execute("SELECT COUNT(*) FROM user_tables WHERE table_name = 'EVENT_CHECKPOINTS'")
+                    (table_exists,) = cursor.fetchone()
+
+                    if not table_exists:
+                        cursor.execute('''
+                        CREATE TABLE event_checkpoints (
+                            consumer VARCHAR2(100) PRIMARY KEY,
+                            last_event_id NUMBER DEFAULT 0 NOT NULL,
+                            updated_at TIMESTAMP DEFAULT SYSTIMESTAMP
+                        )
+                        ''')
+                except oracledb.DatabaseError as e:
+                    error, = e.args
+                    if error.code != 955:
+                        raise
+
+                # Create table for the weekly demand forecasts written by forecast.py
+                try:
+                    cursor.execute("SELECT COUNT(*) FROM user_tables WHERE table_name = 'DEMAND_FORECASTS'")
+                    (table_exists,) = cursor.fetchone()
+
+                    if not table_exists:
+                        cursor.execute('''
+                        CREATE TABLE demand_forecasts (
+                            ngo_id NUMBER NOT NULL,
+                            food_type_id NUMBER NOT NULL,
+                            expected_demand NUMBER NOT NULL,
+                            expected_supply NUMBER NOT NULL,
+                            forecast_week DATE NOT NULL,
+                            CONSTRAINT pk_demand_forecasts PRIMARY KEY (ngo_id, food_type_id),
+                            CONSTRAINT fk_demand_forecasts_ngo_id FOREIGN KEY (ngo_id) REFERENCES ngos(ngo_id),
+                            CONSTRAINT fk_demand_forecasts_type_id FOREIGN KEY (food_type_id) REFERENCES food_types(food_type_id)
+                        )
+                        ''')
+                except oracledb.DatabaseError as e:
+                    error, = e.args
+                    if error.code != 955:
+                        raise
+
+                # Create search documents for open requests and donations
+                try:
+                    cursor.execute("SELECT COUNT(*) FROM user_tables WHERE table_name = 'SEARCH_DOCUMENTS'")
+                    (table_exists,) = cursor.fetchone()
+
+                    if not table_exists:
+                        cursor.execute('''
+                        CREATE TABLE search_documents (
+                            doc_type VARCHAR2(20) NOT NULL,
+                            entity_id NUMBER NOT NULL,
+                            body VARCHAR2(400) NOT NULL,
+                            expires_on DATE,
+                            CONSTRAINT pk_search_documents PRIMARY KEY (doc_type, entity_id)
+                        )
+                        ''')
+                        cursor.execute(f'''
+                        INSERT INTO search_documents (doc_type, entity_id, body)
+                        SELECT 'request', r.request_id, {REQUEST_SEARCH_BODY}
+                        FROM requests r
+                        JOIN food_types ft ON r.food_type_id = ft.food_type_id
+                        JOIN ngos n ON r.ngo_id = n.ngo_id
+                        WHERE r.status = 'Pending'
+                        ''')
+                        cursor.execute(f'''
+                        INSERT INTO search_documents (doc_type, entity_id, body, expires_on)
+                        SELECT 'donation', fd.donation_id, {DONATION_SEARCH_BODY}, fd.expiry_date
+                        FROM food_donations fd
+                        JOIN food_types ft ON fd.food_type_id = ft.food_type_id
+                        JOIN donors d ON fd.donor_id = d.donor_id
+                        WHERE fd.status = 'Available'
+                        ''')
+                except oracledb.DatabaseError as e:
+                    error, = e.args
+                    if error.code != 955:
+                        raise
+
+                # Keep search documents in step with every write path,
+                # including bulk loads and write-behind flushes. A document
+                # only exists while its request is Pending or its donation
+                # is Available, so the index stays the size of the open work
+                cursor.execute(f'''
+                CREATE OR REPLACE TRIGGER sync_request_search
+                AFTER INSERT OR DELETE OR UPDATE OF status, food_type_id, ngo_id ON requests
+                FOR EACH ROW
+                BEGIN
+                    IF DELETING OR :NEW.status <> 'Pending' THEN
+                        DELETE FROM search_documents WHERE doc_type = 'request' AND entity_id = :OLD.request_id;
+                    ELSE
+                        MERGE INTO search_documents sd
+                        USING (
+                            SELECT {REQUEST_SEARCH_BODY} AS body
+                            FROM food_types ft, ngos n
+                            WHERE ft.food_type_id = :NEW.food_type_id AND n.ngo_id = :NEW.ngo_id
+                        ) s
+                        ON (sd.doc_type = 'request' AND sd.entity_id = :NEW.request_id)
+                        WHEN MATCHED THEN UPDATE SET sd.body = s.body
+                        WHEN NOT MATCHED THEN INSERT (doc_type, entity_id, body)
+                            VALUES ('request', :NEW.request_id, s.body);
+                    END IF;
+                END;
+                ''')
+                cursor.execute(f'''
+                CREATE OR REPLACE TRIGGER sync_donation_search
+                AFTER INSERT OR DELETE OR UPDATE OF status, food_type_id, donor_id, expiry_date ON food_donations
+                FOR EACH ROW
+                BEGIN
+                    IF DELETING OR :NEW.status <> 'Available' THEN
+                        DELETE FROM search_documents WHERE doc_type = 'donation' AND entity_id = :OLD.donation_id;
+                    ELSE
+                        MERGE INTO search_documents sd
+                        USING (
+                            SELECT {DONATION_SEARCH_BODY} AS body
+                            FROM food_types ft, donors d
+                            WHERE ft.food_type_id = :NEW.food_type_id AND d.donor_id = :NEW.donor_id
+                        ) s
+                        ON (sd.doc_type = 'donation' AND sd.entity_id = :NEW.donation_id)
+                        WHEN MATCHED THEN UPDATE SET sd.body = s.body, sd.expires_on = :NEW.expiry_date
+                        WHEN NOT MATCHED THEN INSERT (doc_type, entity_id, body, expires_on)
+                            VALUES ('donation', :NEW.donation_id, s.body, :NEW.expiry_date);
+                    END IF;
+                END;
+                ''')
+
+                # Stored program units used by the NGO and analytics pages.
+                # Created once here rather than on every call, where each
+                # CREATE OR REPLACE invalidated the parsed calls to it
+                cursor.execute("""
+                CREATE OR REPLACE PROCEDURE get_ngo_request_count(
+                    p_ngo_id IN NUMBER,
+                    p_count OUT NUMBER
+                ) IS
+                BEGIN
+                    SELECT COUNT(*) INTO p_count 
+                    FROM requests 
+                    WHERE ngo_id = p_ngo_id;
+                END;
+                """)
+                cursor.execute("""
+                CREATE OR REPLACE FUNCTION get_donor_count
+                RETURN NUMBER IS
+                    v_count NUMBER;
+                BEGIN
+                    SELECT COUNT(DISTINCT donor_id) 
+                    INTO v_count 
+                    FROM food_donations;
+                    RETURN v_count;
+                END;
+                """)
+
+                # Oracle Text index over the documents. doc_type and
+                # expires_on are stored in the index too, so filtering on them
+                # doesn't go back to the table for every hit. Needs the CTXAPP
+                # role; without it the app runs and search reports an error
+                try:
+                    cursor.execute("SELECT COUNT(*) FROM user_indexes WHERE index_name = 'IDX_SEARCH_DOCUMENTS_BODY'")
+                    (index_exists,) = cursor.fetchone()
+
+                    if not index_exists:
+                        cursor.execute('''
+                        CREATE INDEX idx_search_documents_body ON search_documents(body)
+                        INDEXTYPE IS CTXSYS.CONTEXT
+                        FILTER BY doc_type, expires_on
+                        PARAMETERS ('SYNC (ON COMMIT)')
+                        ''')
+                except oracledb.DatabaseError as e:
+                    print(f"Full-text search index not created: {e}")
+
+                conn.commit()
+                
+    except oracledb.DatabaseError as e:
+        print(f"Database error: {e}")
+        raise
+
+# Query cache functions
+def cached(ttl=QUERY_CACHE_TTL):
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args):
+            key = f"query:{current_shard()}:{func.__name__}:{args!r}"
+            store = get_store()
+            result = store.get(key)
+            if result is not None:
+                return result
+
+            # On expiry every session misses at once; one of them runs the
+            # query and the rest wait for it instead of each running it
+            def load():
+                # A flight that just finished may have filled the cache
+                result = store.get(key)
+                if result is not None:
+                    return result, None
+                result, fresh, stale_at = _read_through(key, func, args)
+                # Failed calls and stale fallbacks aren't cached, so the next
+                # rerun tries the database again
+                if fresh:
+                    store.set(key, result, ttl)
+                return result, stale_at
+            return coalesced(key, func, load)
+
+        def invalidate(*args):
+            key = f"query:{current_shard()}:{func.__name__}:{args!r}"
+            get_store().delete(key)
+            _flights.forget(key)
+
+        wrapper.invalidate = invalidate
+        return wrapper
+    return decorator
+
+# Food type functions
+_food_type_ids = {}
+
+def normalize_food_type(food_type):
+    # "Rice", "rice " and "RICE" all map to the alias key "rice"
+    return " ".join(food_type.split()).lower()
+
+def get_food_type_id(cursor, food_type):
+    alias = normalize_food_type(food_type)
+    key = (current_shard(), alias)
+    if key in _food_type_ids:
+        return _food_type_ids[key]
+
+    result = sql.FOOD_TYPE_BY_ALIAS.fetchone(cursor, [alias])
+
+    if not result:
+        name = " ".join(food_type.split()).title()
+        try:
+            food_type_id_var = cursor.var(oracledb.NUMBER)
+            cursor.execute(
+                "INSERT INTO food_types (name) VALUES (:1) RETURNING food_type_id INTO :2",
+                [name, food_type_id_var]
+            )
+            food_type_id = int(food_type_id_var.getvalue()[0])
+            sql.INSERT_FOOD_TYPE_ALIAS.execute(cursor, [alias, food_type_id])
+        except oracledb.IntegrityError:
+            # The name is taken: another session registered this food type
+            # first, or this is a new spelling of a known one
+            result = sql.FOOD_TYPE_BY_ALIAS.fetchone(cursor, [alias])
+            if not result:
+                result = sql.FOOD_TYPE_BY_NAME.fetchone(cursor, [name])
+                if result:
+                    try:
+                        sql.INSERT_FOOD_TYPE_ALIAS.execute(cursor, [alias, int(result[0])])
+                    except oracledb.IntegrityError:
+                        result = sql.FOOD_TYPE_BY_ALIAS.fetchone(cursor, [alias])
+            if not result:
+                raise
+
+    if result:
+        # Only ids read back from committed rows are safe to share across sessions
+        food_type_id = int(result[0])
+        _food_type_ids[key] = food_type_id
+
+    return food_type_id
+
+@cached()
+def get_food_types():
+    try:
+        with get_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT food_type_id, name FROM food_types ORDER BY name")
+                return cursor.fetchall()
+    except oracledb.DatabaseError as e:
+        print(f"Error in get_food_types: {e}")
+        return []
+
+def get_food_type_names(food_type_ids=()):
+    # {food_type_id: name}; the cached list is reloaded when it predates a
+    # food type being asked for
+    names = dict(get_food_types())
+    if any(int(i) not in names for i in food_type_ids):
+        get_food_types.invalidate()
+        names = dict(get_food_types())
+    return names
+
+def migrate_food_types(cursor, table):
+    # Dictionary-encode the free-text food_type column into food_type_id
+    cursor.execute(f"ALTER TABLE {table} ADD (food_type_id NUMBER)")
+
+    cursor.execute(f"SELECT DISTINCT food_type FROM {table}")
+    encoded = [[get_food_type_id(cursor, food_type), food_type] for (food_type,) in cursor.fetchall()]
+    if encoded:
+        cursor.executemany(f"UPDATE {table} SET food_type_id = :1 WHERE food_type = :2", encoded)
+
+    cursor.execute(f"ALTER TABLE {table} MODIFY (food_type_id NOT NULL)")
+    cursor.execute(
+        f"ALTER TABLE {table} ADD CONSTRAINT fk_{table}_food_type_id "
+        f"FOREIGN KEY (food_type_id) REFERENCES food_types(food_type_id)"
+    )
+    cursor.execute(f"CREATE INDEX idx_{table}_food_type_id ON {table}(food_type_id)")
+    cursor.execute(f"ALTER TABLE {table} SET UNUSED (food_type)")
+    print(f"Encoded {len(encoded)} distinct food types in {table}")
+
+# Per-entity cache functions
+_entity_cache = LRUCache(ENTITY_CACHE_MAX_BYTES)
+
+def bump_entity_versions(cursor, donor_ids=(), ngo_ids=()):
+    # Runs inside the writer's transaction so readers never see new rows
+    # under an old version
+    rows = sorted({("donor", int(i)) for i in donor_ids if i is not None} |
+                  {("ngo", int(i)) for i in ngo_ids if i is not None})
+    if not rows:
+        return
+
+    sql.BUMP_ENTITY_VERSIONS.executemany(cursor, rows)
+
+def get_entity_version(entity_type, entity_id):
+    try:
+        with get_connection() as conn:
+            with conn.cursor() as cursor:
+                result = sql.ENTITY_VERSION.fetchone(cursor, [entity_type, entity_id])
+                return result[0] if result else 0
+    except oracledb.DatabaseError as e:
+        print(f"Error in get_entity_version: {e}")
+        return None
+
+def versioned(entity_type):
+    # Serves a per-entity list from memory until a write bumps the entity's
+    # version, so a rerun costs one primary-key lookup instead of the full query
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(entity_id):
+            version = get_entity_version(entity_type, entity_id)
+            if version is None:
+                return func(entity_id)
+
+            key = (current_shard(), func.__name__, entity_id, version)
+            result = _entity_cache.get(key)
+            if result is None:
+                result = func(entity_id)
+                if result:
+                    _entity_cache.set(key, result)
+            return result
+        return wrapper
+    return decorator
+
+# Change event functions
+def record_events(cursor, events):
+    # Appends (event_type, entity_type, entity_id, payload) rows to the event
+    # log inside the caller's transaction, so an event exists exactly when the
+    # state change it describes has committed
+    rows = [[event_type, entity_type, int(entity_id), json.dumps(payload, default=str)]
+            for event_type, entity_type, entity_id, payload in events]
+    if not rows:
+        return
+
+    sql.INSERT_EVENTS.executemany(cursor, rows)
+
+# Authentication functions
+def username_taken_elsewhere(username):
+    # Usernames are unique per shard by constraint; across shards this check
+    # is best effort (two sign-ups racing in different shards can both pass)
+    others = [name for name in shard_names() if name != current_shard()]
+    if not others:
+        return False
+
+    def exists():
+        with get_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT COUNT(*) FROM users WHERE username = :1", [username])
+                return cursor.fetchone()[0] > 0
+
+    return any(scatter(exists, shards=others).values())
+
+def register_user(username, password, user_type):
+    try:
+        if username_taken_elsewhere(username):
+            return None
+        # Hashed before taking a connection, which would sit idle meanwhile
+        password_hash = hash_password(password)
+        with get_connection() as conn:
+            with conn.cursor() as cursor:
+                user_id_var = cursor.var(oracledb.NUMBER)  # Create bind variable
+                cursor.execute(
+                    "INSERT INTO users (username, password, user_type) VALUES (:1, :2, :3) RETURNING user_id INTO :4",
+                    [username, password_hash, user_type, user_id_var]
+                )
+                user_id = user_id_var.getvalue()[0]  
+                conn.commit()
+                return user_id
+    except oracledb.IntegrityError:
+        return None
+
+def get_user_login(username):
+    try:
+        with get_connection() as conn:
+            with conn.cursor() as cursor:
+                result = sql.USER_LOGIN.fetchone(cursor, [username])
+
+                if result:
+                    return {"user_id": result[0], "user_type": result[1], "password": result[2],
+                            "shard": current_shard()}
+                return None
+    except oracledb.DatabaseError:
+        return None
+
+def upgrade_password_hash(user_id, old_hash, password):
+    try:
+        new_hash = hash_password(password)
+        with get_connection() as conn:
+            with conn.cursor() as cursor:
+                sql.UPGRADE_PASSWORD.execute(cursor, [new_hash, user_id, old_hash])
+                conn.commit()
+    except oracledb.DatabaseError as e:
+        print(f"Error in upgrade_password_hash: {e}")
+
+def authenticate(username, password):
+    # The login form doesn't know the user's city, so ask every shard; the
+    # returned "shard" is where the rest of the session's calls go. The hash
+    # is checked on the password pool after the connection is back in the
+    # pool. Raises PasswordHasherBusy when that pool is saturated
+    user = next((user for user in scatter(get_user_login, username).values() if user), None)
+    if user is None:
+        burn_password_check(password)
+        return None
+
+    stored = user.pop("password")
+    ok, needs_rehash = verify_password(password, stored)
+    if not ok:
+        return None
+    if needs_rehash:
+        # Legacy SHA-256 and outdated cost parameters are replaced the
+        # first time the password is seen again
+        run_in_shard(user["shard"], upgrade_password_hash, user["user_id"], stored, password)
+    return user
+
+# Profile table for each user_type
+PROFILE_TABLES = {"Donor": "donors", "NGO": "ngos"}
+
+REGISTER_ACCOUNT_SQL = '''
+    DECLARE
+        v_user_id NUMBER;
+    BEGIN
+        INSERT INTO users (username, password, user_type)
+        VALUES (:username, :password, :user_type)
+        RETURNING user_id INTO v_user_id;
+
+        IF :user_type = 'Donor' THEN
+            INSERT INTO donors (user_id, name, email, phone, street, city, latitude, longitude)
+            VALUES (v_user_id, :name, :email, :phone, :street, :city, :latitude, :longitude)
+            RETURNING donor_id INTO :entity_id;
+        ELSE
+            INSERT INTO ngos (user_id, name, email, phone, street, city, latitude, longitude)
+            VALUES (v_user_id, :name, :email, :phone, :street, :city, :latitude, :longitude)
+            RETURNING ngo_id INTO :entity_id;
+        END IF;
+
+        :user_id := v_user_id;
+    END;
+'''
+
+def register_account(username, password, user_type, name, email, phone, street, city):
+    # User and profile go in with one PL/SQL block and the commit rides on
+    # the same round trip. If either insert fails Oracle rolls back the
+    # whole block, so no orphan users row is left behind.
+    # Returns (user_id, entity_id), or None if the username is taken
+    try:
+        if username_taken_elsewhere(username):
+            return None
+        latitude, longitude = geocode(street, city)
+        password_hash = hash_password(password)
+
+        with get_connection() as conn:
+            with conn.cursor() as cursor:
+                user_id_var = cursor.var(oracledb.NUMBER)
+                entity_id_var = cursor.var(oracledb.NUMBER)
+                conn.autocommit = True
+                try:
+                    cursor.execute(REGISTER_ACCOUNT_SQL, {
+                        "username": username, "password": password_hash, "user_type": user_type,
+                        "name": name, "email": email, "phone": phone, "street": street, "city": city,
+                        "latitude": latitude, "longitude": longitude,
+                        "user_id": user_id_var, "entity_id": entity_id_var
+                    })
+                finally:
+                    # Pooled connections are shared, so don't hand it back in autocommit
+                    conn.autocommit = False
+
+                if user_type == "NGO":
+                    get_all_ngos.invalidate()
+                return int(user_id_var.getvalue()), int(entity_id_var.getvalue())
+    except oracledb.IntegrityError:
+        return None
+    except oracledb.DatabaseError as e:
+        print(f"Error in register_account: {e}")
+        return None
+
+# Donor functions
+def register_donor(user_id, name, email, phone, street, city):
+    try:
+        with get_connection() as conn:
+            with conn.cursor() as cursor:
+                # Create the bind variable for donor_id
+                donor_id_var = cursor.var(oracledb.NUMBER)
+                latitude, longitude = geocode(street, city)
+                
+                # Insert into donors table
+                cursor.execute(
+                    "INSERT INTO donors (user_id, name, email, phone, street, city, latitude, longitude) VALUES (:1, :2, :3, :4, :5, :6, :7, :8) RETURNING donor_id INTO :9",
+                    [user_id, name, email, phone, street, city, latitude, longitude, donor_id_var]
+                )
+                
+                donor_id = donor_id_var.getvalue()[0]  # Get the returned donor_id
+                
+                conn.commit()
+                return donor_id
+    except oracledb.DatabaseError as e:
+        print(f"Error in register_donor: {e}")
+        return None
+
+
+def get_donor_id_by_user_id(user_id):
+    try:
+        with get_connection() as conn:
+            with conn.cursor() as cursor:
+                result = sql.DONOR_ID_BY_USER.fetchone(cursor, [user_id])
+                
+                if result:
+                    return result[0]
+                return None
+    except oracledb.DatabaseError:
+        return None
+
+@resilient
+def get_donor_info(donor_id):
+    try:
+        with get_connection() as conn:
+            with conn.cursor() as cursor:
+                result = sql.DONOR_INFO.fetchone(cursor, [donor_id])
+                
+                if result:
+                    return {
+                        "name": result[0],
+                        "email": result[1],
+                        "phone": result[2],
+                        "street": result[3],
+                        "city": result[4],
+                        "latitude": result[5],
+                        "longitude": result[6]
+                    }
+                return None
+    except oracledb.DatabaseError as e:
+        print(f"Error in get_donor_info: {e}")
+        return None
+
+def create_donation(donor_id, food_type, donation_date, expiry_date, quantity, ngo_id=None):
+    if WRITE_BEHIND:
+        return submit_write(
+            "create_donation",
+            [donor_id, food_type, donation_date, expiry_date, quantity, ngo_id]
+        )
+
+    try:
+        with get_connection() as conn:
+            with conn.cursor() as cursor:
+                status = 'Assigned' if ngo_id else 'Available'
+                
+                # Create a bind variable to capture the donation_id
+                donation_id_var = cursor.var(oracledb.NUMBER)
+                food_type_id = get_food_type_id(cursor, food_type)
+                
+                sql.INSERT_DONATION.execute(cursor, [donor_id, food_type_id, donation_date, expiry_date,
+                                                     quantity, ngo_id, status, donation_id_var])
+                
+                donation_id = donation_id_var.getvalue()[0]
+                record_events(cursor, [("donation_created", "donation", donation_id, {
+                    "donor_id": donor_id, "ngo_id": ngo_id, "food_type_id": food_type_id,
+                    "quantity": quantity, "expiry_date": expiry_date, "status": status
+                })])
+                bump_entity_versions(cursor, donor_ids=[donor_id], ngo_ids=[ngo_id])
+                conn.commit()
+                return donation_id
+    except oracledb.DatabaseError as e:
+        print(f"Error in create_donation: {e}")
+        return None
+
+
+@resilient
+@versioned("donor")
+def get_donor_donations(donor_id):
+    try:
+        with get_connection() as conn:
+            with conn.cursor() as cursor:
+                columns = ['donation_id', 'food_type', 'donation_date', 'expiry_date', 
+                           'quantity', 'status', 'ngo_name']
+                return [dict(zip(columns, row)) for row in sql.DONOR_DONATIONS.fetchall(cursor, [donor_id])]
+    except oracledb.DatabaseError as e:
+        print(f"Error in get_donor_donations: {e}")
+        return []
+
+# NGO functions
+def register_ngo(user_id, name, email, phone, street, city):
+    try:
+        with get_connection() as conn:
+            with conn.cursor() as cursor:
+                # Create bind variable for ngo_id
+                ngo_id_var = cursor.var(oracledb.NUMBER)
+                latitude, longitude = geocode(street, city)
+
+                # Insert into ngos table
+                cursor.execute(
+                    "INSERT INTO ngos (user_id, name, email, phone, street, city, latitude, longitude) VALUES (:1, :2, :3, :4, :5, :6, :7, :8) RETURNING ngo_id INTO :9",
+                    [user_id, name, email, phone, street, city, latitude, longitude, ngo_id_var]
+                )
+                ngo_id = ngo_id_var.getvalue()[0]  # Get actual value
+
+                conn.commit()
+                get_all_ngos.invalidate()
+                return ngo_id
+    except oracledb.DatabaseError as e:
+        print(f"Error in register_ngo: {e}")
+        return None
+
+
+def get_ngo_id_by_user_id(user_id):
+    try:
+        with get_connection() as conn:
+            with conn.cursor() as cursor:
+                result = sql.NGO_ID_BY_USER.fetchone(cursor, [user_id])
+                
+                if result:
+                    return result[0]
+                return None
+    except oracledb.DatabaseError:
+        return None
+
+@resilient
+def get_ngo_info(ngo_id):
+    try:
+        with get_connection() as conn:
+            with conn.cursor() as cursor:
+                result = sql.NGO_INFO.fetchone(cursor, [ngo_id])
+                
+                if result:
+                    return {
+                        "name": result[0],
+                        "email": result[1],
+                        "phone": result[2],
+                        "street": result[3],
+                        "city": result[4],
+                        "latitude": result[5],
+                        "longitude": result[6]
+                    }
+                return None
+    except oracledb.DatabaseError as e:
+        print(f"Error in get_ngo_info: {e}")
+        return None
+
+def create_request(ngo_id, food_type, quantity):
+    if WRITE_BEHIND:
+        return submit_write("create_request", [ngo_id, food_type, quantity])
+
+    try:
+        with get_connection() as conn:
+            with conn.cursor() as cursor:
+                request_date = datetime.date.today()
+                
+                # Create bind variable for request_id
+                request_id_var = cursor.var(oracledb.NUMBER)
+                food_type_id = get_food_type_id(cursor, food_type)
+                
+                sql.INSERT_REQUEST.execute(cursor, [ngo_id, food_type_id, quantity, request_date, request_id_var])
+                
+                request_id = request_id_var.getvalue()[0]  # Retrieve actual ID
+                record_events(cursor, [("request_created", "request", request_id, {
+                    "ngo_id": ngo_id, "food_type_id": food_type_id, "quantity": quantity,
+                    "status": "Pending"
+                })])
+                bump_entity_versions(cursor, ngo_ids=[ngo_id])
+                conn.commit()
+                invalidate_proximity_index()
+                return request_id
+    except oracledb.DatabaseError as e:
+        print(f"Error in create_request: {e}")
+        return None
+
+@resilient
+def get_all_pending_requests():
+    try:
+        with get_connection() as conn:
+            with conn.cursor() as cursor:
+                columns = ['request_id', 'food_type', 'quantity', 'request_date', 
+                           'status', 'ngo_id', 'ngo_name']
+                return [dict(zip(columns, row)) for row in sql.PENDING_REQUESTS.fetchall(cursor)]
+    except oracledb.DatabaseError as e:
+        print(f"Error in get_all_pending_requests: {e}")
+        return []
+
+def create_donation_for_request(donor_id, food_type, donation_date, expiry_date, quantity, ngo_id, request_id):
+    try:
+        with get_connection() as conn:
+            with conn.cursor() as cursor:
+                # Create a bind variable to capture the donation_id
+                donation_id_var = cursor.var(oracledb.NUMBER)
+                food_type_id = get_food_type_id(cursor, food_type)
+                
+                # Insert the donation
+                sql.INSERT_DONATION.execute(cursor, [donor_id, food_type_id, donation_date, expiry_date,
+                                                     quantity, ngo_id, 'Assigned', donation_id_var])
+                
+                donation_id = donation_id_var.getvalue()[0]
+                
+                # Update request with donation_id and status
+                sql.FULFIL_REQUEST.execute(cursor, [donation_id, request_id])
+                if cursor.rowcount == 0:
+                    # Fulfilled (or withdrawn) by someone else meanwhile
+                    conn.rollback()
+                    print(f"Error in create_donation_for_request: request {request_id} is no longer pending")
+                    return None
+                
+                record_events(cursor, [
+                    ("donation_created", "donation", donation_id, {
+                        "donor_id": donor_id, "ngo_id": ngo_id, "food_type_id": food_type_id,
+                        "quantity": quantity, "expiry_date": expiry_date, "status": "Assigned",
+                        "request_id": request_id
+                    }),
+                    ("request_fulfilled", "request", request_id, {
+                        "ngo_id": ngo_id, "donor_id": donor_id, "donation_id": donation_id,
+                        "previous_status": "Pending", "status": "Fulfilled"
+                    }),
+                ])
+                bump_entity_versions(cursor, donor_ids=[donor_id], ngo_ids=[ngo_id])
+                conn.commit()
+                invalidate_proximity_index()
+                return donation_id
+    except oracledb.DatabaseError as e:
+        print(f"Error in create_donation_for_request: {e}")
+        return None
+
+
+
+
+
+@resilient
+@versioned("ngo")
+def get_ngo_requests(ngo_id):
+    try:
+        with get_connection() as conn:
+            with conn.cursor() as cursor:
+                # Create output variable
+                count_var = cursor.var(oracledb.NUMBER)
+                
+                # Execute procedure
+                cursor.callproc("get_ngo_request_count", [ngo_id, count_var])
+                
+                # If no requests, return empty list
+                if count_var.getvalue() == 0:
+                    return []
+                    
+                # If has requests, get them with regular SQL
+                columns = ['request_id', 'food_type', 'quantity', 'request_date', 'status']
+                return [dict(zip(columns, row)) for row in sql.NGO_REQUESTS.fetchall(cursor, [ngo_id])]
+                
+    except oracledb.DatabaseError as e:
+        print(f"Error in get_ngo_requests: {e}")
+        return []
+
+@cached()
+def get_all_ngos():
+    try:
+        with get_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT ngo_id, name FROM ngos ORDER BY name")
+                return cursor.fetchall()
+    except oracledb.DatabaseError as e:
+        print(f"Error in get_all_ngos: {e}")
+        return []
+
+# Available donation functions
+AVAILABLE_PAGE_SIZE = int(os.getenv("AVAILABLE_PAGE_SIZE", "20"))
+
+def get_available_donations(after=None, limit=AVAILABLE_PAGE_SIZE):
+    # Keyset pagination on (expiry_date, donation_id): `after` is the last row
+    # key of the previous page, so every page is a short range scan of
+    # idx_food_donations_status_expiry however deep the user pages.
+    # Returns (rows, next_key); next_key is None on the last page
+    try:
+        with get_connection() as conn:
+            with conn.cursor() as cursor:
+                if after is None:
+                    rows = sql.AVAILABLE_DONATIONS.fetchall(cursor, {"limit": limit + 1})
+                else:
+                    after_date, after_id = after
+                    rows = sql.AVAILABLE_DONATIONS_AFTER.fetchall(
+                        cursor, {"after_date": after_date, "after_id": after_id, "limit": limit + 1}
+                    )
+
+                columns = ['donation_id', 'food_type', 'quantity', 'expiry_date',
+                           'donation_date', 'donor_name', 'donor_city']
+                result = [dict(zip(columns, row)) for row in rows[:limit]]
+
+                next_key = None
+                if len(rows) > limit:
+                    next_key = (result[-1]['expiry_date'], result[-1]['donation_id'])
+                return result, next_key
+    except oracledb.DatabaseError as e:
+        print(f"Error in get_available_donations: {e}")
+        return [], None
+
+def _assign_claimed_donation(cursor, donation_id, donor_id, ngo_id):
+    sql.ASSIGN_DONATION.execute(cursor, [ngo_id, donation_id])
+    record_events(cursor, [("donation_claimed", "donation", donation_id, {
+        "donor_id": donor_id, "ngo_id": ngo_id, "previous_status": "Available", "status": "Assigned"
+    })])
+    bump_entity_versions(cursor, donor_ids=[donor_id], ngo_ids=[ngo_id])
+
+def claim_donation(donation_id, ngo_id):
+    # SKIP LOCKED makes a row another NGO is claiming right now look already
+    # taken, so claimers never queue behind each other's row locks. Returns
+    # None when the donation is gone or being claimed
+    try:
+        with get_connection() as conn:
+            with conn.cursor() as cursor:
+                result = sql.LOCK_AVAILABLE_DONATION.fetchone(cursor, [donation_id])
+                if not result:
+                    conn.rollback()
+                    return None
+
+                _assign_claimed_donation(cursor, donation_id, result[0], ngo_id)
+                conn.commit()
+                return donation_id
+    except oracledb.DatabaseError as e:
+        print(f"Error in claim_donation: {e}")
+        return None
+
+def claim_next_available(ngo_id):
+    # Claims the soonest-expiring donation nobody else holds; concurrent
+    # claimers each get a different donation
+    try:
+        with get_connection() as conn:
+            with conn.cursor() as cursor:
+                result = sql.LOCK_NEXT_AVAILABLE.fetchone(cursor)
+                if not result:
+                    conn.rollback()
+                    return None
+
+                donation_id, donor_id = result
+                _assign_claimed_donation(cursor, donation_id, donor_id, ngo_id)
+                conn.commit()
+                return donation_id
+    except oracledb.DatabaseError as e:
+        print(f"Error in claim_next_available: {e}")
+        return None
+
+# Search functions
+SEARCH_PAGE_SIZE = int(os.getenv("SEARCH_PAGE_SIZE", "20"))
+SEARCH_MAX_TERMS = 8
+
+def search_query(text):
+    # Turns free text into an Oracle Text query. Terms are combined with
+    # ACCUM, so documents matching more of them score higher, and each is
+    # wrapped in braces so words like "and" or "near" aren't read as operators
+    terms = re.findall(r"[^\W_]+", text.lower())[:SEARCH_MAX_TERMS]
+    if not terms:
+        return None
+    return " ACCUM ".join(f"{{{term}}}" for term in terms)
+
+def search_pending_requests(text, page=0, limit=SEARCH_PAGE_SIZE):
+    # Pending requests matching food type, NGO name or city, best match
+    # first. Only the page of hits is joined back to the base tables.
+    # Returns (rows, has_more)
+    query = search_query(text)
+    if not query:
+        return [], False
+    try:
+        with get_connection() as conn:
+            with conn.cursor() as cursor:
+                rows = sql.SEARCH_REQUESTS.fetchall(
+                    cursor, {"query": query, "offset": page * limit, "limit": limit + 1}
+                )
+
+                columns = ['request_id', 'food_type', 'quantity', 'request_date',
+                           'status', 'ngo_id', 'ngo_name', 'score']
+                return [dict(zip(columns, row)) for row in rows[:limit]], len(rows) > limit
+    except oracledb.DatabaseError as e:
+        print(f"Error in search_pending_requests: {e}")
+        return [], False
+
+def search_available_donations(text, page=0, limit=SEARCH_PAGE_SIZE):
+    # Unexpired Available donations matching food type, donor name or city,
+    # best match first. Returns (rows, has_more)
+    query = search_query(text)
+    if not query:
+        return [], False
+    try:
+        with get_connection() as conn:
+            with conn.cursor() as cursor:
+                rows = sql.SEARCH_DONATIONS.fetchall(
+                    cursor, {"query": query, "offset": page * limit, "limit": limit + 1}
+                )
+
+                columns = ['donation_id', 'food_type', 'quantity', 'expiry_date',
+                           'donation_date', 'donor_name', 'donor_city', 'score']
+                return [dict(zip(columns, row)) for row in rows[:limit]], len(rows) > limit
+    except oracledb.DatabaseError as e:
+        print(f"Error in search_available_donations: {e}")
+        return [], False
+
+# Location functions
+PROXIMITY_INDEX_TTL = int(os.getenv("PROXIMITY_INDEX_TTL", "60"))
+
+_proximity_indexes = {}
+
+def geocode_missing_locations(cursor):
+    # One-off backfill for donors/NGOs registered before coordinates were stored
+    for table, id_column in (("donors", "donor_id"), ("ngos", "ngo_id")):
+        cursor.execute(f"SELECT {id_column}, street, city FROM {table} WHERE latitude IS NULL")
+        updates = []
+        for entity_id, street, city in cursor.fetchall():
+            latitude, longitude = geocode(street, city)
+            if latitude is not None:
+                updates.append([latitude, longitude, entity_id])
+
+        if updates:
+            cursor.executemany(
+                f"UPDATE {table} SET latitude = :1, longitude = :2 WHERE {id_column} = :3",
+                updates
+            )
+
+@resilient
+def get_open_request_ngo_locations():
+    try:
+        with get_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute('''
+                SELECT n.ngo_id, n.latitude, n.longitude
+                FROM ngos n
+                WHERE n.latitude IS NOT NULL
+                  AND EXISTS (SELECT 1 FROM requests r WHERE r.ngo_id = n.ngo_id AND r.status = 'Pending')
+                ''')
+                return cursor.fetchall()
+    except oracledb.DatabaseError as e:
+        print(f"Error in get_open_request_ngo_locations: {e}")
+        return []
+
+def invalidate_proximity_index():
+    _proximity_indexes.pop(current_shard(), None)
+
+def get_proximity_index():
+    # Built once per shard and shared by every session in this process;
+    # requests created here invalidate it immediately, other replicas'
+    # requests show up after the TTL
+    shard = current_shard()
+    entry = _proximity_indexes.get(shard)
+    if entry is None or time.time() - entry[1] > PROXIMITY_INDEX_TTL:
+        entry = (ProximityIndex(get_open_request_ngo_locations()), time.time())
+        _proximity_indexes[shard] = entry
+    return entry[0]
+
+def get_nearest_ngos(latitude, longitude, limit=5):
+    # Returns [(ngo_id, distance_km), ...] for NGOs with open requests
+    return get_proximity_index().nearest(latitude, longitude, k=limit)
+
+# Write-behind functions
+_write_queues = {}
+_write_queues_lock = threading.Lock()
+
+def flush_donations(items):
+    with get_connection() as conn:
+        with conn.cursor() as cursor:
+            rows = []
+            for donor_id, food_type, donation_date, expiry_date, quantity, ngo_id in items:
+                status = 'Assigned' if ngo_id else 'Available'
+                rows.append([donor_id, get_food_type_id(cursor, food_type), donation_date,
+                             expiry_date, quantity, ngo_id, status])
+
+            # One array-bound insert and one commit for the whole batch
+            donation_id_var = cursor.var(oracledb.NUMBER, arraysize=len(rows))
+            sql.INSERT_DONATION.executemany(cursor, rows, returning=donation_id_var)
+
+            donation_ids = [donation_id_var.getvalue(i)[0] for i in range(len(rows))]
+            record_events(cursor, [
+                ("donation_created", "donation", donation_id, {
+                    "donor_id": row[0], "ngo_id": row[5], "food_type_id": row[1],
+                    "quantity": row[4], "expiry_date": row[3], "status": row[6]
+                })
+                for donation_id, row in zip(donation_ids, rows)
+            ])
+            bump_entity_versions(cursor, donor_ids=[row[0] for row in rows], ngo_ids=[row[5] for row in rows])
+            conn.commit()
+
+            return donation_ids
+
+def flush_requests(items):
+    with get_connection() as conn:
+        with conn.cursor() as cursor:
+            request_date = datetime.date.today()
+            rows = [[ngo_id, get_food_type_id(cursor, food_type), quantity, request_date]
+                    for ngo_id, food_type, quantity in items]
+
+            request_id_var = cursor.var(oracledb.NUMBER, arraysize=len(rows))
+            sql.INSERT_REQUEST.executemany(cursor, rows, returning=request_id_var)
+
+            request_ids = [request_id_var.getvalue(i)[0] for i in range(len(rows))]
+            record_events(cursor, [
+                ("request_created", "request", request_id, {
+                    "ngo_id": row[0], "food_type_id": row[1], "quantity": row[2], "status": "Pending"
+                })
+                for request_id, row in zip(request_ids, rows)
+            ])
+            bump_entity_versions(cursor, ngo_ids=[row[0] for row in rows])
+            conn.commit()
+            invalidate_proximity_index()
+
+            return request_ids
+
+WRITE_FLUSHERS = {
+    "create_donation": flush_donations,
+    "create_request": flush_requests,
+}
+
+def get_write_queue(name):
+    # The worker thread has no session context, so each shard gets its own
+    # queue whose flusher runs pinned to that shard
+    key = (name, current_shard())
+    if key not in _write_queues:
+        with _write_queues_lock:
+            if key not in _write_queues:
+                _write_queues[key] = WriteBehindQueue(
+                    f"{name}[{key[1]}]",
+                    functools.partial(run_in_shard, key[1], WRITE_FLUSHERS[name]),
+                    max_size=WRITE_BEHIND_QUEUE_SIZE,
+                    batch_size=WRITE_BEHIND_BATCH_SIZE
+                )
+    return _write_queues[key]
+
+def submit_write(name, item):
+    # Waits for the batch containing this row to commit and returns its id,
+    # or WRITE_PENDING if it is queued but hasn't committed in time. None
+    # means the row was never written and is safe to submit again
+    try:
+        return get_write_queue(name).submit(item).result(timeout=WRITE_BEHIND_TIMEOUT)
+    except QueueFullError as e:
+        print(f"Error in {name}: {e}")
+        return None
+    except FutureTimeoutError:
+        print(f"Warning in {name}: still queued after {WRITE_BEHIND_TIMEOUT}s")
+        return WRITE_PENDING
+    except oracledb.DatabaseError as e:
+        print(f"Error in {name}: {e}")
+        return None
+
+# Analytics functions
+def get_donation_statistics():
+    # Global: every shard aggregates its own donations, then the per food
+    # type rows are merged here
+    return _merge_donation_statistics(scatter(get_shard_donation_statistics).values())
+
+def _merge_donation_statistics(shard_results):
+    merged = {}
+    for rows in shard_results:
+        for row in rows:
+            item = merged.get(row['food_type'])
+            if item is None:
+                merged[row['food_type']] = dict(row)
+                continue
+            item['total_donations'] += row['total_donations']
+            item['total_quantity'] += row['total_quantity']
+            item['first_donation'] = min(item['first_donation'], row['first_donation'])
+            item['last_donation'] = max(item['last_donation'], row['last_donation'])
+
+    for item in merged.values():
+        item['avg_quantity'] = item['total_quantity'] / item['total_donations']
+    return sorted(merged.values(), key=lambda r: r['total_quantity'], reverse=True)
+
+@cached()
+def get_shard_donation_statistics():
+    try:
+        with get_connection() as conn:
+            with conn.cursor() as cursor:
+                # Using GROUP BY for analytics
+                cursor.execute('''
+                SELECT 
+                    ft.name as food_type, 
+                    s.total_donations,
+                    s.total_quantity,
+                    s.avg_quantity,
+                    TO_CHAR(s.first_donation, 'YYYY-MM-DD') as first_donation,
+                    TO_CHAR(s.last_donation, 'YYYY-MM-DD') as last_donation
+                FROM (
+                    SELECT 
+                        food_type_id, 
+                        COUNT(donation_id) as total_donations,
+                        SUM(quantity) as total_quantity,
+                        AVG(quantity) as avg_quantity,
+                        MIN(donation_date) as first_donation,
+                        MAX(donation_date) as last_donation
+                    FROM food_donations
+                    GROUP BY food_type_id
+                ) s
+                JOIN food_types ft ON s.food_type_id = ft.food_type_id
+                ORDER BY s.total_quantity DESC
+                ''')
+                
+                columns = ['food_type', 'total_donations', 'total_quantity', 
+                           'avg_quantity', 'first_donation', 'last_donation']
+                
+                result = []
+                for row in cursor:
+                    result.append(dict(zip(columns, row)))
+                
+                return result
+    except oracledb.DatabaseError as e:
+        print(f"Error in get_shard_donation_statistics: {e}")
+        return []
+
+def get_donation_trends():
+    return _merge_donation_trends(scatter(get_shard_donation_trends).values())
+
+def _merge_donation_trends(shard_results):
+    # A donor lives in exactly one shard, so active donors add up across shards
+    merged = {}
+    for rows in shard_results:
+        for row in rows:
+            item = merged.get(row['month'])
+            if item is None:
+                merged[row['month']] = dict(row)
+                continue
+            item['donation_count'] += row['donation_count']
+            item['total_quantity'] += row['total_quantity']
+            item['active_donors'] += row['active_donors']
+    return [merged[month] for month in sorted(merged)]
+
+@cached()
+def get_shard_donation_trends():
+    try:
+        with get_connection() as conn:
+            with conn.cursor() as cursor:
+                # Using Oracle's date functions for analytics
+                cursor.execute('''
+                SELECT 
+                    TO_CHAR(donation_date, 'YYYY-MM') as month,
+                    COUNT(donation_id) as donation_count,
+                    SUM(quantity) as total_quantity,
+                    (SELECT COUNT(DISTINCT donor_id) 
+                     FROM food_donations fd2 
+                     WHERE TO_CHAR(fd2.donation_date, 'YYYY-MM') = TO_CHAR(fd.donation_date, 'YYYY-MM')
+                    ) as active_donors
+                FROM food_donations fd
+                WHERE donation_date >= ADD_MONTHS(TRUNC(SYSDATE), -12)
+                GROUP BY TO_CHAR(donation_date, 'YYYY-MM')
+                ORDER BY month
+                ''')
+                
+                columns = ['month', 'donation_count', 'total_quantity', 'active_donors']
+                
+                result = []
+                for row in cursor:
+                    result.append(dict(zip(columns, row)))
+                
+                return result
+    except oracledb.DatabaseError as e:
+        print(f"Error in get_shard_donation_trends: {e}")
+        return []
+
+def get_ngo_donation_distribution():
+    return _merge_ngo_donation_distribution(scatter(get_shard_ngo_donation_distribution).values())
+
+def _merge_ngo_donation_distribution(shard_results):
+    # An NGO lives in exactly one shard, so its row comes from that shard alone
+    rows = [row for rows in shard_results for row in rows]
+    rows.sort(key=lambda r: r['total_quantity'], reverse=True)
+    return rows
+
+@cached()
+def get_shard_ngo_donation_distribution():
+    try:
+        with get_connection() as conn:
+            with conn.cursor() as cursor:
+                # Using JOIN and GROUP BY together
+                cursor.execute('''
+                SELECT 
+                    n.name as ngo_name,
+                    COUNT(fd.donation_id) as donations_received,
+                    SUM(fd.quantity) as total_quantity
+                FROM ngos n
+                JOIN food_donations fd ON n.ngo_id = fd.ngo_id
+                GROUP BY n.ngo_id, n.name
+                ORDER BY total_quantity DESC
+                ''')
+                
+                columns = ['ngo_name', 'donations_received', 'total_quantity']
+                
+                result = []
+                for row in cursor:
+                    result.append(dict(zip(columns, row)))
+                
+                return result
+    except oracledb.DatabaseError as e:
+        print(f"Error in get_shard_ngo_donation_distribution: {e}")
+        return []
+
+TOP_DONORS_LIMIT = 10
+
+def get_top_donors():
+    return _merge_top_donors(scatter(get_shard_top_donors).values())
+
+def _merge_top_donors(shard_results):
+    # A donor lives in exactly one shard, so the global top N is the top N
+    # of the union of each shard's top N
+    donors = [row for rows in shard_results for row in rows]
+    donors.sort(key=lambda r: r['total_donated'], reverse=True)
+    return donors[:TOP_DONORS_LIMIT]
+
+@cached()
+def get_shard_top_donors():
+    try:
+        with get_connection() as conn:
+            with conn.cursor() as cursor:
+                # Create output variable and execute function correctly
+                result = cursor.var(oracledb.NUMBER)
+                cursor.execute("BEGIN :result := get_donor_count(); END;", {'result': result})
+                donor_count = result.getvalue()
+                
+                # If no donors, return empty list
+                if donor_count == 0:
+                    return []
+                    
+                # If has donors, get them with regular SQL
+                cursor.execute('''
+                    SELECT 
+                        d.name as donor_name,
+                        COUNT(fd.donation_id) as donation_count,
+                        SUM(fd.quantity) as total_donated
+                    FROM donors d
+                    JOIN food_donations fd ON d.donor_id = fd.donor_id
+                    GROUP BY d.donor_id, d.name
+                    ORDER BY total_donated DESC
+                    FETCH FIRST :limit ROWS ONLY
+                ''', {'limit': TOP_DONORS_LIMIT})
+                
+                columns = ['donor_name', 'donation_count', 'total_donated']
+                return [dict(zip(columns, row)) for row in cursor.fetchall()]
+                
+    except oracledb.DatabaseError as e:
+        print(f"Error in get_shard_top_donors: {e}")
+        return []
+
+# Approximate analytics functions
+SKETCH_FETCH_SIZE = 10000
+# Ids re-read below the watermark on each refresh, to fold in transactions
+# that committed after a higher id had been folded
+SKETCH_OVERLAP = 1000
+
+def _fetch_blobs_as_bytes(cursor, metadata):
+    if metadata.type_code is oracledb.DB_TYPE_BLOB:
+        return cursor.var(oracledb.DB_TYPE_LONG_RAW, arraysize=cursor.arraysize)
+
+def lock_watermark(cursor, name):
+    # The row lock also keeps two replicas from folding the same rows twice
+    for _ in range(2):
+        cursor.execute("SELECT last_id FROM analytics_watermarks WHERE name = :1 FOR UPDATE", [name])
+        result = cursor.fetchone()
+        if result:
+            return result[0]
+        try:
+            cursor.execute("INSERT INTO analytics_watermarks (name, last_id) VALUES (:1, 0)", [name])
+            return 0
+        except oracledb.IntegrityError:
+            continue
+    raise RuntimeError(f"Could not lock watermark {name}")
+
+def refresh_donation_sketches():
+    # Folds donations added since the last refresh into the per month and
+    # food type sketches, so the cost depends on new rows, not history.
+    # Counts and totals aren't idempotent, so ids in the overlap window are
+    # checked against sketched_donations before folding. A transaction that
+    # commits more than SKETCH_OVERLAP ids late is still missed
+    try:
+        with get_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.outputtypehandler = _fetch_blobs_as_bytes
+                last_id = lock_watermark(cursor, "donation_sketches")
+
+                cursor.arraysize = SKETCH_FETCH_SIZE
+                cursor.execute('''
+                    SELECT donation_id, TO_CHAR(donation_date, 'YYYY-MM'), food_type_id,
+                           donor_id, quantity, donation_date
+                    FROM food_donations d
+                    WHERE donation_id > :1
+                      AND (donation_id > :2 OR NOT EXISTS (
+                          SELECT 1 FROM sketched_donations s WHERE s.donation_id = d.donation_id))
+                ''', [max(last_id - SKETCH_OVERLAP, 0), last_id])
+
+                cells = {}
+                max_id = last_id
+                folded = []
+                while True:
+                    rows = cursor.fetchmany()
+                    if not rows:
+                        break
+
+                    groups = {}
+                    for donation_id, month, food_type_id, donor_id, quantity, donation_date in rows:
+                        groups.setdefault((month, int(food_type_id)), []).append((donor_id, quantity, donation_date))
+                        max_id = max(max_id, donation_id)
+                        folded.append([donation_id])
+
+                    for key, values in groups.items():
+                        cell = cells.setdefault(key, {
+                            "count": 0, "total": 0.0, "first": None, "last": None,
+                            "hll": sketches.HyperLogLog(), "quantiles": sketches.QuantileSketch()
+                        })
+                        donor_ids, quantities, dates = zip(*values)
+                        cell["count"] += len(values)
+                        cell["total"] += float(sum(quantities))
+                        cell["first"] = min(dates) if cell["first"] is None else min(cell["first"], min(dates))
+                        cell["last"] = max(dates) if cell["last"] is None else max(cell["last"], max(dates))
+                        cell["hll"].add(donor_ids)
+                        cell["quantiles"].add(quantities)
+
+                if not cells:
+                    conn.rollback()
+                    return 0
+
+                # Merge the new rows into the stored sketches for the touched cells
+                months = sorted({month for month, _ in cells})
+                cursor.execute(f'''
+                    SELECT month, food_type_id, donation_count, total_quantity,
+                           first_donation, last_donation, donors_hll, quantity_quantiles
+                    FROM donation_sketches
+                    WHERE month IN ({", ".join(f":{i + 1}" for i in range(len(months)))})
+                ''', months)
+                for month, food_type_id, count, total, first, last, hll, quantiles in cursor.fetchall():
+                    cell = cells.get((month, int(food_type_id)))
+                    if cell is None:
+                        continue
+                    cell["count"] += count
+                    cell["total"] += float(total)
+                    cell["first"] = min(cell["first"], first) if first else cell["first"]
+                    cell["last"] = max(cell["last"], last) if last else cell["last"]
+                    cell["hll"].merge(sketches.loads(hll))
+                    cell["quantiles"].merge(sketches.loads(quantiles))
+
+                cursor.setinputsizes(hll=oracledb.DB_TYPE_BLOB, quantiles=oracledb.DB_TYPE_BLOB)
+                cursor.executemany('''
+                    MERGE INTO donation_sketches s
+                    USING (SELECT :month AS month, :food_type_id AS food_type_id FROM dual) k
+                    ON (s.month = k.month AND s.food_type_id = k.food_type_id)
+                    WHEN MATCHED THEN UPDATE SET
+                        donation_count = :count, total_quantity = :total,
+                        first_donation = :first, last_donation = :last,
+                        donors_hll = :hll, quantity_quantiles = :quantiles
+                    WHEN NOT MATCHED THEN INSERT
+                        (month, food_type_id, donation_count, total_quantity,
+                         first_donation, last_donation, donors_hll, quantity_quantiles)
+                    VALUES (k.month, k.food_type_id, :count, :total, :first, :last, :hll, :quantiles)
+                ''', [
+                    {"month": month, "food_type_id": food_type_id, "count": cell["count"],
+                     "total": cell["total"], "first": cell["first"], "last": cell["last"],
+                     "hll": sketches.dumps(cell["hll"]), "quantiles": sketches.dumps(cell["quantiles"])}
+                    for (month, food_type_id), cell in cells.items()
+                ])
+
+                cursor.executemany("INSERT INTO sketched_donations (donation_id) VALUES (:1)", folded)
+                cursor.execute("DELETE FROM sketched_donations WHERE donation_id <= :1", [max_id - SKETCH_OVERLAP])
+                cursor.execute(
+                    "UPDATE analytics_watermarks SET last_id = :1 WHERE name = 'donation_sketches'",
+                    [max_id]
+                )
+                conn.commit()
+                return len(cells)
+    except (oracledb.DatabaseError, ValueError) as e:
+        # ValueError: a stored sketch that doesn't load; nothing is written
+        print(f"Error in refresh_donation_sketches: {e}")
+        return None
+
+# Sketches can't go through the shared store, so the merged results are
+# cached instead; each shard's sketches are read and merged here
+def _load_shard_food_type_sketches():
+    refresh_donation_sketches()
+
+    try:
+        with get_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.outputtypehandler = _fetch_blobs_as_bytes
+                cursor.execute('''
+                    SELECT ft.name, s.donation_count, s.total_quantity,
+                           s.first_donation, s.last_donation, s.quantity_quantiles
+                    FROM donation_sketches s
+                    JOIN food_types ft ON s.food_type_id = ft.food_type_id
+                ''')
+                return cursor.fetchall()
+    except oracledb.DatabaseError as e:
+        print(f"Error in _load_shard_food_type_sketches: {e}")
+        return []
+
+def _load_shard_month_sketches():
+    refresh_donation_sketches()
+
+    try:
+        with get_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.outputtypehandler = _fetch_blobs_as_bytes
+                cursor.execute('''
+                    SELECT month, donation_count, total_quantity, donors_hll
+                    FROM donation_sketches
+                    WHERE month >= TO_CHAR(ADD_MONTHS(TRUNC(SYSDATE), -12), 'YYYY-MM')
+                ''')
+                return cursor.fetchall()
+    except oracledb.DatabaseError as e:
+        print(f"Error in _load_shard_month_sketches: {e}")
+        return []
+
+@cached()
+def get_donation_statistics_approx():
+    merged = {}
+    try:
+        for rows in scatter(_load_shard_food_type_sketches).values():
+            for name, count, total, first, last, quantiles in rows:
+                item = merged.setdefault(name, {
+                    "count": 0, "total": 0.0, "first": first, "last": last,
+                    "quantiles": sketches.QuantileSketch()
+                })
+                item["count"] += count
+                item["total"] += float(total)
+                item["first"] = min(item["first"], first)
+                item["last"] = max(item["last"], last)
+                item["quantiles"].merge(sketches.loads(quantiles))
+    except ValueError as e:
+        print(f"Error in get_donation_statistics_approx: {e}")
+        return []
+
+    result = [{
+        "food_type": name,
+        "total_donations": item["count"],
+        "total_quantity": item["total"],
+        "avg_quantity": item["total"] / item["count"],
+        "median_quantity": item["quantiles"].quantile(0.5),
+        "p90_quantity": item["quantiles"].quantile(0.9),
+        "first_donation": item["first"].strftime("%Y-%m-%d"),
+        "last_donation": item["last"].strftime("%Y-%m-%d")
+    } for name, item in merged.items()]
+    result.sort(key=lambda r: r["total_quantity"], reverse=True)
+    return result
+
+@cached()
+def get_donation_trends_approx():
+    months = {}
+    try:
+        for rows in scatter(_load_shard_month_sketches).values():
+            for month, count, total, hll in rows:
+                item = months.setdefault(month, {"count": 0, "total": 0.0, "donors": sketches.HyperLogLog()})
+                item["count"] += count
+                item["total"] += float(total)
+                item["donors"].merge(sketches.loads(hll))
+    except ValueError as e:
+        print(f"Error in get_donation_trends_approx: {e}")
+        return []
+
+    return [{
+        "month": month,
+        "donation_count": item["count"],
+        "total_quantity": item["total"],
+        "active_donors": round(item["donors"].estimate())
+    } for month, item in sorted(months.items())]
+
+# In-memory columnar analytics functions
+COLUMNAR_MAX_BYTES = int(os.getenv("COLUMNAR_MAX_BYTES", str(256 * 1024 * 1024)))
+# How often (s) a store is topped up with new donations and claims, and
+# rebuilt from scratch to drop anything the incremental path missed
+COLUMNAR_REFRESH_INTERVAL = float(os.getenv("COLUMNAR_REFRESH_INTERVAL", "5"))
+COLUMNAR_REBUILD_INTERVAL = float(os.getenv("COLUMNAR_REBUILD_INTERVAL", str(60 * 60)))
+# Ids re-read below each watermark, to pick up transactions that committed
+# after a higher id had been read
+COLUMNAR_OVERLAP = 1000
+COLUMNAR_FETCH_SIZE = 10000
+
+_column_stores = {}
+_column_store_locks = {}
+_column_store_locks_lock = threading.Lock()
+_donor_names = {}
+
+DONATION_COLUMNS_SQL = '''
+    SELECT donation_id, food_type_id, donor_id, NVL(ngo_id, 0),
+           TRUNC(donation_date) - DATE '1970-01-01', quantity
+    FROM food_donations
+    WHERE donation_id > :after_id AND donation_date >= DATE '1970-01-01' + :since_day
+'''
+
+CLAIM_EVENTS_SQL = '''
+    SELECT event_id, entity_id, JSON_VALUE(payload, '$.ngo_id' RETURNING NUMBER)
+    FROM change_events
+    WHERE event_id > :after_id AND event_type = 'donation_claimed'
+'''
+
+def _fetch_columns(cursor, statement, binds, columns):
+    # Fetches in batches straight into one float array, one row per result row
+    cursor.arraysize = COLUMNAR_FETCH_SIZE
+    cursor.execute(statement, binds)
+    batches = []
+    while True:
+        rows = cursor.fetchmany()
+        if not rows:
+            break
+        batches.append(np.array(rows, dtype=np.float64))
+    return np.concatenate(batches) if batches else np.empty((0, columns))
+
+def _column_store_lock(shard):
+    with _column_store_locks_lock:
+        return _column_store_locks.setdefault(shard, threading.RLock())
+
+def _top_up_column_store(cursor, store):
+    # Donations added since the last read, then claims, which are the only
+    # update to a donation the aggregates depend on
+    rows = _fetch_columns(cursor, DONATION_COLUMNS_SQL, {
+        "after_id": max(store.last_id - COLUMNAR_OVERLAP, 0), "since_day": store.since or 0
+    }, 6)
+    if len(rows):
+        store.append(rows[:, 0], rows[:, 1], rows[:, 2], rows[:, 3], rows[:, 4], rows[:, 5])
+
+    claims = _fetch_columns(cursor, CLAIM_EVENTS_SQL, {
+        "after_id": max(store.last_event_id - COLUMNAR_OVERLAP, 0)
+    }, 3)
+    if len(claims):
+        store.last_event_id = max(store.last_event_id, int(claims[:, 0].max()))
+        claims = claims[~np.isnan(claims[:, 2])]
+        store.assign(claims[:, 1], claims[:, 2])
+    store.refreshed_at = time.time()
+
+def _build_column_store(cursor):
+    store = ColumnStore(COLUMNAR_MAX_BYTES)
+    # Claims from here on are replayed after the load, so one made while
+    # the rows were being read isn't lost
+    cursor.execute("SELECT NVL(MAX(event_id), 0) FROM change_events")
+    store.last_event_id = int(cursor.fetchone()[0])
+
+    cursor.execute("SELECT COUNT(*) FROM food_donations")
+    if cursor.fetchone()[0] > store.max_rows:
+        # Only the most recent whole days fit the memory budget
+        cursor.execute('''
+            SELECT TRUNC(donation_date) - DATE '1970-01-01' FROM food_donations
+            ORDER BY donation_date DESC
+            OFFSET :1 ROWS FETCH NEXT 1 ROWS ONLY
+        ''', [store.max_rows * 9 // 10])
+        store.since = int(cursor.fetchone()[0]) + 1
+
+    _top_up_column_store(cursor, store)
+    store.built_at = store.refreshed_at
+    return store
+
+def refresh_column_store(rebuild=False):
+    # The current shard's store, built on first use and topped up at most
+    # every COLUMNAR_REFRESH_INTERVAL. If the database can't be reached the
+    # last state is kept; returns None only if it was never built
+    shard = current_shard()
+    with _column_store_lock(shard):
+        store = _column_stores.get(shard)
+        now = time.time()
+        if store is not None and not rebuild and now - store.refreshed_at < COLUMNAR_REFRESH_INTERVAL:
+            return store
+        rebuild = rebuild or store is None or now - store.built_at >= COLUMNAR_REBUILD_INTERVAL
+        try:
+            with get_connection() as conn:
+                with conn.cursor() as cursor:
+                    if rebuild:
+                        _column_stores[shard] = store = _build_column_store(cursor)
+                    else:
+                        _top_up_column_store(cursor, store)
+        except oracledb.DatabaseError as e:
+            print(f"Error in refresh_column_store: {e}")
+        return store
+
+def query_column_store(compute):
+    # compute(store) runs under the shard's lock, since a top-up rewrites
+    # the arrays in place
+    with _column_store_lock(current_shard()):
+        store = refresh_column_store()
+        return compute(store) if store is not None else None
+
+def get_columnar_since():
+    # First day the in-memory stores hold in full, if the memory budget
+    # forced older days out of any of them
+    days = [store.since for store in list(_column_stores.values()) if store.since is not None]
+    return from_day(max(days)) if days else None
+
+def get_shard_donation_statistics_columnar():
+    result = query_column_store(lambda store: store.by_food_type())
+    if result is None:
+        return []
+    names = get_food_type_names(result[0])
+    return [{
+        "food_type": names.get(int(food_type_id), "Unknown"),
+        "total_donations": int(count),
+        "total_quantity": float(total),
+        "avg_quantity": float(total) / int(count),
+        "first_donation": from_day(first).strftime("%Y-%m-%d"),
+        "last_donation": from_day(last).strftime("%Y-%m-%d")
+    } for food_type_id, count, total, first, last in zip(*result)]
+
+def get_donation_statistics_columnar():
+    return _merge_donation_statistics(scatter(get_shard_donation_statistics_columnar).values())
+
+def _donor_names_for(donor_ids):
+    # Names are looked up once per donor; nothing in the app renames one
+    shard = current_shard()
+    missing = [i for i in donor_ids if (shard, i) not in _donor_names]
+    if missing:
+        with get_connection() as conn:
+            with conn.cursor() as cursor:
+                placeholders = ", ".join(f":{i + 1}" for i in range(len(missing)))
+                cursor.execute(f"SELECT donor_id, name FROM donors WHERE donor_id IN ({placeholders})", missing)
+                for donor_id, name in cursor:
+                    _donor_names[(shard, int(donor_id))] = name
+    return [_donor_names.get((shard, i), "Unknown") for i in donor_ids]
+
+def get_shard_top_donors_columnar():
+    result = query_column_store(lambda store: store.top_donors(TOP_DONORS_LIMIT))
+    if result is None:
+        return []
+    donor_ids, counts, totals = result
+    try:
+        names = _donor_names_for([int(i) for i in donor_ids])
+    except oracledb.DatabaseError as e:
+        print(f"Error in get_shard_top_donors_columnar: {e}")
+        return []
+    return [{"donor_name": name, "donation_count": int(count), "total_donated": float(total)}
+            for name, count, total in zip(names, counts, totals)]
+
+def get_top_donors_columnar():
+    return _merge_top_donors(scatter(get_shard_top_donors_columnar).values())
+
+def add_months(day, months):
+    # Oracle's ADD_MONTHS: month ends map to month ends, other days clamp
+    month = day.year * 12 + day.month - 1 + months
+    year, month = divmod(month, 12)
+    last_day = calendar.monthrange(year, month + 1)[1]
+    if day.day == calendar.monthrange(day.year, day.month)[1]:
+        return datetime.date(year, month + 1, last_day)
+    return datetime.date(year, month + 1, min(day.day, last_day))
+
+def get_donation_trends_columnar():
+    return _merge_donation_trends(scatter(get_shard_donation_trends_columnar).values())
+
+def get_shard_donation_trends_columnar():
+    start = add_months(datetime.date.today(), -12)
+    result = query_column_store(lambda store: store.by_month((start - datetime.date(1970, 1, 1)).days))
+    if result is None:
+        return []
+    return [{
+        "month": month_label(month),
+        "donation_count": int(count),
+        "total_quantity": float(total),
+        "active_donors": int(donors)
+    } for month, count, total, donors in zip(*result)]
+
+def get_ngo_donation_distribution_columnar():
+    return _merge_ngo_donation_distribution(scatter(get_shard_ngo_donation_distribution_columnar).values())
+
+def get_shard_ngo_donation_distribution_columnar():
+    result = query_column_store(lambda store: store.by_ngo())
+    if result is None:
+        return []
+    names = dict(get_all_ngos())
+    return [{"ngo_name": names.get(int(ngo_id), "Unknown"), "donations_received": int(count),
+             "total_quantity": float(total)} for ngo_id, count, total in zip(*result)]
+
+# Forecast functions
+SHORTFALL_LIMIT = 10
+
+@cached()
+def get_ngo_shortfalls(ngo_id):
+    # Food types this NGO is expected to request more of next week than it
+    # is expected to receive, largest gap first
+    try:
+        with get_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute('''
+                SELECT ft.name as food_type, f.expected_demand, f.expected_supply,
+                       f.expected_demand - f.expected_supply as shortfall,
+                       TO_CHAR(f.forecast_week, 'YYYY-MM-DD') as forecast_week
+                FROM demand_forecasts f
+                JOIN food_types ft ON f.food_type_id = ft.food_type_id
+                WHERE f.ngo_id = :1 AND f.expected_demand > f.expected_supply
+                ORDER BY shortfall DESC
+                ''', [ngo_id])
+
+                columns = ['food_type', 'expected_demand', 'expected_supply', 'shortfall', 'forecast_week']
+                return [dict(zip(columns, row)) for row in cursor]
+    except oracledb.DatabaseError as e:
+        print(f"Error in get_ngo_shortfalls: {e}")
+        return []
+
+def get_expected_shortfalls(limit=SHORTFALL_LIMIT):
+    return _merge_expected_shortfalls(scatter(get_shard_expected_shortfalls).values(), limit)
+
+def _merge_expected_shortfalls(shard_results, limit):
+    # Shards report every short food type, not just their top ones, so the
+    # global top `limit` is exact
+    merged = {}
+    for rows in shard_results:
+        for row in rows:
+            item = merged.get(row['food_type'])
+            if item is None:
+                merged[row['food_type']] = dict(row)
+                continue
+            item['shortfall'] += row['shortfall']
+            item['ngos_short'] += row['ngos_short']
+            item['forecast_week'] = max(item['forecast_week'], row['forecast_week'])
+    return sorted(merged.values(), key=lambda r: r['shortfall'], reverse=True)[:limit]
+
+@cached()
+def get_shard_expected_shortfalls():
+    # Food types short across the shard's NGOs next week; surpluses at one
+    # NGO don't offset another's gap
+    try:
+        with get_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute('''
+                SELECT ft.name as food_type,
+                       SUM(f.expected_demand - f.expected_supply) as shortfall,
+                       COUNT(*) as ngos_short,
+                       TO_CHAR(MAX(f.forecast_week), 'YYYY-MM-DD') as forecast_week
+                FROM demand_forecasts f
+                JOIN food_types ft ON f.food_type_id = ft.food_type_id
+                WHERE f.expected_demand > f.expected_supply
+                GROUP BY ft.name
+                ''')
+
+                columns = ['food_type', 'shortfall', 'ngos_short', 'forecast_week']
+                return [dict(zip(columns, row)) for row in cursor]
+    except oracledb.DatabaseError as e:
+        print(f"Error in get_shard_expected_shortfalls: {e}")
+        return []
+
+# Warm-up functions
+def _run_warm_up():
+    global _warm_up_started
+    steps = [
+        ("create pool", get_pool),
+        ("init_db", init_db),
+        ("load NGO list", get_all_ngos),
+        ("load food types", get_food_types),
+        ("build proximity index", get_proximity_index),
+    ]
+    try:
+        for shard in shard_names():
+            with use_shard(shard):
+                for name, step in steps:
+                    start = time.perf_counter()
+                    step()
+                    if STARTUP_PROFILE:
+                        print(f"[startup] {shard}: {name}: {(time.perf_counter() - start) * 1000:.0f} ms")
+    except oracledb.DatabaseError as e:
+        print(f"Error in warm_up: {e}")
+        # Let the next session try again
+        with _warm_up_lock:
+            _warm_up_started = False
+    finally:
+        _warm.set()
+
+def warm_up(wait=True):
+    # Runs once per process: schema probes, pool creation and reference data
+    # happen before (or, for the login page, alongside) the first render
+    global _warm_up_started
+    with _warm_up_lock:
+        if not _warm_up_started:
+            _warm_up_started = True
+            _warm.clear()
+            threading.Thread(target=_run_warm_up, name="warm-up", daemon=True).start()
+    if wait:
+        _warm.wait()
+
+
+if __name__ == "__main__":
+    warm_up()
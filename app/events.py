@@ -0,0 +1,193 @@
+import argparse
+import json
+import os
+import threading
+from collections import namedtuple
+
+import oracledb
+
+from db import get_connection
+from shards import DEFAULT, shard_names, use_shard
+
+EVENT_BATCH_SIZE = int(os.getenv("EVENT_BATCH_SIZE", "500"))
+# Events become visible to consumers only after this many seconds, so most
+# transactions that took a lower event_id but committed later are read in order
+EVENT_VISIBILITY_LAG = float(os.getenv("EVENT_VISIBILITY_LAG", "2"))
+# created_at is insert time, not commit time, so a longer transaction can
+# still commit below events already read. Each poll re-reads this many ids
+# below the read position and delivers the ones it hasn't seen
+EVENT_OVERLAP = int(os.getenv("EVENT_OVERLAP", "1000"))
+
+Event = namedtuple("Event", ["event_id", "event_type", "entity_type", "entity_id", "payload", "created_at"])
+
+
+# Reads change_events in event_id order from a checkpoint stored per consumer
+# name. Delivery is at-least-once: a handler that fails before commit() sees
+# the same events again after rewind() or a restart, so handlers should be
+# idempotent. Events that commit late are delivered out of order, unless they
+# commit more than EVENT_OVERLAP ids late or across a consumer restart
+class EventConsumer:
+    def __init__(self, name, batch_size=EVENT_BATCH_SIZE, event_types=None):
+        self.name = name
+        self.batch_size = batch_size
+        self.event_types = list(event_types) if event_types else None
+        self._position = None
+        # Highest id handed out by poll(); the overlap window is below it and
+        # never reaches under the checkpoint this consumer started from
+        self._read = None
+        self._floor = None
+        # Ids handed out within the overlap window, and those not yet committed
+        self._seen = set()
+        self._uncommitted = []
+
+    def position(self):
+        if self._position is None:
+            with get_connection() as conn:
+                with conn.cursor() as cursor:
+                    cursor.execute(
+                        "SELECT last_event_id FROM event_checkpoints WHERE consumer = :1", [self.name]
+                    )
+                    result = cursor.fetchone()
+                    self._position = int(result[0]) if result else 0
+                    self._read = self._floor = self._position
+        return self._position
+
+    def _filters(self, binds):
+        sql = " AND created_at <= SYSTIMESTAMP - NUMTODSINTERVAL(:lag, 'SECOND')"
+        binds["lag"] = EVENT_VISIBILITY_LAG
+        if self.event_types:
+            placeholders = ", ".join(f":type_{i}" for i in range(len(self.event_types)))
+            sql += f" AND event_type IN ({placeholders})"
+            binds.update({f"type_{i}": t for i, t in enumerate(self.event_types)})
+        return sql
+
+    def _late_ids(self, cursor):
+        # Ids in the overlap window that weren't there when it was first read
+        low = max(self._read - EVENT_OVERLAP, self._floor)
+        if low >= self._read:
+            return []
+        binds = {"low": low, "read": self._read}
+        cursor.execute(
+            "SELECT event_id FROM change_events WHERE event_id > :low AND event_id <= :read"
+            + self._filters(binds), binds
+        )
+        late = sorted(int(event_id) for (event_id,) in cursor if int(event_id) not in self._seen)
+        # Oracle allows at most 1000 expressions in an IN list
+        return late[:min(self.batch_size, 1000)]
+
+    def poll(self):
+        # Returns the next events after everything already handed out, plus
+        # any that committed late below it, in event_id order
+        try:
+            self.position()
+            with get_connection() as conn:
+                with conn.cursor() as cursor:
+                    late = self._late_ids(cursor)
+
+                    binds = {"read": self._read, "batch_size": self.batch_size}
+                    where = "event_id > :read"
+                    if late:
+                        where = f"({where} OR event_id IN ({', '.join(f':late_{i}' for i in range(len(late)))}))"
+                        binds.update({f"late_{i}": event_id for i, event_id in enumerate(late)})
+                    sql = f'''
+                        SELECT event_id, event_type, entity_type, entity_id, payload, created_at
+                        FROM change_events
+                        WHERE {where}{self._filters(binds)}
+                        ORDER BY event_id FETCH FIRST :batch_size ROWS ONLY
+                    '''
+
+                    cursor.arraysize = self.batch_size
+                    cursor.execute(sql, binds)
+                    events = [
+                        Event(int(event_id), event_type, entity_type, int(entity_id),
+                              json.loads(payload) if payload else {}, created_at)
+                        for event_id, event_type, entity_type, entity_id, payload, created_at in cursor
+                    ]
+        except oracledb.DatabaseError as e:
+            print(f"Error in poll ({self.name}): {e}")
+            return []
+
+        for event in events:
+            self._seen.add(event.event_id)
+            self._uncommitted.append(event.event_id)
+            self._read = max(self._read, event.event_id)
+        return events
+
+    def rewind(self):
+        # Hands everything polled since the last commit out again
+        self._seen.difference_update(self._uncommitted)
+        self._uncommitted = []
+        if self._position is not None:
+            self._read = self._position
+
+    def commit(self, event_id):
+        try:
+            with get_connection() as conn:
+                with conn.cursor() as cursor:
+                    # GREATEST keeps a slower replica from moving the checkpoint back
+                    cursor.execute('''
+                        MERGE INTO event_checkpoints c
+                        USING (SELECT :1 AS consumer, :2 AS last_event_id FROM dual) s
+                        ON (c.consumer = s.consumer)
+                        WHEN MATCHED THEN UPDATE SET
+                            c.last_event_id = GREATEST(c.last_event_id, s.last_event_id),
+                            c.updated_at = SYSTIMESTAMP
+                        WHEN NOT MATCHED THEN INSERT (consumer, last_event_id)
+                        VALUES (s.consumer, s.last_event_id)
+                    ''', [self.name, event_id])
+                    conn.commit()
+        except oracledb.DatabaseError as e:
+            print(f"Error in commit ({self.name}): {e}")
+            return False
+
+        self._position = max(self._position or 0, event_id)
+        self._read = max(self._read or 0, self._position)
+        self._uncommitted = []
+        # Ids below the window won't be read again
+        self._seen = {i for i in self._seen if i > self._read - EVENT_OVERLAP}
+        return True
+
+    def run(self, handler, idle_sleep=1.0, stop=None):
+        # handler(events) gets each batch; the checkpoint moves past the
+        # batch only after the handler returns
+        stop = stop or threading.Event()
+        while not stop.is_set():
+            events = self.poll()
+            if not events:
+                stop.wait(idle_sleep)
+                continue
+            try:
+                handler(events)
+            except Exception:
+                self.rewind()
+                raise
+            self.commit(events[-1].event_id)
+
+
+def print_events(events):
+    for event in events:
+        print(f"{event.event_id}\t{event.created_at:%Y-%m-%d %H:%M:%S}\t{event.event_type}\t"
+              f"{event.entity_type}:{event.entity_id}\t{json.dumps(event.payload)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Tail the donation and request change event log")
+    parser.add_argument("--consumer", default="cli", help="Checkpoint name")
+    parser.add_argument("--type", action="append", dest="event_types", help="Only this event type (repeatable)")
+    parser.add_argument("--follow", action="store_true", help="Keep polling for new events")
+    parser.add_argument("--no-commit", action="store_true", help="Don't move the checkpoint (single poll only)")
+    parser.add_argument("--shard", default=DEFAULT, choices=shard_names(), help="Shard whose log to read")
+    args = parser.parse_args()
+
+    consumer = EventConsumer(args.consumer, event_types=args.event_types)
+    with use_shard(args.shard):
+        if args.follow:
+            try:
+                consumer.run(print_events)
+            except KeyboardInterrupt:
+                pass
+        else:
+            events = consumer.poll()
+            print_events(events)
+            if events and not args.no_commit:
+                consumer.commit(events[-1].event_id)
@@ -0,0 +1,204 @@
+import argparse
+import csv
+import datetime
+import io
+import json
+import os
+import sys
+
+import oracledb
+
+from db import get_connection
+from shards import DEFAULT, shard_names, use_shard
+
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", "5000"))
+
+EXPORT_FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "jsonl": ("application/x-ndjson", "jsonl"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+DATASETS = {
+    "donations": '''
+        SELECT fd.donation_id, ft.name AS food_type, fd.donation_date, fd.expiry_date,
+               fd.quantity, fd.status, d.donor_id, d.name AS donor_name,
+               n.ngo_id, n.name AS ngo_name
+        FROM food_donations fd
+        JOIN food_types ft ON fd.food_type_id = ft.food_type_id
+        JOIN donors d ON fd.donor_id = d.donor_id
+        LEFT JOIN ngos n ON fd.ngo_id = n.ngo_id
+    ''',
+    "requests": '''
+        SELECT r.request_id, ft.name AS food_type, r.quantity, r.request_date, r.status,
+               n.ngo_id, n.name AS ngo_name, r.donation_id,
+               d.donor_id, d.name AS donor_name
+        FROM requests r
+        JOIN food_types ft ON r.food_type_id = ft.food_type_id
+        JOIN ngos n ON r.ngo_id = n.ngo_id
+        LEFT JOIN food_donations fd ON r.donation_id = fd.donation_id
+        LEFT JOIN donors d ON fd.donor_id = d.donor_id
+    ''',
+}
+
+DATE_COLUMNS = {"donations": "fd.donation_date", "requests": "r.request_date"}
+STATUS_COLUMNS = {"donations": "fd.status", "requests": "r.status"}
+ORDER_COLUMNS = {"donations": "fd.donation_id", "requests": "r.request_id"}
+
+
+def build_export_query(dataset, donor_id=None, ngo_id=None, start_date=None, end_date=None,
+                       food_type=None, status=None):
+    conditions = []
+    binds = {}
+
+    if donor_id is not None:
+        conditions.append("d.donor_id = :donor_id")
+        binds["donor_id"] = donor_id
+    if ngo_id is not None:
+        conditions.append("n.ngo_id = :ngo_id")
+        binds["ngo_id"] = ngo_id
+    if start_date is not None:
+        conditions.append(f"{DATE_COLUMNS[dataset]} >= :start_date")
+        binds["start_date"] = start_date
+    if end_date is not None:
+        conditions.append(f"{DATE_COLUMNS[dataset]} < :end_date")
+        binds["end_date"] = end_date + datetime.timedelta(days=1)
+    if food_type:
+        conditions.append("ft.food_type_id = (SELECT food_type_id FROM food_type_aliases WHERE alias = :alias)")
+        binds["alias"] = " ".join(food_type.split()).lower()
+    if status:
+        conditions.append(f"{STATUS_COLUMNS[dataset]} = :status")
+        binds["status"] = status
+
+    sql = DATASETS[dataset]
+    if conditions:
+        sql += " WHERE " + " AND ".join(conditions)
+    sql += f" ORDER BY {ORDER_COLUMNS[dataset]}"
+    return sql, binds
+
+
+def iter_chunks(cursor, sql, binds, chunk_size=EXPORT_CHUNK_SIZE):
+    # Rows are pulled from the open cursor one fetch batch at a time, so only
+    # a single chunk is ever held in memory
+    cursor.arraysize = chunk_size
+    cursor.prefetchrows = chunk_size + 1
+    cursor.execute(sql, binds)
+    yield cursor.description
+
+    while True:
+        rows = cursor.fetchmany()
+        if not rows:
+            return
+        yield rows
+
+
+def format_value(value):
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.strftime("%Y-%m-%d")
+    return value
+
+
+def column_names(description):
+    return [col[0].lower() for col in description]
+
+
+def write_csv(description, chunks, f):
+    text = io.TextIOWrapper(f, encoding="utf-8", newline="", write_through=True)
+    writer = csv.writer(text)
+    writer.writerow(column_names(description))
+    count = 0
+    for rows in chunks:
+        writer.writerows([format_value(v) for v in row] for row in rows)
+        count += len(rows)
+    text.detach()
+    return count
+
+
+def write_jsonl(description, chunks, f):
+    columns = column_names(description)
+    count = 0
+    for rows in chunks:
+        lines = (json.dumps(dict(zip(columns, map(format_value, row)))) for row in rows)
+        f.write(("\n".join(lines) + "\n").encode("utf-8"))
+        count += len(rows)
+    return count
+
+
+def parquet_schema(pa, description):
+    # Fixed up front from the cursor so a chunk that happens to be all NULL
+    # in some column still matches the file schema
+    fields = []
+    for col in description:
+        name = col[0].lower()
+        if col[1] is oracledb.DB_TYPE_DATE:
+            fields.append(pa.field(name, pa.timestamp("s")))
+        elif col[1] is oracledb.DB_TYPE_NUMBER:
+            fields.append(pa.field(name, pa.int64() if name.endswith("_id") else pa.float64()))
+        else:
+            fields.append(pa.field(name, pa.string()))
+    return pa.schema(fields)
+
+
+def write_parquet(description, chunks, f):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Parquet export requires pyarrow (pip install pyarrow)")
+
+    schema = parquet_schema(pa, description)
+    columns = column_names(description)
+    count = 0
+    with pq.ParquetWriter(f, schema) as writer:
+        for rows in chunks:
+            # One row group per fetched chunk
+            batch = {name: [row[i] for row in rows] for i, name in enumerate(columns)}
+            writer.write_table(pa.Table.from_pydict(batch, schema=schema))
+            count += len(rows)
+    return count
+
+
+WRITERS = {"csv": write_csv, "jsonl": write_jsonl, "parquet": write_parquet}
+
+
+def export_rows(f, fmt, dataset, **filters):
+    sql, binds = build_export_query(dataset, **filters)
+    with get_connection() as conn:
+        with conn.cursor() as cursor:
+            chunks = iter_chunks(cursor, sql, binds)
+            description = next(chunks)
+            return WRITERS[fmt](description, chunks, f)
+
+
+def parse_date(value):
+    return datetime.date.fromisoformat(value)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export donation or request history")
+    parser.add_argument("dataset", choices=sorted(DATASETS))
+    parser.add_argument("--format", default="csv", choices=sorted(EXPORT_FORMATS))
+    parser.add_argument("--donor-id", type=int)
+    parser.add_argument("--ngo-id", type=int)
+    parser.add_argument("--from", dest="start_date", type=parse_date, help="YYYY-MM-DD")
+    parser.add_argument("--to", dest="end_date", type=parse_date, help="YYYY-MM-DD (inclusive)")
+    parser.add_argument("--food-type")
+    parser.add_argument("--status")
+    parser.add_argument("--output", "-o", help="Output file (default: stdout)")
+    parser.add_argument("--shard", default=DEFAULT, choices=shard_names(), help="Shard to export from")
+    args = parser.parse_args()
+
+    filters = dict(donor_id=args.donor_id, ngo_id=args.ngo_id, start_date=args.start_date,
+                   end_date=args.end_date, food_type=args.food_type, status=args.status)
+
+    try:
+        with use_shard(args.shard):
+            if args.output:
+                with open(args.output, "wb") as f:
+                    count = export_rows(f, args.format, args.dataset, **filters)
+            else:
+                count = export_rows(sys.stdout.buffer, args.format, args.dataset, **filters)
+        print(f"Exported {count} rows", file=sys.stderr)
+    except oracledb.DatabaseError as e:
+        print(f"Error exporting {args.dataset}: {e}", file=sys.stderr)
+        sys.exit(1)
@@ -0,0 +1,157 @@
+import argparse
+import datetime
+import os
+import sys
+import time
+
+import numpy as np
+import oracledb
+
+from db import get_connection, lock_watermark
+from shards import DEFAULT, shard_names, use_shard
+
+FORECAST_ALPHA = float(os.getenv("FORECAST_ALPHA", "0.3"))
+FORECAST_HISTORY_WEEKS = int(os.getenv("FORECAST_HISTORY_WEEKS", "52"))
+# Cells whose smoothed demand and supply both decay below this are dropped
+FORECAST_MIN_LEVEL = 0.01
+FETCH_SIZE = 10000
+
+# Weeks are numbered from this Monday, so TRUNC(date, 'IW') maps to an integer
+EPOCH = datetime.date(1970, 1, 5)
+
+DEMAND_SQL = '''
+    SELECT ngo_id, food_type_id, (TRUNC(request_date, 'IW') - :epoch) / 7, SUM(quantity)
+    FROM requests
+    WHERE request_date >= :start_date AND request_date < :end_date AND status <> 'Cancelled'
+    GROUP BY ngo_id, food_type_id, TRUNC(request_date, 'IW')
+'''
+
+SUPPLY_SQL = '''
+    SELECT ngo_id, food_type_id, (TRUNC(donation_date, 'IW') - :epoch) / 7, SUM(quantity)
+    FROM food_donations
+    WHERE ngo_id IS NOT NULL AND donation_date >= :start_date AND donation_date < :end_date
+    GROUP BY ngo_id, food_type_id, TRUNC(donation_date, 'IW')
+'''
+
+
+def week_number(day):
+    return (day - EPOCH).days // 7
+
+def week_start(week):
+    return EPOCH + datetime.timedelta(weeks=week)
+
+
+def fetch_array(cursor, sql, binds, columns):
+    # Fetches in batches straight into one float array, one row per result row
+    cursor.arraysize = FETCH_SIZE
+    cursor.execute(sql, binds)
+    batches = []
+    while True:
+        rows = cursor.fetchmany()
+        if not rows:
+            break
+        batches.append(np.array(rows, dtype=np.float64))
+    return np.concatenate(batches) if batches else np.empty((0, columns))
+
+def fold(levels, cells, weeks, quantities, n_weeks, alpha=FORECAST_ALPHA):
+    # Exponential smoothing over n_weeks new weeks for every cell at once:
+    #   level_n = (1 - a)^n * level_0 + sum_k a * (1 - a)^(n - 1 - k) * x_k
+    # The weekly observations are scattered into the dense matrix with their
+    # decay already applied, so no NGO x food type x week cube is built
+    decay = alpha * (1 - alpha) ** (n_weeks - 1 - weeks)
+    observed = np.bincount(cells, weights=quantities * decay, minlength=levels.size)
+    return levels * (1 - alpha) ** n_weeks + observed.reshape(levels.shape)
+
+
+def refresh_forecasts(alpha=FORECAST_ALPHA, rebuild=False):
+    # Folds every complete week since the last run into the smoothed weekly
+    # demand (requests) and supply (donations assigned to the NGO) of each
+    # NGO and food type, and stores them as next week's forecast. Returns
+    # the number of weeks folded in, or None on error
+    try:
+        with get_connection() as conn:
+            with conn.cursor() as cursor:
+                # The watermark is the last week number folded in
+                last_week = lock_watermark(cursor, "demand_forecasts")
+                through = week_number(datetime.date.today()) - 1
+                incremental = bool(last_week) and not rebuild
+                first = last_week + 1 if incremental else through - FORECAST_HISTORY_WEEKS + 1
+                if first > through:
+                    conn.rollback()
+                    return 0
+                n_weeks = through - first + 1
+
+                if incremental:
+                    state = fetch_array(cursor, '''
+                        SELECT ngo_id, food_type_id, expected_demand, expected_supply
+                        FROM demand_forecasts
+                    ''', {}, 4)
+                else:
+                    state = np.empty((0, 4))
+
+                binds = {"epoch": EPOCH, "start_date": week_start(first), "end_date": week_start(through + 1)}
+                demand = fetch_array(cursor, DEMAND_SQL, binds, 4)
+                supply = fetch_array(cursor, SUPPLY_SQL, binds, 4)
+
+                # Dense NGO x food type matrix over every pair seen in the
+                # stored state or in the new weeks
+                parts = [state, demand, supply]
+                ngo_ids, ngo_index = np.unique(np.concatenate([p[:, 0] for p in parts]), return_inverse=True)
+                food_ids, food_index = np.unique(np.concatenate([p[:, 1] for p in parts]), return_inverse=True)
+                cells = ngo_index * len(food_ids) + food_index
+                state_cells, demand_cells, supply_cells = np.split(cells, np.cumsum([len(p) for p in parts])[:-1])
+                shape = (len(ngo_ids), len(food_ids))
+
+                demand_levels = np.zeros(shape)
+                supply_levels = np.zeros(shape)
+                demand_levels.flat[state_cells] = state[:, 2]
+                supply_levels.flat[state_cells] = state[:, 3]
+
+                demand_levels = fold(demand_levels, demand_cells, demand[:, 2] - first, demand[:, 3], n_weeks, alpha)
+                supply_levels = fold(supply_levels, supply_cells, supply[:, 2] - first, supply[:, 3], n_weeks, alpha)
+
+                keep = (demand_levels >= FORECAST_MIN_LEVEL) | (supply_levels >= FORECAST_MIN_LEVEL)
+                rows_index, cols_index = np.nonzero(keep)
+                rows = list(zip(
+                    ngo_ids[rows_index].astype(np.int64).tolist(),
+                    food_ids[cols_index].astype(np.int64).tolist(),
+                    np.round(demand_levels[keep], 3).tolist(),
+                    np.round(supply_levels[keep], 3).tolist(),
+                ))
+
+                # Replaced in one transaction, so readers see the old
+                # forecast until the new one commits
+                forecast_week = week_start(through + 1)
+                cursor.execute("DELETE FROM demand_forecasts")
+                for start in range(0, len(rows), FETCH_SIZE):
+                    cursor.executemany('''
+                        INSERT INTO demand_forecasts
+                            (ngo_id, food_type_id, expected_demand, expected_supply, forecast_week)
+                        VALUES (:1, :2, :3, :4, :5)
+                    ''', [row + (forecast_week,) for row in rows[start:start + FETCH_SIZE]])
+
+                cursor.execute(
+                    "UPDATE analytics_watermarks SET last_id = :1 WHERE name = 'demand_forecasts'",
+                    [through]
+                )
+                conn.commit()
+                return n_weeks
+    except oracledb.DatabaseError as e:
+        print(f"Error in refresh_forecasts: {e}")
+        return None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Update next week's demand and supply forecasts per NGO and food type")
+    parser.add_argument("--alpha", type=float, default=FORECAST_ALPHA, help="Smoothing factor (0-1); higher follows recent weeks more closely")
+    parser.add_argument("--rebuild", action="store_true",
+                        help=f"Recompute from the last {FORECAST_HISTORY_WEEKS} weeks instead of folding in new weeks")
+    parser.add_argument("--shard", default=DEFAULT, choices=shard_names(), help="Shard to forecast")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    with use_shard(args.shard):
+        weeks = refresh_forecasts(args.alpha, args.rebuild)
+    if weeks is None:
+        sys.exit(1)
+    print(f"Folded {weeks} week{'s' if weeks != 1 else ''} in {time.perf_counter() - start:.1f}s", file=sys.stderr)
@@ -0,0 +1,144 @@
+import csv
+import math
+import os
+import re
+
+GAZETTEER_PATH = os.getenv("GAZETTEER_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "gazetteer.csv"))
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE = 111.32
+
+_gazetteer = None
+
+
+def normalize_place(name):
+    return " ".join((name or "").lower().replace(",", " ").split())
+
+
+def place_tokens(name):
+    # Words of a place name, so "Thamel-3" still matches Thamel while
+    # "Thamelgunj Marg" does not
+    return tuple(re.findall(r"\w+", normalize_place(name)))
+
+
+def _contains_tokens(tokens, part):
+    n = len(part)
+    return any(tokens[i:i + n] == part for i in range(len(tokens) - n + 1))
+
+
+def load_gazetteer(path=GAZETTEER_PATH):
+    # Offline lookup table: (locality, city) -> (lat, lon), with an empty
+    # locality meaning the city centroid
+    places = {}
+    try:
+        with open(path, newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                key = (normalize_place(row["locality"]), normalize_place(row["city"]))
+                places[key] = (float(row["latitude"]), float(row["longitude"]))
+    except FileNotFoundError:
+        print(f"Gazetteer file not found: {path}")
+    return places
+
+
+def geocode(street, city):
+    global _gazetteer
+    if _gazetteer is None:
+        _gazetteer = load_gazetteer()
+
+    city_key = normalize_place(city)
+    street_tokens = place_tokens(street)
+
+    # Try the most specific (longest) locality named in the street address first
+    if street_tokens:
+        best = None
+        for (locality, place_city), coords in _gazetteer.items():
+            if place_city != city_key or not locality:
+                continue
+            tokens = place_tokens(locality)
+            if _contains_tokens(street_tokens, tokens) and (best is None or len(tokens) > best[0]):
+                best = (len(tokens), coords)
+        if best:
+            return best[1]
+
+    return _gazetteer.get(("", city_key), (None, None))
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+# Uniform lat/lon grid answering k-nearest queries by scanning rings of
+# cells outward from the query point until no closer point can exist
+class ProximityIndex:
+    def __init__(self, points, cell_size=0.25):
+        self.cell_size = cell_size
+        self.cells = {}
+        self.points = {}
+        self.max_abs_lat = 0.0
+
+        for key, lat, lon in points:
+            self.points[key] = (lat, lon)
+            self.cells.setdefault(self._cell(lat, lon), []).append((key, lat, lon))
+            self.max_abs_lat = max(self.max_abs_lat, abs(lat))
+
+        if self.cells:
+            rows = [i for i, _ in self.cells]
+            cols = [j for _, j in self.cells]
+            self.bounds = (min(rows), max(rows), min(cols), max(cols))
+
+    def __len__(self):
+        return len(self.points)
+
+    def _cell(self, lat, lon):
+        return (math.floor(lat / self.cell_size), math.floor(lon / self.cell_size))
+
+    def _ring(self, ci, cj, r):
+        if r == 0:
+            yield (ci, cj)
+            return
+        for j in range(cj - r, cj + r + 1):
+            yield (ci - r, j)
+            yield (ci + r, j)
+        for i in range(ci - r + 1, ci + r):
+            yield (i, cj - r)
+            yield (i, cj + r)
+
+    def nearest(self, lat, lon, k=5, max_km=None):
+        if not self.points or lat is None or lon is None:
+            return []
+
+        ci, cj = self._cell(lat, lon)
+        min_i, max_i, min_j, max_j = self.bounds
+        max_ring = max(abs(ci - min_i), abs(ci - max_i), abs(cj - min_j), abs(cj - max_j))
+
+        # Smallest ground distance covered by one cell, so anything outside
+        # ring r is at least r cells of this width away
+        cos_lat = math.cos(math.radians(min(89.0, max(self.max_abs_lat, abs(lat)))))
+        cell_km = self.cell_size * KM_PER_DEGREE * cos_lat
+
+        found = []
+        for r in range(max_ring + 1):
+            for cell in self._ring(ci, cj, r):
+                for key, plat, plon in self.cells.get(cell, ()):
+                    found.append((haversine_km(lat, lon, plat, plon), key))
+
+            bound_km = r * cell_km
+            if max_km is not None and bound_km > max_km:
+                break
+            if len(found) >= k:
+                found.sort()
+                if found[k - 1][0] <= bound_km:
+                    break
+
+        found.sort()
+        if max_km is not None:
+            found = [item for item in found if item[0] <= max_km]
+        return [(key, dist) for dist, key in found[:k]]
+
+    def distance_to(self, key, lat, lon):
+        if key not in self.points or lat is None or lon is None:
+            return None
+        plat, plon = self.points[key]
+        return haversine_km(lat, lon, plat, plon)
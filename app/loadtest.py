@@ -0,0 +1,189 @@
+import argparse
+import os
+import random
+import statistics
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import oracledb
+from streamlit.testing.v1 import AppTest
+
+import db
+from shards import shard_for_city, use_shard
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+PASSWORD = "loadtest-password"
+# Spread over the shards in shards.example.json, so sessions exercise the
+# routing to more than one shard
+CITIES = ["Kathmandu", "Lalitpur", "Pokhara", "Butwal", "Biratnagar", "Dharan"]
+
+_lock = threading.Lock()
+latencies = defaultdict(list)
+errors = defaultdict(int)
+db_calls = {"connect": 0, "execute": 0}
+reruns = 0
+peak_rss_mb = 0.0
+
+
+def current_rss_mb():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError):
+        return 0.0
+
+
+def instrument_driver():
+    # Count pool checkouts and statement executions made by the data functions
+    original_acquire = oracledb.ConnectionPool.acquire
+    original_execute = oracledb.Cursor.execute
+    original_executemany = oracledb.Cursor.executemany
+    original_callproc = oracledb.Cursor.callproc
+
+    def counted(kind, func):
+        def wrapper(*args, **kwargs):
+            with _lock:
+                db_calls[kind] += 1
+            return func(*args, **kwargs)
+        return wrapper
+
+    oracledb.ConnectionPool.acquire = counted("connect", original_acquire)
+    oracledb.Cursor.execute = counted("execute", original_execute)
+    oracledb.Cursor.executemany = counted("execute", original_executemany)
+    oracledb.Cursor.callproc = counted("execute", original_callproc)
+
+
+def ensure_account(username, user_type, index):
+    # Registered the way the sign-up form does: one atomic call in the shard
+    # for the account's city. An account left by an earlier run is kept
+    city = random.choice(CITIES)
+    name = f"Load {'Donor' if user_type == 'Donor' else 'NGO'} {index}"
+    with use_shard(shard_for_city(city)):
+        db.register_account(username, PASSWORD, user_type, name, f"{username}@example.com",
+                            "9800000000", "Main Road", city)
+
+
+def timed_run(step, at):
+    global reruns, peak_rss_mb
+    start = time.perf_counter()
+    at.run()
+    elapsed = time.perf_counter() - start
+    with _lock:
+        latencies[step].append(elapsed)
+        reruns += 1
+        peak_rss_mb = max(peak_rss_mb, current_rss_mb())
+        if at.exception:
+            errors[step] += 1
+    return at
+
+
+def widget(widgets, label):
+    return next(w for w in widgets if w.label == label)
+
+
+def login(at, username):
+    timed_run("login_page", at)
+    at.text_input(key="login_username").input(username)
+    at.text_input(key="login_password").input(PASSWORD)
+    at.button(key="login_button").click()
+    # AppTest follows the st.rerun() issued on success, so this includes the
+    # first dashboard render
+    return timed_run("login", at)
+
+
+def donor_flow(username, iterations, timeout):
+    at = AppTest.from_file(APP_PATH, default_timeout=timeout)
+    login(at, username)
+
+    for _ in range(iterations):
+        widget(at.text_input, "Food Type (e.g., Fruits, Vegetables, Prepared Meals)").input(
+            random.choice(["Rice", "Vegetables", "Fruits", "Prepared Meals", "Bread"]))
+        widget(at.number_input, "Quantity (kg)").set_value(round(random.uniform(1, 20), 1))
+        widget(at.button, "Submit Donation").click()
+        timed_run("submit_donation", at)
+
+        # Browse pending requests and fulfil one if there is any. AppTest
+        # can't click grid rows, so pick the request the way a row
+        # selection would
+        with use_shard(at.session_state["shard"]):
+            pending = db.get_all_pending_requests()
+        if pending:
+            at.session_state["donating_to_request"] = random.choice(pending)
+            timed_run("select_request", at)
+            widget(at.button, "Confirm Donation").click()
+            timed_run("fulfil_request", at)
+
+        timed_run("dashboard", at)
+
+
+def ngo_flow(username, iterations, timeout):
+    at = AppTest.from_file(APP_PATH, default_timeout=timeout)
+    login(at, username)
+
+    for _ in range(iterations):
+        widget(at.text_input, "Food Type Needed").input(random.choice(["Rice", "Lentils", "Vegetables", "Milk"]))
+        widget(at.number_input, "Quantity Needed (kg)").set_value(round(random.uniform(5, 50), 1))
+        widget(at.button, "Submit Request").click()
+        timed_run("submit_request", at)
+        timed_run("dashboard", at)
+
+
+def run_session(flow, username, iterations, timeout):
+    try:
+        flow(username, iterations, timeout)
+    except Exception as e:
+        with _lock:
+            errors[flow.__name__] += 1
+        print(f"Session {username} failed: {e!r}")
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def print_report(wall_time, sessions):
+    print(f"\n{sessions} sessions finished in {wall_time:.1f}s ({reruns} reruns)")
+    print(f"{'step':<18}{'count':>7}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'max ms':>10}{'errors':>8}")
+    for step, values in sorted(latencies.items()):
+        print(f"{step:<18}{len(values):>7}"
+              f"{percentile(values, 50) * 1000:>10.0f}{percentile(values, 90) * 1000:>10.0f}"
+              f"{percentile(values, 99) * 1000:>10.0f}{max(values) * 1000:>10.0f}{errors.get(step, 0):>8}")
+
+    failed_sessions = sum(count for step, count in errors.items() if step not in latencies)
+    if failed_sessions:
+        print(f"Failed sessions: {failed_sessions}")
+    if reruns:
+        print(f"DB connections per rerun: {db_calls['connect'] / reruns:.1f}")
+        print(f"DB statements per rerun: {db_calls['execute'] / reruns:.1f}")
+        print(f"Mean rerun time: {statistics.mean(v for values in latencies.values() for v in values) * 1000:.0f} ms")
+    print(f"Peak RSS: {peak_rss_mb:.0f} MB")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simulate concurrent donor and NGO sessions against app.py")
+    parser.add_argument("--donors", type=int, default=10, help="Concurrent donor sessions")
+    parser.add_argument("--ngos", type=int, default=5, help="Concurrent NGO sessions")
+    parser.add_argument("--iterations", type=int, default=5, help="Flow repetitions per session")
+    parser.add_argument("--timeout", type=float, default=60, help="Per-rerun timeout in seconds")
+    args = parser.parse_args()
+
+    db.warm_up()
+    for i in range(args.donors):
+        ensure_account(f"loadtest_donor_{i}", "Donor", i)
+    for i in range(args.ngos):
+        ensure_account(f"loadtest_ngo_{i}", "NGO", i)
+
+    instrument_driver()
+
+    sessions = ([(donor_flow, f"loadtest_donor_{i}") for i in range(args.donors)] +
+                [(ngo_flow, f"loadtest_ngo_{i}") for i in range(args.ngos)])
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=len(sessions)) as pool:
+        for flow, username in sessions:
+            pool.submit(run_session, flow, username, args.iterations, args.timeout)
+
+    print_report(time.perf_counter() - start, len(sessions))
@@ -0,0 +1,340 @@
+import argparse
+import os
+import queue
+import random
+import smtplib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from email.message import EmailMessage
+
+import oracledb
+
+from db import get_connection
+from events import EventConsumer
+from shards import DEFAULT, shard_names, use_shard
+
+# Point these at a local debugging server during development, e.g.
+#   python -m aiosmtpd -n -l localhost:1025
+SMTP_HOST = os.getenv("SMTP_HOST", "localhost")
+SMTP_PORT = int(os.getenv("SMTP_PORT", "1025"))
+SMTP_USER = os.getenv("SMTP_USER")
+SMTP_PASSWORD = os.getenv("SMTP_PASSWORD")
+SMTP_STARTTLS = os.getenv("SMTP_STARTTLS", "0") == "1"
+SMTP_POOL_SIZE = int(os.getenv("SMTP_POOL_SIZE", "4"))
+SMTP_TIMEOUT = float(os.getenv("SMTP_TIMEOUT", "10"))
+
+NOTIFY_FROM = os.getenv("NOTIFY_FROM", "no-reply@foodshare.local")
+NOTIFY_DIGEST_WINDOW = float(os.getenv("NOTIFY_DIGEST_WINDOW", "60"))
+NOTIFY_RATE_PER_SEC = float(os.getenv("NOTIFY_RATE_PER_SEC", "10"))
+NOTIFY_MAX_RETRIES = int(os.getenv("NOTIFY_MAX_RETRIES", "3"))
+# Events folded into one digest run at most; a larger backlog is sent over
+# several runs instead of being held in memory at once
+NOTIFY_MAX_EVENTS = int(os.getenv("NOTIFY_MAX_EVENTS", "10000"))
+
+NOTIFY_EVENT_TYPES = ["request_created", "request_fulfilled"]
+
+# Oracle allows at most 1000 expressions in an IN list
+IN_LIST_LIMIT = 1000
+
+
+# Keeps up to `size` SMTP sessions open so a digest run pays the TCP/TLS
+# handshake once per connection instead of once per message
+class SMTPPool:
+    def __init__(self, host=SMTP_HOST, port=SMTP_PORT, size=SMTP_POOL_SIZE):
+        self.host = host
+        self.port = port
+        self.size = size
+        self._idle = queue.LifoQueue()
+        self._semaphore = threading.BoundedSemaphore(size)
+
+    def _connect(self):
+        smtp = smtplib.SMTP(self.host, self.port, timeout=SMTP_TIMEOUT)
+        if SMTP_STARTTLS:
+            smtp.starttls()
+        if SMTP_USER:
+            smtp.login(SMTP_USER, SMTP_PASSWORD)
+        return smtp
+
+    def send(self, message):
+        with self._semaphore:
+            try:
+                smtp = self._idle.get_nowait()
+            except queue.Empty:
+                smtp = self._connect()
+
+            try:
+                smtp.send_message(message)
+            except smtplib.SMTPServerDisconnected:
+                # Idle connection timed out on the server side; retry once fresh
+                smtp = self._connect()
+                self._send_or_discard(smtp, message)
+            except Exception:
+                self._discard(smtp)
+                raise
+            self._idle.put(smtp)
+
+    def _send_or_discard(self, smtp, message):
+        try:
+            smtp.send_message(message)
+        except Exception:
+            self._discard(smtp)
+            raise
+
+    def _discard(self, smtp):
+        try:
+            smtp.quit()
+        except (smtplib.SMTPException, OSError):
+            pass
+
+    def close(self):
+        while True:
+            try:
+                self._discard(self._idle.get_nowait())
+            except queue.Empty:
+                return
+
+
+# Token bucket shared by the sender threads
+class RateLimiter:
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = burst or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class Metrics:
+    def __init__(self):
+        self.started = time.monotonic()
+        self.events = 0
+        self.digests = 0
+        self.sent = 0
+        self.failed = 0
+        self.retries = 0
+        self._lock = threading.Lock()
+
+    def add(self, **counts):
+        with self._lock:
+            for name, value in counts.items():
+                setattr(self, name, getattr(self, name) + value)
+
+    def report(self):
+        elapsed = max(time.monotonic() - self.started, 1e-9)
+        return (f"events={self.events} digests={self.digests} sent={self.sent} failed={self.failed} "
+                f"retries={self.retries} throughput={self.sent / elapsed:.2f} msg/s")
+
+
+def _in_list(values, prefix="id"):
+    return ", ".join(f":{prefix}{i}" for i in range(len(values))), {f"{prefix}{i}": v for i, v in enumerate(values)}
+
+def _chunks(values, size=IN_LIST_LIMIT):
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def load_fulfilled(cursor, request_ids):
+    # {request_id: row} for the NGO side of each fulfilment
+    rows = {}
+    for chunk in _chunks(request_ids):
+        placeholders, binds = _in_list(chunk)
+        cursor.execute(f'''
+            SELECT r.request_id, ft.name, r.quantity, n.name, n.email, d.name
+            FROM requests r
+            JOIN food_types ft ON r.food_type_id = ft.food_type_id
+            JOIN ngos n ON r.ngo_id = n.ngo_id
+            LEFT JOIN food_donations fd ON r.donation_id = fd.donation_id
+            LEFT JOIN donors d ON fd.donor_id = d.donor_id
+            WHERE r.request_id IN ({placeholders})
+        ''', binds)
+        for request_id, food_type, quantity, ngo_name, ngo_email, donor_name in cursor:
+            rows[int(request_id)] = {"food_type": food_type, "quantity": quantity, "ngo_name": ngo_name,
+                                     "email": ngo_email, "donor_name": donor_name or "a donor"}
+    return rows
+
+def load_new_requests(cursor, request_ids):
+    # Requests fulfilled before the digest went out are no longer news
+    rows = {}
+    for chunk in _chunks(request_ids):
+        placeholders, binds = _in_list(chunk)
+        cursor.execute(f'''
+            SELECT r.request_id, ft.name, r.quantity, n.name, LOWER(TRIM(n.city))
+            FROM requests r
+            JOIN food_types ft ON r.food_type_id = ft.food_type_id
+            JOIN ngos n ON r.ngo_id = n.ngo_id
+            WHERE r.request_id IN ({placeholders}) AND r.status = 'Pending'
+        ''', binds)
+        for request_id, food_type, quantity, ngo_name, city in cursor:
+            rows[int(request_id)] = {"food_type": food_type, "quantity": quantity,
+                                     "ngo_name": ngo_name, "city": city}
+    return rows
+
+def load_donors_by_city(cursor, cities):
+    donors = {}
+    for chunk in _chunks(cities):
+        placeholders, binds = _in_list(chunk, "city")
+        cursor.execute(f'''
+            SELECT email, name, LOWER(TRIM(city))
+            FROM donors
+            WHERE email IS NOT NULL AND LOWER(TRIM(city)) IN ({placeholders})
+        ''', binds)
+        for email, name, city in cursor:
+            donors.setdefault(city, []).append((email, name))
+    return donors
+
+
+def build_digests(events):
+    # Coalesces every event in the window into one message per recipient:
+    # NGOs hear about their fulfilled requests, donors about new requests
+    # from NGOs in their city
+    fulfilled_ids = {e.entity_id for e in events if e.event_type == "request_fulfilled"}
+    created_ids = {e.entity_id for e in events if e.event_type == "request_created"} - fulfilled_ids
+
+    digests = {}
+    with get_connection() as conn:
+        with conn.cursor() as cursor:
+            fulfilled = load_fulfilled(cursor, fulfilled_ids) if fulfilled_ids else {}
+            created = load_new_requests(cursor, created_ids) if created_ids else {}
+            cities = {r["city"] for r in created.values() if r["city"]}
+            donors = load_donors_by_city(cursor, cities) if cities else {}
+
+    for request_id, r in sorted(fulfilled.items()):
+        if not r["email"]:
+            continue
+        digest = digests.setdefault(r["email"], {"name": r["ngo_name"], "fulfilled": [], "new": []})
+        digest["fulfilled"].append(f"#{request_id}: {r['quantity']} kg of {r['food_type']} donated by {r['donor_name']}")
+
+    for request_id, r in sorted(created.items()):
+        for email, name in donors.get(r["city"], []):
+            digest = digests.setdefault(email, {"name": name, "fulfilled": [], "new": []})
+            digest["new"].append(f"#{request_id}: {r['ngo_name']} needs {r['quantity']} kg of {r['food_type']}")
+
+    return digests
+
+def render_message(email, digest):
+    lines = [f"Hello {digest['name']},", ""]
+    if digest["fulfilled"]:
+        lines += ["These requests of yours have been fulfilled:"] + [f"  - {item}" for item in digest["fulfilled"]] + [""]
+    if digest["new"]:
+        lines += ["NGOs near you have new food requests:"] + [f"  - {item}" for item in digest["new"]] + [""]
+    lines.append("Log in to the Food Waste Management System for details.")
+
+    count = len(digest["fulfilled"]) + len(digest["new"])
+    message = EmailMessage()
+    message["From"] = NOTIFY_FROM
+    message["To"] = email
+    message["Subject"] = f"Food donation update ({count} item{'s' if count != 1 else ''})"
+    message.set_content("\n".join(lines))
+    return message
+
+
+class NotificationDispatcher:
+    def __init__(self, pool=None, rate=NOTIFY_RATE_PER_SEC, window=NOTIFY_DIGEST_WINDOW,
+                 max_retries=NOTIFY_MAX_RETRIES):
+        self.pool = pool or SMTPPool()
+        self.limiter = RateLimiter(rate)
+        self.window = window
+        self.max_retries = max_retries
+        self.consumer = EventConsumer("notifications", event_types=NOTIFY_EVENT_TYPES)
+        self.metrics = Metrics()
+
+    def send_with_retry(self, message):
+        for attempt in range(self.max_retries + 1):
+            self.limiter.acquire()
+            try:
+                self.pool.send(message)
+                self.metrics.add(sent=1)
+                return True
+            except smtplib.SMTPRecipientsRefused as e:
+                # Bad address; retrying will not help
+                print(f"Error in send ({message['To']}): {e}")
+                break
+            except (smtplib.SMTPException, OSError) as e:
+                if attempt == self.max_retries:
+                    print(f"Error in send ({message['To']}): {e}")
+                    break
+                self.metrics.add(retries=1)
+                time.sleep(min(30, 2 ** attempt) * random.uniform(0.5, 1.5))
+        self.metrics.add(failed=1)
+        return False
+
+    def dispatch(self, events):
+        digests = build_digests(events)
+        messages = [render_message(email, digest) for email, digest in digests.items()]
+        with ThreadPoolExecutor(max_workers=self.pool.size) as executor:
+            list(executor.map(self.send_with_retry, messages))
+        self.metrics.add(events=len(events), digests=len(messages))
+
+    def run_once(self):
+        # Drains everything visible now into a single digest run; each poll
+        # continues after the events the previous one returned
+        pending = []
+        while True:
+            events = self.consumer.poll()
+            if not events:
+                break
+            pending.extend(events)
+            if len(events) < self.consumer.batch_size or len(pending) >= NOTIFY_MAX_EVENTS:
+                break
+        if pending:
+            self.flush(pending)
+        return len(pending)
+
+    def flush(self, pending):
+        try:
+            self.dispatch(pending)
+        except oracledb.DatabaseError as e:
+            # Checkpoint stays put, so the same events are retried next window
+            print(f"Error in dispatch: {e}")
+            self.consumer.rewind()
+            return False
+        # Undeliverable digests are counted as failed rather than blocking
+        # everyone else's notifications behind them. A poll that returns only
+        # late events ends pending on a lower id, so the highest is committed
+        self.consumer.commit(max(event.event_id for event in pending))
+        return True
+
+    def run(self, stop=None):
+        stop = stop or threading.Event()
+        while not stop.is_set():
+            started = time.monotonic()
+            if self.run_once():
+                print(self.metrics.report())
+            stop.wait(max(0.0, self.window - (time.monotonic() - started)))
+        self.pool.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Send digest emails for fulfilled and new food requests")
+    parser.add_argument("--once", action="store_true", help="Send one digest run and exit")
+    parser.add_argument("--window", type=float, default=NOTIFY_DIGEST_WINDOW, help="Seconds between digest runs")
+    parser.add_argument("--shard", default=DEFAULT, choices=shard_names(),
+                        help="Shard whose events to send (run one dispatcher per shard)")
+    args = parser.parse_args()
+
+    dispatcher = NotificationDispatcher(window=args.window)
+    with use_shard(args.shard):
+        if args.once:
+            dispatcher.run_once()
+            dispatcher.pool.close()
+            print(dispatcher.metrics.report())
+        else:
+            try:
+                dispatcher.run()
+            except KeyboardInterrupt:
+                dispatcher.pool.close()
+                print(dispatcher.metrics.report())
@@ -0,0 +1,188 @@
+import argparse
+import csv
+import sys
+import time
+from collections import defaultdict
+
+import oracledb
+
+from db import PROFILE_TABLES, get_all_ngos, get_connection
+from geo import geocode
+from passwords import hash_passwords
+from shards import scatter, shard_for_city, use_shard
+
+ONBOARD_BATCH_SIZE = 1000
+COLUMNS = ["username", "password", "user_type", "name", "email", "phone", "street", "city"]
+# Column widths from init_db, checked up front so a bad row is reported
+# with its line number instead of failing a whole batch
+MAX_LENGTHS = {"username": 100, "password": 255, "name": 100, "email": 100,
+               "phone": 50, "street": 200, "city": 100}
+
+
+def read_rows(f):
+    # Yields (line_number, row) for valid rows and reports the rest
+    reader = csv.DictReader(f)
+    missing = set(COLUMNS) - set(reader.fieldnames or [])
+    if missing:
+        raise SystemExit(f"CSV is missing columns: {', '.join(sorted(missing))}")
+
+    seen = set()
+    for row in reader:
+        line = reader.line_num
+        row = {column: (row[column] or "").strip() for column in COLUMNS}
+        if row["user_type"].lower() == "ngo":
+            row["user_type"] = "NGO"
+        elif row["user_type"].lower() == "donor":
+            row["user_type"] = "Donor"
+
+        problem = None
+        if not row["username"] or not row["password"] or not row["name"]:
+            problem = "username, password and name are required"
+        elif row["user_type"] not in PROFILE_TABLES:
+            problem = f"unknown user_type {row['user_type']!r}"
+        elif row["username"] in seen:
+            problem = f"duplicate username {row['username']!r} in file"
+        else:
+            too_long = [c for c, limit in MAX_LENGTHS.items() if len(row[c]) > limit]
+            if too_long:
+                problem = f"too long: {', '.join(too_long)}"
+
+        if problem:
+            print(f"line {line}: skipped, {problem}", file=sys.stderr)
+            continue
+        seen.add(row["username"])
+        yield line, row
+
+
+def existing_usernames(usernames):
+    # Usernames already registered in any shard
+    def lookup():
+        found = set()
+        with get_connection() as conn:
+            with conn.cursor() as cursor:
+                for start in range(0, len(usernames), 1000):
+                    chunk = usernames[start:start + 1000]
+                    placeholders = ", ".join(f":{i + 1}" for i in range(len(chunk)))
+                    cursor.execute(f"SELECT username FROM users WHERE username IN ({placeholders})", chunk)
+                    found.update(username for (username,) in cursor)
+        return found
+
+    return set().union(*scatter(lookup).values())
+
+
+def insert_batch(cursor, batch, password_hashes):
+    # Array-bound inserts: one round trip for the users, one per profile
+    # table. Returns (created, errors) where errors is [(line, message)]
+    errors = []
+    user_id_var = cursor.var(oracledb.NUMBER, arraysize=len(batch))
+    cursor.setinputsizes(None, None, None, user_id_var)
+    cursor.executemany(
+        "INSERT INTO users (username, password, user_type) VALUES (:1, :2, :3) RETURNING user_id INTO :4",
+        [[row["username"], password_hash, row["user_type"]]
+         for (_, row), password_hash in zip(batch, password_hashes)],
+        batcherrors=True
+    )
+    failed = {error.offset for error in cursor.getbatcherrors()}
+    for error in cursor.getbatcherrors():
+        errors.append((batch[error.offset][0], error.message))
+
+    users = [(line, row, int(user_id_var.getvalue(i)[0]))
+             for i, (line, row) in enumerate(batch) if i not in failed]
+
+    created = 0
+    orphans = []
+    for user_type, table in PROFILE_TABLES.items():
+        profiles = [(line, row, user_id) for line, row, user_id in users if row["user_type"] == user_type]
+        if not profiles:
+            continue
+
+        rows = []
+        for _, row, user_id in profiles:
+            latitude, longitude = geocode(row["street"], row["city"])
+            rows.append([user_id, row["name"], row["email"], row["phone"], row["street"],
+                         row["city"], latitude, longitude])
+        cursor.executemany(
+            f"INSERT INTO {table} (user_id, name, email, phone, street, city, latitude, longitude) "
+            f"VALUES (:1, :2, :3, :4, :5, :6, :7, :8)",
+            rows,
+            batcherrors=True
+        )
+        profile_errors = cursor.getbatcherrors()
+        for error in profile_errors:
+            line, _, user_id = profiles[error.offset]
+            errors.append((line, error.message))
+            orphans.append([user_id])
+        created += len(profiles) - len(profile_errors)
+
+    # A user whose profile failed is removed before the batch commits
+    if orphans:
+        cursor.executemany("DELETE FROM users WHERE user_id = :1", orphans)
+    return created, errors
+
+
+def onboard(rows, batch_size=ONBOARD_BATCH_SIZE, dry_run=False):
+    created = 0
+    skipped = 0
+    failed = 0
+    by_shard = defaultdict(list)
+    for line, row in rows:
+        by_shard[shard_for_city(row["city"])].append((line, row))
+
+    for shard, shard_rows in by_shard.items():
+        with use_shard(shard):
+            for start in range(0, len(shard_rows), batch_size):
+                batch = shard_rows[start:start + batch_size]
+                taken = existing_usernames([row["username"] for _, row in batch])
+                for line, row in batch:
+                    if row["username"] in taken:
+                        print(f"line {line}: skipped, username {row['username']!r} already exists", file=sys.stderr)
+                batch = [(line, row) for line, row in batch if row["username"] not in taken]
+                skipped += len(taken)
+                if not batch:
+                    continue
+
+                # Hashed on every core before a connection is taken
+                password_hashes = hash_passwords([row["password"] for _, row in batch])
+                with get_connection() as conn:
+                    with conn.cursor() as cursor:
+                        batch_created, errors = insert_batch(cursor, batch, password_hashes)
+                        if dry_run:
+                            conn.rollback()
+                        else:
+                            conn.commit()
+                for line, message in errors:
+                    print(f"line {line}: failed, {message}", file=sys.stderr)
+                created += batch_created
+                failed += len(errors)
+
+            if not dry_run:
+                get_all_ngos.invalidate()
+
+    return created, skipped, failed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Register donors and NGOs in bulk from a CSV with columns: " + ",".join(COLUMNS)
+    )
+    parser.add_argument("csv_file", help="CSV file, or - for stdin")
+    parser.add_argument("--batch-size", type=int, default=ONBOARD_BATCH_SIZE, help="Rows per round trip and commit")
+    parser.add_argument("--dry-run", action="store_true", help="Insert and roll back, to validate a file")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    try:
+        if args.csv_file == "-":
+            result = onboard(read_rows(sys.stdin), args.batch_size, args.dry_run)
+        else:
+            with open(args.csv_file, newline="", encoding="utf-8-sig") as f:
+                result = onboard(read_rows(f), args.batch_size, args.dry_run)
+    except oracledb.DatabaseError as e:
+        print(f"Error onboarding accounts: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    created, skipped, failed = result
+    elapsed = time.perf_counter() - start
+    print(f"{'Validated' if args.dry_run else 'Registered'} {created} accounts in {elapsed:.1f}s "
+          f"({created / max(elapsed, 1e-9):.0f}/s); {skipped} already existed, {failed} failed",
+          file=sys.stderr)
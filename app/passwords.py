@@ -0,0 +1,109 @@
+import base64
+import hashlib
+import hmac
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# scrypt cost: memory per hash is 128 * N * r bytes (16 MiB by default).
+# bench_login.py measures what a setting costs per core
+PASSWORD_SCRYPT_N = int(os.getenv("PASSWORD_SCRYPT_N", str(2 ** 14)))
+PASSWORD_SCRYPT_R = int(os.getenv("PASSWORD_SCRYPT_R", "8"))
+PASSWORD_SCRYPT_P = int(os.getenv("PASSWORD_SCRYPT_P", "1"))
+# hashlib.scrypt releases the GIL, so threads use every core
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(os.cpu_count() or 1)))
+# Hashes allowed to queue for a worker, and how long (s) a caller waits for
+# room before giving up, so a login burst can't pile up unbounded work
+PASSWORD_MAX_PENDING = int(os.getenv("PASSWORD_MAX_PENDING", "64"))
+PASSWORD_QUEUE_WAIT = float(os.getenv("PASSWORD_QUEUE_WAIT", "5"))
+
+SALT_BYTES = 16
+KEY_BYTES = 32
+
+
+class PasswordHasherBusy(RuntimeError):
+    pass
+
+
+def _scrypt(password, salt, n, r, p):
+    # maxmem is what OpenSSL needs for these parameters, plus slack
+    return hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p,
+                          maxmem=128 * r * (n + p + 2) + 1024 * 1024, dklen=KEY_BYTES)
+
+def _b64(data):
+    return base64.b64encode(data).decode()
+
+def is_legacy(stored):
+    # Accounts created before scrypt hold a bare SHA-256 hex digest
+    return not stored.startswith("scrypt$")
+
+
+# Salted scrypt hashes stored as scrypt$N$r$p$salt$key, computed on a
+# bounded pool of worker threads instead of the caller's script thread
+class PasswordHasher:
+    def __init__(self, n=PASSWORD_SCRYPT_N, r=PASSWORD_SCRYPT_R, p=PASSWORD_SCRYPT_P,
+                 workers=PASSWORD_HASH_WORKERS, max_pending=PASSWORD_MAX_PENDING,
+                 queue_wait=PASSWORD_QUEUE_WAIT):
+        self.n = n
+        self.r = r
+        self.p = p
+        self.queue_wait = queue_wait
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="passwords")
+        self._pending = threading.BoundedSemaphore(max_pending)
+
+    def _submit(self, func, *args):
+        if not self._pending.acquire(timeout=self.queue_wait):
+            raise PasswordHasherBusy("too many password checks queued, try again shortly")
+        future = self._executor.submit(func, *args)
+        future.add_done_callback(lambda _: self._pending.release())
+        return future
+
+    def _encode(self, password):
+        salt = os.urandom(SALT_BYTES)
+        key = _scrypt(password, salt, self.n, self.r, self.p)
+        return f"scrypt${self.n}${self.r}${self.p}${_b64(salt)}${_b64(key)}"
+
+    def _check(self, password, stored):
+        if is_legacy(stored):
+            expected = hashlib.sha256(password.encode()).hexdigest()
+            return hmac.compare_digest(expected, stored)
+        _, n, r, p, salt, key = stored.split("$")
+        actual = _scrypt(password, base64.b64decode(salt), int(n), int(r), int(p))
+        return hmac.compare_digest(actual, base64.b64decode(key))
+
+    def hash(self, password):
+        return self._submit(self._encode, password).result()
+
+    def hash_many(self, passwords):
+        # Submitted as room frees up, so a large batch keeps every worker busy
+        futures = [self._submit(self._encode, password) for password in passwords]
+        return [future.result() for future in futures]
+
+    def verify(self, password, stored):
+        # Returns (ok, needs_rehash); needs_rehash is set for legacy hashes and
+        # hashes made with other cost parameters than the current ones
+        ok = self._submit(self._check, password, stored).result()
+        return ok, ok and self.needs_rehash(stored)
+
+    def needs_rehash(self, stored):
+        return is_legacy(stored) or stored.split("$")[1:4] != [str(self.n), str(self.r), str(self.p)]
+
+    def burn(self, password):
+        # Same work as a real check, so an unknown username takes as long to
+        # reject as a wrong password
+        self._submit(_scrypt, password, bytes(SALT_BYTES), self.n, self.r, self.p).result()
+
+
+_hasher = PasswordHasher()
+
+def hash_password(password):
+    return _hasher.hash(password)
+
+def hash_passwords(passwords):
+    return _hasher.hash_many(passwords)
+
+def verify_password(password, stored):
+    return _hasher.verify(password, stored)
+
+def burn_password_check(password):
+    _hasher.burn(password)
@@ -0,0 +1,75 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+import db
+from shards import current_shard, run_in_shard
+
+PREFETCH_WORKERS = int(os.getenv("PREFETCH_WORKERS", "4"))
+# Speculative work is shed rather than queued once this many calls are
+# waiting, so a burst of logins can't starve real queries of connections
+PREFETCH_MAX_PENDING = int(os.getenv("PREFETCH_MAX_PENDING", "64"))
+PREFETCH_WAIT = float(os.getenv("PREFETCH_WAIT", "10"))
+
+_executor = ThreadPoolExecutor(max_workers=PREFETCH_WORKERS, thread_name_prefix="prefetch")
+_pending = threading.BoundedSemaphore(PREFETCH_MAX_PENDING)
+
+
+def dashboard_calls(user_type, entity_id):
+    # What the first render of each dashboard asks for, in tab order
+    if user_type == "Donor":
+        return [
+            (db.get_donor_info, (entity_id,)),
+            (db.get_all_ngos, ()),
+            (db.get_donor_donations, (entity_id,)),
+            (db.get_all_pending_requests, ()),
+            (db.get_proximity_index, ()),
+            (db.get_donation_statistics, ()),
+            (db.get_top_donors, ()),
+            (db.get_expected_shortfalls, ()),
+        ]
+    return [
+        (db.get_ngo_info, (entity_id,)),
+        (db.get_ngo_requests, (entity_id,)),
+        (db.get_available_donations, (None,)),
+        (db.get_donation_trends, ()),
+        (db.get_ngo_donation_distribution, ()),
+        (db.get_ngo_shortfalls, (entity_id,)),
+    ]
+
+def _run(shard, func, args):
+    # Worker threads don't inherit the session's context, so the timeout is
+    # applied here and stale reads are handed back with the result
+    try:
+        with db.call_timeout(db.DB_CALL_TIMEOUT):
+            stale_reads = db.track_stale_reads()
+            return run_in_shard(shard, func, *args), stale_reads
+    finally:
+        _pending.release()
+
+def start_prefetch(user_type, entity_id):
+    # Starts the dashboard's queries in the background right after login.
+    # Returns {(function name, args): future} for the session to hold on to
+    futures = {}
+    shard = current_shard()
+    for func, args in dashboard_calls(user_type, entity_id):
+        if not _pending.acquire(blocking=False):
+            break
+        futures[(func.__name__, args)] = _executor.submit(_run, shard, func, args)
+    return futures
+
+def take_prefetched(futures, func, *args):
+    # Result of a call started by start_prefetch, or a fresh call if there
+    # is none. Each result is used once, so later reruns see new writes
+    future = futures.pop((func.__name__, args), None) if futures else None
+    if future is not None:
+        try:
+            result, stale_reads = future.result(timeout=PREFETCH_WAIT)
+            db.merge_stale_reads(stale_reads)
+            return result
+        except FutureTimeoutError:
+            print(f"Error in prefetch ({func.__name__}): timed out")
+        except Exception as e:
+            print(f"Error in prefetch ({func.__name__}): {e}")
+    return func(*args)
@@ -0,0 +1,110 @@
+import datetime
+import hmac
+import os
+import time
+
+import streamlit as st
+
+import sql
+
+# PROFILE_RERUNS=1 profiles every rerun of every session (local debugging).
+# With PROFILE_TOKEN set, an admin can profile just their own session by
+# opening the app with ?profile=<token>
+PROFILE_RERUNS = os.getenv("PROFILE_RERUNS", "0") == "1"
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN")
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", "0.001"))
+PROFILE_TOP_FUNCTIONS = 10
+
+# Files whose functions count as "data functions" in the inline summary
+DATA_MODULES = ("db.py", "export.py", "geo.py", "sketches.py", "sql.py", "store.py")
+
+
+def profiling_enabled():
+    if PROFILE_RERUNS:
+        return True
+    if not PROFILE_TOKEN:
+        return False
+    token = st.query_params.get("profile")
+    return bool(token) and hmac.compare_digest(token, PROFILE_TOKEN)
+
+
+def _data_function_times(frame, totals, active=()):
+    # Inclusive time per data function. A function already on the stack
+    # (recursion, or db.py calling itself through a decorator) is counted
+    # once, at its outermost frame
+    key = None
+    if frame.file_path and os.path.basename(frame.file_path) in DATA_MODULES:
+        key = f"{os.path.basename(frame.file_path)}:{frame.function}"
+        if key not in active:
+            totals[key] = totals.get(key, 0.0) + frame.time
+            active = active + (key,)
+    for child in frame.children:
+        _data_function_times(child, totals, active)
+    return totals
+
+
+def save_profile(profiler):
+    from pyinstrument.renderers import SpeedscopeRenderer
+
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    stamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+    path = os.path.join(PROFILE_DIR, f"rerun-{stamp}.speedscope.json")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(profiler.output(renderer=SpeedscopeRenderer()))
+    return path
+
+
+def show_profile(profiler, path, wall_time):
+    session = profiler.last_session
+    root = session.root_frame()
+    totals = _data_function_times(root, {}) if root else {}
+    slowest = sorted(totals.items(), key=lambda item: item[1], reverse=True)[:PROFILE_TOP_FUNCTIONS]
+
+    with st.expander(f"Profile: this rerun took {wall_time * 1000:.0f} ms", expanded=False):
+        if slowest:
+            st.table([{"Function": name, "Time (ms)": f"{seconds * 1000:.1f}",
+                       "Share": f"{seconds / max(wall_time, 1e-9):.0%}"} for name, seconds in slowest])
+        else:
+            st.caption("No data function was sampled in this rerun.")
+        statements = sql.statement_stats()[:PROFILE_TOP_FUNCTIONS]
+        if statements:
+            st.caption("Busiest statements since this process started")
+            st.table([{"Statement": s["statement"], "Executions": s["executions"], "Rows": s["rows"],
+                       "Total (ms)": f"{s['total_ms']:.0f}", "Mean (ms)": f"{s['mean_ms']:.2f}"}
+                      for s in statements])
+        if path:
+            st.caption(f"Saved to {path}. Open it at https://www.speedscope.app for the flamegraph.")
+            with open(path, "rb") as f:
+                st.download_button("Download speedscope profile", f, file_name=os.path.basename(path),
+                                   mime="application/json", key="profile_download")
+
+
+def run_profiled(main):
+    # Imported here so the profiler costs nothing unless it is switched on
+    try:
+        from pyinstrument import Profiler
+    except ImportError:
+        main()
+        st.warning("Profiling needs pyinstrument (pip install pyinstrument)")
+        return
+
+    profiler = Profiler(interval=PROFILE_INTERVAL, async_mode="disabled")
+    start = time.perf_counter()
+    profiler.start()
+    completed = False
+    try:
+        main()
+        completed = True
+    finally:
+        # st.rerun() and st.stop() end the script with an exception; the
+        # profile is still saved, just not shown on a page about to be replaced
+        profiler.stop()
+        wall_time = time.perf_counter() - start
+        try:
+            path = save_profile(profiler)
+        except OSError as e:
+            print(f"Error in save_profile: {e}")
+            path = None
+    if completed:
+        show_profile(profiler, path, wall_time)
@@ -1,5 +1,10 @@
-import oracledb
+import argparse
+import gzip
 import os
+import pickle
+import time
+
+import oracledb
 
 # Database configuration
 DB_USER = os.getenv("DB_USER", "new_user")
@@ -8,27 +13,47 @@ DB_HOST = os.getenv("DB_HOST", "localhost")
 DB_PORT = os.getenv("DB_PORT", "1521")
 DB_SERVICE = os.getenv("DB_SERVICE", "XEPDB1")
 
+# Tables in dependency order (parent tables first) with their identity column,
+# if they have one
+TABLES = [
+    ("users", "user_id"),
+    ("donors", "donor_id"),
+    ("ngos", "ngo_id"),
+    ("food_types", "food_type_id"),
+    ("food_type_aliases", None),
+    ("food_donations", "donation_id"),
+    ("requests", "request_id"),
+    ("entity_versions", None),
+    ("donation_sketches", None),
+    ("analytics_watermarks", None),
+    ("sketched_donations", None),
+    ("change_events", "event_id"),
+    ("event_checkpoints", None),
+    ("search_documents", None),
+    ("demand_forecasts", None),
+]
+
+TRIGGERS = ["check_donation_date", "sync_request_search", "sync_donation_search"]
+
+BATCH_SIZE = 50000
+
+def connect():
+    return oracledb.connect(user=DB_USER, password=DB_PASSWORD, dsn=f"{DB_HOST}:{DB_PORT}/{DB_SERVICE}")
+
 def reset_database():
     try:
-        with oracledb.connect(user=DB_USER, password=DB_PASSWORD, dsn=f"{DB_HOST}:{DB_PORT}/{DB_SERVICE}") as conn:
+        with connect() as conn:
             with conn.cursor() as cursor:
-                # First drop trigger
-                try:
-                    cursor.execute("DROP TRIGGER check_donation_date")
-                    print("Dropped trigger: check_donation_date")
-                except oracledb.DatabaseError:
-                    print("Trigger check_donation_date does not exist")
+                # First drop triggers
+                for trigger in TRIGGERS:
+                    try:
+                        cursor.execute(f"DROP TRIGGER {trigger}")
+                        print(f"Dropped trigger: {trigger}")
+                    except oracledb.DatabaseError:
+                        print(f"Trigger {trigger} does not exist")
 
                 # Drop tables in correct order (child tables first)
-                tables = [
-                    "requests",              # Contains requests (now with donation_id FK)
-                    "food_donations",         # Contains donations
-                    "donors",                # Donor main table
-                    "ngos",                  # NGO main table
-                    "users"                  # Users table (parent table)
-                ]
-
-                for table in tables:
+                for table, _ in reversed(TABLES):
                     try:
                         cursor.execute(f"DROP TABLE {table} CASCADE CONSTRAINTS")
                         print(f"Dropped table: {table}")
@@ -42,6 +67,158 @@ def reset_database():
         print(f"Error resetting database: {e}")
         return False
 
+def set_foreign_keys(cursor, enabled):
+    cursor.execute(f'''
+        SELECT table_name, constraint_name
+        FROM user_constraints
+        WHERE constraint_type = 'R'
+          AND LOWER(table_name) IN ({", ".join(f"'{table}'" for table, _ in TABLES)})
+    ''')
+    action = "ENABLE" if enabled else "DISABLE"
+    for table_name, constraint_name in cursor.fetchall():
+        cursor.execute(f"ALTER TABLE {table_name} {action} CONSTRAINT {constraint_name}")
+
+def set_triggers(cursor, enabled):
+    action = "ENABLE" if enabled else "DISABLE"
+    for trigger in TRIGGERS:
+        try:
+            cursor.execute(f"ALTER TRIGGER {trigger} {action}")
+        except oracledb.DatabaseError:
+            print(f"Trigger {trigger} does not exist")
+
+def truncate_tables(cursor):
+    # TRUNCATE is refused on tables referenced by enabled foreign keys, so the
+    # constraints are switched off for the duration
+    set_foreign_keys(cursor, False)
+    try:
+        for table, identity_column in reversed(TABLES):
+            cursor.execute(f"TRUNCATE TABLE {table}")
+            if identity_column:
+                cursor.execute(f"ALTER TABLE {table} MODIFY {identity_column} GENERATED ALWAYS AS IDENTITY (START WITH 1)")
+            print(f"Truncated table: {table}")
+    finally:
+        set_foreign_keys(cursor, True)
+
+def truncate_database():
+    try:
+        with connect() as conn:
+            with conn.cursor() as cursor:
+                truncate_tables(cursor)
+        print("\nDatabase truncated successfully!")
+        return True
+    except oracledb.DatabaseError as e:
+        print(f"Error truncating database: {e}")
+        return False
+
+def snapshot_database(directory):
+    os.makedirs(directory, exist_ok=True)
+    oracledb.defaults.fetch_lobs = False
+
+    try:
+        with connect() as conn:
+            with conn.cursor() as cursor:
+                cursor.arraysize = BATCH_SIZE
+                cursor.prefetchrows = BATCH_SIZE + 1
+
+                for table, identity_column in TABLES:
+                    start = time.perf_counter()
+                    row_count = 0
+                    path = os.path.join(directory, f"{table}.pkl.gz")
+
+                    cursor.execute(f"SELECT * FROM {table}" + (f" ORDER BY {identity_column}" if identity_column else ""))
+                    columns = [col[0].lower() for col in cursor.description]
+
+                    # File layout: column list, then one pickled list per batch of rows
+                    with gzip.open(path, "wb", compresslevel=1) as f:
+                        pickle.dump(columns, f, protocol=pickle.HIGHEST_PROTOCOL)
+                        while True:
+                            rows = cursor.fetchmany()
+                            if not rows:
+                                break
+                            pickle.dump(rows, f, protocol=pickle.HIGHEST_PROTOCOL)
+                            row_count += len(rows)
+
+                    print(f"Saved {row_count} rows from {table} in {time.perf_counter() - start:.1f}s")
+
+        print(f"\nSnapshot written to {directory}")
+        return True
+    except oracledb.DatabaseError as e:
+        print(f"Error creating snapshot: {e}")
+        return False
+
+def read_batches(f):
+    while True:
+        try:
+            yield pickle.load(f)
+        except EOFError:
+            return
+
+def restore_database(directory):
+    try:
+        with connect() as conn:
+            with conn.cursor() as cursor:
+                truncate_tables(cursor)
+                set_foreign_keys(cursor, False)
+                set_triggers(cursor, False)
+
+                try:
+                    for table, identity_column in TABLES:
+                        path = os.path.join(directory, f"{table}.pkl.gz")
+                        if not os.path.exists(path):
+                            print(f"No snapshot file for {table}, leaving it empty")
+                            continue
+
+                        start = time.perf_counter()
+                        row_count = 0
+
+                        # Keep the snapshot's ids so foreign keys still line up
+                        if identity_column:
+                            cursor.execute(f"ALTER TABLE {table} MODIFY {identity_column} GENERATED BY DEFAULT AS IDENTITY")
+
+                        with gzip.open(path, "rb") as f:
+                            batches = read_batches(f)
+                            columns = next(batches)
+                            insert_sql = (
+                                f"INSERT /*+ APPEND_VALUES */ INTO {table} ({', '.join(columns)}) "
+                                f"VALUES ({', '.join(f':{i + 1}' for i in range(len(columns)))})"
+                            )
+                            for rows in batches:
+                                cursor.executemany(insert_sql, rows)
+                                conn.commit()
+                                row_count += len(rows)
+
+                        if identity_column:
+                            cursor.execute(f"ALTER TABLE {table} MODIFY {identity_column} GENERATED ALWAYS AS IDENTITY (START WITH LIMIT VALUE)")
+                        print(f"Restored {row_count} rows into {table} in {time.perf_counter() - start:.1f}s")
+                finally:
+                    set_triggers(cursor, True)
+                    set_foreign_keys(cursor, True)
+
+        print("\nDatabase restored successfully!")
+        return True
+    except oracledb.DatabaseError as e:
+        print(f"Error restoring database: {e}")
+        return False
+
 if __name__ == "__main__":
-    print("Starting database reset...")
-    reset_database()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Reset, truncate, snapshot or restore the database")
+    parser.add_argument(
+        "mode", nargs="?", default="drop", choices=["drop", "truncate", "snapshot", "restore"],
+        help="drop: remove all tables (default); truncate: empty tables but keep the schema; "
+             "snapshot/restore: save or load all rows to/from compressed files"
+    )
+    parser.add_argument("--dir", default="snapshot", help="Snapshot directory (default: snapshot)")
+    args = parser.parse_args()
+
+    if args.mode == "drop":
+        print("Starting database reset...")
+        reset_database()
+    elif args.mode == "truncate":
+        print("Truncating database...")
+        truncate_database()
+    elif args.mode == "snapshot":
+        print(f"Creating snapshot in {args.dir}...")
+        snapshot_database(args.dir)
+    else:
+        print(f"Restoring snapshot from {args.dir}...")
+        restore_database(args.dir)
@@ -0,0 +1,94 @@
+import random
+import threading
+import time
+
+import oracledb
+
+# Errors that say the database or the network to it is in trouble, as
+# opposed to a problem with the statement itself
+TRANSIENT_ERRORS = {
+    "DPY-4005",   # timed out waiting for a pooled connection
+    "DPY-4011",   # connection closed by the database or network
+    "DPY-4024",   # call timeout exceeded
+    "DPY-6000",   # listener refused connection
+    "DPY-6005",   # cannot connect to database
+    "ORA-01033",  # database starting up or shutting down
+    "ORA-01034",  # database not available
+    "ORA-01089",  # immediate shutdown in progress
+    "ORA-03113",  # end-of-file on communication channel
+    "ORA-03114",  # not connected
+    "ORA-03135",  # connection lost contact
+    "ORA-03156",  # OCI call timed out
+    "ORA-12170",  # connect timeout
+    "ORA-12514",  # service not known to the listener
+    "ORA-12528",  # listener blocking new connections
+    "ORA-12537",  # connection closed
+    "ORA-12541",  # no listener
+}
+
+# A slow database isn't made faster by asking again
+TIMEOUT_ERRORS = {"DPY-4005", "DPY-4024", "ORA-03156"}
+
+
+class CircuitOpenError(oracledb.DatabaseError):
+    pass
+
+
+def error_code(e):
+    error = e.args[0] if e.args else None
+    return getattr(error, "full_code", None)
+
+def is_transient(e):
+    if isinstance(e, CircuitOpenError):
+        return False
+    error = e.args[0] if e.args else None
+    return getattr(error, "isrecoverable", False) or error_code(e) in TRANSIENT_ERRORS
+
+def is_retryable(e):
+    return is_transient(e) and error_code(e) not in TIMEOUT_ERRORS
+
+def backoff(attempt, base=0.1, cap=2.0):
+    # Full jitter, so sessions that failed together don't retry together
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+# Fails calls fast once `threshold` transient failures in a row say the
+# database is unhealthy. After `reset_timeout` seconds one trial call is let
+# through; it closes the circuit on success and reopens it on failure
+class CircuitBreaker:
+    def __init__(self, name, threshold=5, reset_timeout=30.0):
+        self.name = name
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def check(self):
+        with self._lock:
+            if self.state == "closed":
+                return
+            # A trial that never reports back doesn't hold the circuit forever
+            if time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = "half-open"
+                self.opened_at = time.monotonic()
+                return
+        raise CircuitOpenError(f"database {self.name} is unavailable, retrying in {self.retry_in():.0f}s")
+
+    def retry_in(self):
+        return max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at))
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == "half-open" or self.failures >= self.threshold:
+                if self.state != "open":
+                    print(f"Circuit for database {self.name} opened after {self.failures} failures")
+                self.state = "open"
+                self.opened_at = time.monotonic()
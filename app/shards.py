@@ -0,0 +1,72 @@
+import contextlib
+import contextvars
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from geo import normalize_place
+
+# JSON file mapping cities to shards, see shards.example.json. Without it
+# everything lives in the single "default" shard configured by DB_*
+SHARD_CONFIG = os.getenv("SHARD_CONFIG")
+DEFAULT_SHARD = "default"
+
+
+def load_shard_config(path=SHARD_CONFIG):
+    if not path:
+        return {DEFAULT_SHARD: {}}, {}, DEFAULT_SHARD
+
+    with open(path, encoding="utf-8") as f:
+        config = json.load(f)
+    shards = config["shards"]
+    cities = {normalize_place(city): shard for city, shard in config.get("cities", {}).items()}
+    default = config.get("default", next(iter(shards)))
+
+    unknown = (set(cities.values()) | {default}) - set(shards)
+    if unknown:
+        raise ValueError(f"Unknown shards in {path}: {', '.join(sorted(unknown))}")
+    return shards, cities, default
+
+
+SHARDS, CITY_SHARDS, DEFAULT = load_shard_config()
+
+# The shard the current session (or worker thread) is talking to. Each
+# Streamlit session runs its script in its own thread, and threads start
+# with an empty context, so a session never sees another session's shard
+_current_shard = contextvars.ContextVar("current_shard", default=None)
+
+
+def shard_names():
+    return list(SHARDS)
+
+def shard_for_city(city):
+    # Cities that aren't mapped land in the default shard
+    return CITY_SHARDS.get(normalize_place(city), DEFAULT)
+
+def current_shard():
+    return _current_shard.get() or DEFAULT
+
+@contextlib.contextmanager
+def use_shard(name):
+    token = _current_shard.set(name)
+    try:
+        yield
+    finally:
+        _current_shard.reset(token)
+
+def run_in_shard(name, func, *args):
+    with use_shard(name):
+        return func(*args)
+
+def scatter(func, *args, shards=None):
+    # Runs func(*args) once per shard, in parallel, and returns {shard: result}
+    shards = shards or shard_names()
+    if len(shards) == 1:
+        return {shards[0]: run_in_shard(shards[0], func, *args)}
+
+    with ThreadPoolExecutor(max_workers=len(shards), thread_name_prefix="scatter") as executor:
+        # Each call runs in a copy of the caller's context, so call timeouts
+        # and error tracking carry over to the worker threads
+        futures = {name: executor.submit(contextvars.copy_context().run, run_in_shard, name, func, *args)
+                   for name in shards}
+        return {name: future.result() for name, future in futures.items()}
@@ -0,0 +1,53 @@
+import threading
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+# Coalesces identical concurrent calls: the first caller for a key runs the
+# call and everyone who asks for the same key meanwhile waits for its result
+# instead of running it again. Nothing is kept once the call returns, so
+# this sits in front of a cache rather than replacing one
+class SingleFlight:
+    def __init__(self, wait_timeout=None):
+        self.wait_timeout = wait_timeout
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, func):
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+
+        if not leader:
+            # A leader stuck past the timeout stops holding up the rest,
+            # who fall back to running the call themselves
+            if not flight.done.wait(self.wait_timeout):
+                return func()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = func()
+            return flight.result
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+            flight.done.set()
+
+    def forget(self, key):
+        # Callers arriving after a write start a new call instead of joining
+        # one that may have read the data before the write
+        with self._lock:
+            self._flights.pop(key, None)
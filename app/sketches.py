@@ -0,0 +1,154 @@
+import math
+import struct
+import zlib
+
+import numpy as np
+
+HLL_PRECISION = 14            # 16384 registers, ~0.8% standard error
+QUANTILE_ACCURACY = 0.01      # 1% relative error on every quantile
+# Largest sketch body loads() will inflate
+MAX_SKETCH_BYTES = 1 << 20
+
+_UINT64 = np.uint64
+
+
+def _splitmix64(values):
+    # Vectorized 64-bit mixer; uint64 arithmetic wraps, which is what we want
+    x = values.astype(_UINT64) + _UINT64(0x9E3779B97F4A7C15)
+    x = (x ^ (x >> _UINT64(30))) * _UINT64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> _UINT64(27))) * _UINT64(0x94D049BB133111EB)
+    return x ^ (x >> _UINT64(31))
+
+
+def _bit_length(values):
+    values = values.copy()
+    lengths = np.zeros(values.shape, dtype=np.int64)
+    for shift in (32, 16, 8, 4, 2, 1):
+        mask = values >= _UINT64(1 << shift)
+        lengths[mask] += shift
+        values[mask] >>= _UINT64(shift)
+    return lengths + (values > 0)
+
+
+# HyperLogLog distinct counter; two sketches merge by taking the register max
+class HyperLogLog:
+    def __init__(self, precision=HLL_PRECISION, registers=None):
+        self.precision = precision
+        self.registers = registers if registers is not None else np.zeros(1 << precision, dtype=np.uint8)
+
+    def add(self, values):
+        hashes = _splitmix64(np.asarray(values))
+        index = (hashes >> _UINT64(64 - self.precision)).astype(np.int64)
+        remainder = hashes & _UINT64((1 << (64 - self.precision)) - 1)
+        rank = ((64 - self.precision) - _bit_length(remainder) + 1).astype(np.uint8)
+        np.maximum.at(self.registers, index, rank)
+
+    def merge(self, other):
+        if other.precision != self.precision:
+            raise ValueError(f"cannot merge HyperLogLog precision {other.precision} into {self.precision}")
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    def estimate(self):
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / np.sum(np.ldexp(1.0, -self.registers.astype(np.int64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if raw <= 2.5 * m and zeros:
+            return m * math.log(m / zeros)
+        return raw
+
+
+# Log-bucketed quantile sketch (DDSketch style): each bucket covers values
+# within QUANTILE_ACCURACY of each other, and sketches merge by adding counts
+class QuantileSketch:
+    def __init__(self, accuracy=QUANTILE_ACCURACY, buckets=None):
+        self.accuracy = accuracy
+        self.gamma = (1 + accuracy) / (1 - accuracy)
+        self.buckets = buckets if buckets is not None else {}
+
+    def add(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        values = values[values > 0]
+        keys = np.ceil(np.log(values) / math.log(self.gamma)).astype(np.int64)
+        unique, counts = np.unique(keys, return_counts=True)
+        for key, count in zip(unique.tolist(), counts.tolist()):
+            self.buckets[key] = self.buckets.get(key, 0) + count
+
+    def merge(self, other):
+        if other.accuracy != self.accuracy:
+            raise ValueError(f"cannot merge quantile accuracy {other.accuracy} into {self.accuracy}")
+        for key, count in other.buckets.items():
+            self.buckets[key] = self.buckets.get(key, 0) + count
+
+    def quantile(self, q):
+        total = sum(self.buckets.values())
+        if not total:
+            return None
+        rank = q * (total - 1)
+        seen = 0
+        for key in sorted(self.buckets):
+            seen += self.buckets[key]
+            if seen > rank:
+                return 2 * self.gamma ** key / (self.gamma + 1)
+        return None
+
+
+# Sketches are stored in the database, so they are written as plain bytes
+# rather than pickled and loading one never runs code, whoever wrote it:
+# a header (magic, kind, precision or accuracy) then the zlib-compressed
+# HyperLogLog registers, or quantile (bucket, count) pairs as big-endian int64
+MAGIC = b"SK1"
+_HEADER = struct.Struct(">3scd")
+_HLL = b"H"
+_QUANTILES = b"Q"
+
+
+def dumps(sketch):
+    if isinstance(sketch, HyperLogLog):
+        header = _HEADER.pack(MAGIC, _HLL, sketch.precision)
+        body = sketch.registers.tobytes()
+    else:
+        header = _HEADER.pack(MAGIC, _QUANTILES, sketch.accuracy)
+        body = np.array(sorted(sketch.buckets.items()), dtype=">i8").tobytes()
+    return header + zlib.compress(body)
+
+
+def _inflate(data):
+    inflater = zlib.decompressobj()
+    try:
+        body = inflater.decompress(data, MAX_SKETCH_BYTES)
+    except zlib.error as e:
+        raise ValueError(f"corrupt sketch: {e}")
+    if inflater.unconsumed_tail or not inflater.eof:
+        raise ValueError("corrupt or oversized sketch")
+    return body
+
+
+def loads(data):
+    # Raises ValueError for anything that isn't a sketch dumps() wrote,
+    # including ones pickled by earlier versions
+    data = bytes(data)
+    if len(data) < _HEADER.size:
+        raise ValueError("sketch is truncated")
+    magic, kind, param = _HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError("not a sketch in the current format")
+    body = _inflate(data[_HEADER.size:])
+
+    if kind == _HLL:
+        if param != int(param) or not 4 <= param <= 18 or len(body) != 1 << int(param):
+            raise ValueError(f"invalid HyperLogLog precision {param}")
+        registers = np.frombuffer(body, dtype=np.uint8).copy()
+        if registers.max() > 64 - param + 1:
+            raise ValueError("invalid HyperLogLog register")
+        return HyperLogLog(int(param), registers)
+
+    if kind == _QUANTILES:
+        if not 0 < param < 1 or len(body) % 16:
+            raise ValueError(f"invalid quantile sketch (accuracy {param})")
+        pairs = np.frombuffer(body, dtype=">i8").reshape(-1, 2)
+        if (pairs[:, 1] <= 0).any():
+            raise ValueError("invalid quantile bucket count")
+        return QuantileSketch(param, {int(key): int(count) for key, count in pairs.tolist()})
+
+    raise ValueError(f"unknown sketch kind {kind!r}")
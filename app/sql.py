@@ -0,0 +1,299 @@
+import threading
+import time
+
+import oracledb
+
+NUMBER = oracledb.DB_TYPE_NUMBER
+DATE = oracledb.DB_TYPE_DATE
+
+
+def _dates_as_date(cursor, metadata):
+    # Every DATE column this app stores is a calendar day
+    if metadata.type_code is oracledb.DB_TYPE_DATE:
+        return cursor.var(oracledb.DB_TYPE_DATE, arraysize=cursor.arraysize,
+                          outconverter=lambda value: value.date())
+
+
+# A statement whose text never changes, so the driver's statement cache
+# keeps it parsed for the life of the pooled connection. Binds are declared
+# up front (a type, or an int for a string's maximum length) so the driver
+# doesn't infer types from each call's values, and dates go over the wire
+# as dates rather than strings run through TO_DATE/TO_CHAR
+class Statement:
+    def __init__(self, name, text, binds=None, arraysize=None):
+        self.name = name
+        self.text = text
+        self.binds = binds
+        self.arraysize = arraysize
+        self.executions = 0
+        self.rows = 0
+        self.seconds = 0.0
+        self._lock = threading.Lock()
+
+    def _prepare(self, cursor, returning=None):
+        binds = self.binds
+        if returning is not None:
+            # The RETURNING INTO slot is always the last bind
+            binds = list(binds[:-1]) + [returning]
+        if isinstance(binds, dict):
+            cursor.setinputsizes(**binds)
+        elif binds:
+            cursor.setinputsizes(*binds)
+
+    def _prepare_fetch(self, cursor):
+        # Callers share one cursor across statements, so sizes are set on
+        # every fetch rather than left over from the last one
+        self._prepare(cursor)
+        cursor.arraysize = self.arraysize or oracledb.defaults.arraysize
+        cursor.prefetchrows = self.arraysize or oracledb.defaults.prefetchrows
+        cursor.outputtypehandler = _dates_as_date
+
+    def _record(self, start, rows):
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.executions += 1
+            self.rows += rows
+            self.seconds += elapsed
+
+    def execute(self, cursor, params=None):
+        self._prepare(cursor)
+        start = time.perf_counter()
+        cursor.execute(self.text, params)
+        self._record(start, max(cursor.rowcount, 0))
+        return cursor
+
+    def executemany(self, cursor, rows, returning=None, **kwargs):
+        self._prepare(cursor, returning)
+        start = time.perf_counter()
+        cursor.executemany(self.text, rows, **kwargs)
+        self._record(start, len(rows))
+        return cursor
+
+    def fetchone(self, cursor, params=None):
+        self._prepare_fetch(cursor)
+        start = time.perf_counter()
+        try:
+            cursor.execute(self.text, params)
+            row = cursor.fetchone()
+        finally:
+            cursor.outputtypehandler = None
+        self._record(start, int(row is not None))
+        return row
+
+    def fetchall(self, cursor, params=None):
+        self._prepare_fetch(cursor)
+        start = time.perf_counter()
+        try:
+            cursor.execute(self.text, params)
+            rows = cursor.fetchall()
+        finally:
+            cursor.outputtypehandler = None
+        self._record(start, len(rows))
+        return rows
+
+
+STATEMENTS = {}
+
+def statement(name, text, binds=None, arraysize=None):
+    STATEMENTS[name] = Statement(name, text, binds, arraysize)
+    return STATEMENTS[name]
+
+def statement_stats():
+    # Per statement totals for this process, most time first
+    stats = []
+    for s in STATEMENTS.values():
+        if s.executions:
+            stats.append({"statement": s.name, "executions": s.executions, "rows": s.rows,
+                          "total_ms": s.seconds * 1000, "mean_ms": s.seconds * 1000 / s.executions})
+    return sorted(stats, key=lambda item: item["total_ms"], reverse=True)
+
+
+# Users
+USER_LOGIN = statement("user_login", '''
+    SELECT user_id, user_type, password FROM users WHERE username = :1
+''', [100], arraysize=1)
+
+# Only replaces the hash that was verified, so a password changed in the
+# meantime isn't overwritten
+UPGRADE_PASSWORD = statement("upgrade_password", '''
+    UPDATE users SET password = :1 WHERE user_id = :2 AND password = :3
+''', [255, NUMBER, 255])
+
+DONOR_ID_BY_USER = statement("donor_id_by_user", '''
+    SELECT donor_id FROM donors WHERE user_id = :1
+''', [NUMBER], arraysize=1)
+
+NGO_ID_BY_USER = statement("ngo_id_by_user", '''
+    SELECT ngo_id FROM ngos WHERE user_id = :1
+''', [NUMBER], arraysize=1)
+
+DONOR_INFO = statement("donor_info", '''
+    SELECT d.name, d.email, d.phone, d.street, d.city, d.latitude, d.longitude
+    FROM donors d
+    WHERE d.donor_id = :1
+''', [NUMBER], arraysize=1)
+
+NGO_INFO = statement("ngo_info", '''
+    SELECT n.name, n.email, n.phone, n.street, n.city, n.latitude, n.longitude
+    FROM ngos n
+    WHERE n.ngo_id = :1
+''', [NUMBER], arraysize=1)
+
+# Food types
+FOOD_TYPE_BY_ALIAS = statement("food_type_by_alias", '''
+    SELECT food_type_id FROM food_type_aliases WHERE alias = :1
+''', [100], arraysize=1)
+
+FOOD_TYPE_BY_NAME = statement("food_type_by_name", '''
+    SELECT food_type_id FROM food_types WHERE name = :1
+''', [100], arraysize=1)
+
+INSERT_FOOD_TYPE_ALIAS = statement("insert_food_type_alias", '''
+    INSERT INTO food_type_aliases (alias, food_type_id) VALUES (:1, :2)
+''', [100, NUMBER])
+
+# Versions and events
+ENTITY_VERSION = statement("entity_version", '''
+    SELECT version FROM entity_versions WHERE entity_type = :1 AND entity_id = :2
+''', [10, NUMBER], arraysize=1)
+
+BUMP_ENTITY_VERSIONS = statement("bump_entity_versions", '''
+    MERGE INTO entity_versions v
+    USING (SELECT :1 AS entity_type, :2 AS entity_id FROM dual) s
+    ON (v.entity_type = s.entity_type AND v.entity_id = s.entity_id)
+    WHEN MATCHED THEN UPDATE SET v.version = v.version + 1
+    WHEN NOT MATCHED THEN INSERT (entity_type, entity_id, version) VALUES (s.entity_type, s.entity_id, 1)
+''', [10, NUMBER])
+
+INSERT_EVENTS = statement("insert_events", '''
+    INSERT INTO change_events (event_type, entity_type, entity_id, payload) VALUES (:1, :2, :3, :4)
+''', [50, 20, NUMBER, 4000])
+
+# Donations
+INSERT_DONATION = statement("insert_donation", '''
+    INSERT INTO food_donations
+    (donor_id, food_type_id, donation_date, expiry_date, quantity, ngo_id, status)
+    VALUES (:1, :2, :3, :4, :5, :6, :7)
+    RETURNING donation_id INTO :8
+''', [NUMBER, NUMBER, DATE, DATE, NUMBER, NUMBER, 50, None])
+
+DONOR_DONATIONS = statement("donor_donations", '''
+    SELECT fd.donation_id, ft.name as food_type, fd.donation_date, fd.expiry_date,
+           fd.quantity, fd.status, NVL(n.name, 'None') as ngo_name
+    FROM food_donations fd
+    JOIN food_types ft ON fd.food_type_id = ft.food_type_id
+    LEFT JOIN ngos n ON fd.ngo_id = n.ngo_id
+    WHERE fd.donor_id = :1
+    ORDER BY fd.donation_date DESC
+''', [NUMBER], arraysize=500)
+
+AVAILABLE_DONATIONS = statement("available_donations", '''
+    SELECT fd.donation_id, ft.name as food_type, fd.quantity, fd.expiry_date, fd.donation_date,
+           d.name as donor_name, d.city as donor_city
+    FROM food_donations fd
+    JOIN food_types ft ON fd.food_type_id = ft.food_type_id
+    JOIN donors d ON fd.donor_id = d.donor_id
+    WHERE fd.status = 'Available'
+      AND fd.expiry_date >= TRUNC(SYSDATE)
+    ORDER BY fd.expiry_date, fd.donation_id
+    FETCH FIRST :limit ROWS ONLY
+''', {"limit": NUMBER}, arraysize=100)
+
+AVAILABLE_DONATIONS_AFTER = statement("available_donations_after", '''
+    SELECT fd.donation_id, ft.name as food_type, fd.quantity, fd.expiry_date, fd.donation_date,
+           d.name as donor_name, d.city as donor_city
+    FROM food_donations fd
+    JOIN food_types ft ON fd.food_type_id = ft.food_type_id
+    JOIN donors d ON fd.donor_id = d.donor_id
+    WHERE fd.status = 'Available'
+      AND fd.expiry_date >= TRUNC(SYSDATE)
+      AND (fd.expiry_date > :after_date
+           OR (fd.expiry_date = :after_date AND fd.donation_id > :after_id))
+    ORDER BY fd.expiry_date, fd.donation_id
+    FETCH FIRST :limit ROWS ONLY
+''', {"after_date": DATE, "after_id": NUMBER, "limit": NUMBER}, arraysize=100)
+
+LOCK_AVAILABLE_DONATION = statement("lock_available_donation", '''
+    SELECT donor_id FROM food_donations
+    WHERE donation_id = :1 AND status = 'Available'
+    FOR UPDATE SKIP LOCKED
+''', [NUMBER], arraysize=1)
+
+# With SKIP LOCKED rows are locked as they are fetched, so fetching a single
+# row locks only that one
+LOCK_NEXT_AVAILABLE = statement("lock_next_available", '''
+    SELECT donation_id, donor_id FROM food_donations
+    WHERE status = 'Available' AND expiry_date >= TRUNC(SYSDATE)
+    ORDER BY expiry_date, donation_id
+    FOR UPDATE SKIP LOCKED
+''', arraysize=1)
+
+ASSIGN_DONATION = statement("assign_donation", '''
+    UPDATE food_donations SET ngo_id = :1, status = 'Assigned' WHERE donation_id = :2
+''', [NUMBER, NUMBER])
+
+# Requests
+INSERT_REQUEST = statement("insert_request", '''
+    INSERT INTO requests (ngo_id, food_type_id, quantity, request_date, status)
+    VALUES (:1, :2, :3, :4, 'Pending')
+    RETURNING request_id INTO :5
+''', [NUMBER, NUMBER, NUMBER, DATE, None])
+
+FULFIL_REQUEST = statement("fulfil_request", '''
+    UPDATE requests SET status = 'Fulfilled', donation_id = :1
+    WHERE request_id = :2 AND status = 'Pending'
+''', [NUMBER, NUMBER])
+
+PENDING_REQUESTS = statement("pending_requests", '''
+    SELECT r.request_id, ft.name as food_type, r.quantity, r.request_date,
+           r.status, n.ngo_id, n.name as ngo_name
+    FROM requests r
+    JOIN food_types ft ON r.food_type_id = ft.food_type_id
+    JOIN ngos n ON r.ngo_id = n.ngo_id
+    WHERE r.status = 'Pending'
+    ORDER BY r.request_date
+''', arraysize=500)
+
+NGO_REQUESTS = statement("ngo_requests", '''
+    SELECT r.request_id, ft.name as food_type, r.quantity, r.request_date, r.status
+    FROM requests r
+    JOIN food_types ft ON r.food_type_id = ft.food_type_id
+    WHERE r.ngo_id = :1
+    ORDER BY r.request_date DESC
+''', [NUMBER], arraysize=500)
+
+# Search; only the page of hits is joined back to the base tables
+SEARCH_REQUESTS = statement("search_requests", '''
+    WITH hits AS (
+        SELECT entity_id, SCORE(1) AS score
+        FROM search_documents
+        WHERE CONTAINS(body, :query, 1) > 0 AND doc_type = 'request'
+        ORDER BY SCORE(1) DESC, entity_id
+        OFFSET :offset ROWS FETCH NEXT :limit ROWS ONLY
+    )
+    SELECT r.request_id, ft.name as food_type, r.quantity, r.request_date,
+           r.status, n.ngo_id, n.name as ngo_name, h.score
+    FROM hits h
+    JOIN requests r ON r.request_id = h.entity_id
+    JOIN food_types ft ON r.food_type_id = ft.food_type_id
+    JOIN ngos n ON r.ngo_id = n.ngo_id
+    ORDER BY h.score DESC, h.entity_id
+''', {"query": 1000, "offset": NUMBER, "limit": NUMBER}, arraysize=100)
+
+SEARCH_DONATIONS = statement("search_donations", '''
+    WITH hits AS (
+        SELECT entity_id, SCORE(1) AS score
+        FROM search_documents
+        WHERE CONTAINS(body, :query, 1) > 0 AND doc_type = 'donation'
+          AND expires_on >= TRUNC(SYSDATE)
+        ORDER BY SCORE(1) DESC, entity_id
+        OFFSET :offset ROWS FETCH NEXT :limit ROWS ONLY
+    )
+    SELECT fd.donation_id, ft.name as food_type, fd.quantity, fd.expiry_date, fd.donation_date,
+           d.name as donor_name, d.city as donor_city, h.score
+    FROM hits h
+    JOIN food_donations fd ON fd.donation_id = h.entity_id
+    JOIN food_types ft ON fd.food_type_id = ft.food_type_id
+    JOIN donors d ON fd.donor_id = d.donor_id
+    ORDER BY h.score DESC, h.entity_id
+''', {"query": 1000, "offset": NUMBER, "limit": NUMBER}, arraysize=100)
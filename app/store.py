@@ -0,0 +1,217 @@
+import datetime
+import decimal
+import json
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+SESSION_STORE = os.getenv("SESSION_STORE", "memory")
+SESSION_STORE_PATH = os.getenv("SESSION_STORE_PATH", "session_store.db")
+# MemoryStore drops expired entries every this many writes, so keys that are
+# written once and never read again don't pile up
+MEMORY_STORE_PURGE_EVERY = int(os.getenv("MEMORY_STORE_PURGE_EVERY", "1000"))
+
+
+# Values shared between processes are stored as JSON rather than pickled, so
+# whoever can write the store file can't make another process run code.
+# Query rows need tuples, dates and decimals, which are tagged to survive
+def _encode(value):
+    if isinstance(value, tuple):
+        return {"__tuple__": [_encode(item) for item in value]}
+    if isinstance(value, list):
+        return [_encode(item) for item in value]
+    if isinstance(value, dict):
+        return {key: _encode(item) for key, item in value.items()}
+    if isinstance(value, datetime.datetime):
+        return {"__datetime__": value.isoformat()}
+    if isinstance(value, datetime.date):
+        return {"__date__": value.isoformat()}
+    if isinstance(value, decimal.Decimal):
+        return {"__decimal__": str(value)}
+    return value
+
+def _decode(obj):
+    if "__tuple__" in obj:
+        return tuple(obj["__tuple__"])
+    if "__datetime__" in obj:
+        return datetime.datetime.fromisoformat(obj["__datetime__"])
+    if "__date__" in obj:
+        return datetime.date.fromisoformat(obj["__date__"])
+    if "__decimal__" in obj:
+        return decimal.Decimal(obj["__decimal__"])
+    return obj
+
+def dumps(value):
+    return json.dumps(_encode(value), separators=(",", ":"))
+
+def loads(text):
+    return json.loads(text, object_hook=_decode)
+
+
+# Process-local store; the default when only one app.py process is running
+class MemoryStore:
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+        self._writes = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            value, expires_at = item
+            if expires_at is not None and expires_at < time.time():
+                del self._data[key]
+                return default
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.time() + ttl if ttl else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._writes += 1
+            if self._writes % MEMORY_STORE_PURGE_EVERY == 0:
+                self._purge_expired()
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def delete_prefix(self, prefix):
+        with self._lock:
+            for key in [k for k in self._data if k.startswith(prefix)]:
+                del self._data[key]
+
+    def purge_expired(self):
+        with self._lock:
+            self._purge_expired()
+
+    def _purge_expired(self):
+        now = time.time()
+        expired = [key for key, (_, expires_at) in self._data.items()
+                   if expires_at is not None and expires_at < now]
+        for key in expired:
+            del self._data[key]
+
+
+# File-backed store shared by every process on the host that points at the
+# same SQLite file, so replicas can serve each other's sessions and cache hits
+class SQLiteStore:
+    def __init__(self, path=SESSION_STORE_PATH):
+        self.path = path
+        self._local = threading.local()
+        conn = self._connection()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS kv ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL)"
+        )
+        conn.commit()
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key, default=None):
+        row = self._connection().execute(
+            "SELECT value, expires_at FROM kv WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return default
+        value, expires_at = row
+        if expires_at is not None and expires_at < time.time():
+            self.delete(key)
+            return default
+        try:
+            return loads(value)
+        except (TypeError, ValueError):
+            # Left by an older version that pickled its values
+            self.delete(key)
+            return default
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.time() + ttl if ttl else None
+        self._connection().execute(
+            "INSERT OR REPLACE INTO kv (key, value, expires_at) VALUES (?, ?, ?)",
+            (key, dumps(value), expires_at)
+        )
+
+    def delete(self, key):
+        self._connection().execute("DELETE FROM kv WHERE key = ?", (key,))
+
+    def delete_prefix(self, prefix):
+        self._connection().execute(
+            "DELETE FROM kv WHERE substr(key, 1, ?) = ?", (len(prefix), prefix)
+        )
+
+    def purge_expired(self):
+        self._connection().execute(
+            "DELETE FROM kv WHERE expires_at IS NOT NULL AND expires_at < ?", (time.time(),)
+        )
+
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_store():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                if SESSION_STORE == "sqlite":
+                    _store = SQLiteStore()
+                    _store.purge_expired()
+                elif SESSION_STORE == "memory":
+                    _store = MemoryStore()
+                else:
+                    raise ValueError(f"Unknown SESSION_STORE: {SESSION_STORE}")
+    return _store
+
+
+# Size-capped LRU shared by every session in the process; entries are
+# sized by their pickled length, which is close enough for a budget
+class LRUCache:
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[0]
+
+    def set(self, key, value):
+        size = len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            if key in self._data:
+                self.current_bytes -= self._data.pop(key)[1]
+            self._data[key] = (value, size)
+            self.current_bytes += size
+
+            while self.current_bytes > self.max_bytes:
+                _, (_, evicted_size) = self._data.popitem(last=False)
+                self.current_bytes -= evicted_size
+
+    def __len__(self):
+        return len(self._data)
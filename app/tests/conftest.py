@@ -0,0 +1,94 @@
+import contextlib
+import os
+import sys
+
+import pytest
+
+# The app's modules import each other as top-level modules, as they do when
+# Streamlit runs app.py from this directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import events
+import shards
+import store
+
+
+@pytest.fixture
+def memory_store(monkeypatch):
+    # A fresh shared store, so cached results don't leak between tests
+    fresh = store.MemoryStore()
+    monkeypatch.setattr(store, "_store", fresh)
+    return fresh
+
+
+@pytest.fixture
+def shard_data(monkeypatch, memory_store):
+    # Three shards, each standing in for its own database with a dict of
+    # tables; data functions patched in by a test read current_shard()'s
+    data = {"central": {}, "west": {}, "east": {}}
+    monkeypatch.setattr(shards, "SHARDS", {name: {} for name in data})
+    monkeypatch.setattr(shards, "DEFAULT", "central")
+    return data
+
+
+# change_events and event_checkpoints for EventConsumer; every row is
+# treated as past the visibility lag
+class FakeEventDB:
+    def __init__(self):
+        self.rows = {}
+        self.checkpoints = {}
+
+    def add(self, event_id, event_type="request_created", entity_id=1):
+        self.rows[event_id] = (event_type, "request", entity_id)
+
+    def cursor(self):
+        return FakeEventCursor(self)
+
+    def commit(self):
+        pass
+
+
+class FakeEventCursor:
+    def __init__(self, db):
+        self.db = db
+        self.arraysize = 1
+        self._rows = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def __iter__(self):
+        return iter(self._rows)
+
+    def fetchone(self):
+        return self._rows[0] if self._rows else None
+
+    def execute(self, text, binds):
+        db = self.db
+        if "FROM event_checkpoints" in text:
+            consumer = binds[0]
+            self._rows = [(db.checkpoints[consumer],)] if consumer in db.checkpoints else []
+            return
+        if "MERGE INTO event_checkpoints" in text:
+            consumer, event_id = binds
+            db.checkpoints[consumer] = max(db.checkpoints.get(consumer, 0), event_id)
+            return
+
+        types = {value for name, value in binds.items() if name.startswith("type_")}
+        ids = [i for i in sorted(db.rows) if not types or db.rows[i][0] in types]
+        if text.startswith("SELECT event_id FROM"):
+            self._rows = [(i,) for i in ids if binds["low"] < i <= binds["read"]]
+            return
+        late = {value for name, value in binds.items() if name.startswith("late_")}
+        ids = [i for i in ids if i > binds["read"] or i in late][:binds["batch_size"]]
+        self._rows = [(i,) + db.rows[i] + (None, None) for i in ids]
+
+
+@pytest.fixture
+def event_db(monkeypatch):
+    db = FakeEventDB()
+    monkeypatch.setattr(events, "get_connection", contextlib.contextmanager(lambda: (yield db)))
+    return db
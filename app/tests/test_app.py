@@ -0,0 +1,75 @@
+import datetime
+import os
+
+import pytest
+from streamlit.testing.v1 import AppTest
+
+import db
+import geo
+
+APP = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app.py")
+
+
+@pytest.fixture
+def pending(monkeypatch):
+    # Oldest first, as the database returns them; the second NGO is nearer
+    rows = [
+        {"request_id": 1, "food_type": "Rice", "quantity": 5.0, "request_date": datetime.date(2025, 1, 1),
+         "status": "Pending", "ngo_id": 11, "ngo_name": "Pokhara Kitchen"},
+        {"request_id": 2, "food_type": "Dal", "quantity": 3.0, "request_date": datetime.date(2025, 1, 2),
+         "status": "Pending", "ngo_id": 10, "ngo_name": "Thamel Shelter"},
+    ]
+    donor = {"name": "Donor", "email": "d@example.org", "phone": "1", "street": "Thamel",
+             "city": "Kathmandu", "latitude": 27.70, "longitude": 85.31}
+    for name, value in {
+        "warm_up": lambda wait=True: None,
+        "get_donor_info": lambda donor_id: donor,
+        "get_donor_donations": lambda donor_id: [],
+        "get_all_ngos": lambda: [(10, "Thamel Shelter"), (11, "Pokhara Kitchen")],
+        "get_all_pending_requests": lambda: rows,
+        "get_proximity_index": lambda: geo.ProximityIndex([(10, 27.71, 85.31), (11, 28.21, 83.98)]),
+        "get_nearest_ngos": lambda *args, **kwargs: [],
+        "get_donation_statistics": lambda: [],
+        "get_top_donors": lambda: [],
+        "get_expected_shortfalls": lambda *args: [],
+    }.items():
+        monkeypatch.setattr(db, name, value)
+    return rows
+
+
+def donor_dashboard():
+    at = AppTest.from_file(APP, default_timeout=30)
+    at.session_state.authenticated = True
+    at.session_state.user_type = "Donor"
+    at.session_state.entity_id = 1
+    at.session_state.user_id = 1
+    at.session_state.shard = "default"
+    return at
+
+
+def test_sorting_by_distance_leaves_the_shared_rows_alone(pending):
+    at = donor_dashboard().run()
+    assert not at.exception
+    assert at.session_state.pending_grid_ids == [1, 2]
+
+    at.radio(key="pending_sort").set_value("Distance").run()
+    assert not at.exception
+    assert at.session_state.pending_grid_ids == [2, 1]
+    # The cached list other sessions read is neither annotated nor reordered
+    assert [row["request_id"] for row in pending] == [1, 2]
+    assert all("distance_km" not in row for row in pending)
+
+
+def test_resorting_clears_the_selected_request(pending):
+    at = donor_dashboard().run()
+    at.session_state.pending_selected_id = 1
+    at.radio(key="pending_sort").set_value("Distance").run()
+    assert at.session_state.pending_selected_id is None
+    assert "Select a request to donate towards it." in [caption.value for caption in at.caption]
+
+
+def test_unavailable_profile_shows_a_message(pending, monkeypatch):
+    monkeypatch.setattr(db, "get_donor_info", lambda donor_id: None)
+    at = donor_dashboard().run()
+    assert not at.exception
+    assert "Your profile is temporarily unavailable. Please try again in a moment." in [error.value for error in at.error]
@@ -0,0 +1,100 @@
+from collections import defaultdict
+
+import numpy as np
+import pytest
+
+from columnar import ColumnStore, Dictionary, ROW_BYTES, from_day, month_of, to_days
+
+
+def make_rows(n, seed=11):
+    rng = np.random.default_rng(seed)
+    return {
+        "donation_ids": np.arange(1, n + 1),
+        "food_type_ids": rng.choice([3, 17, 400], n),
+        "donor_ids": rng.integers(1000, 1050, n),
+        "ngo_ids": np.where(rng.random(n) < 0.3, 0, rng.integers(1, 8, n)),
+        "days": np.sort(rng.integers(19000, 19200, n)),
+        "quantities": rng.integers(1, 40, n).astype(np.float32),
+    }
+
+
+def take(rows, index):
+    return [rows[name][index] for name in ("donation_ids", "food_type_ids", "donor_ids", "ngo_ids", "days", "quantities")]
+
+
+def test_dictionary_encodes_densely():
+    dictionary = Dictionary()
+    assert dictionary.encode([900, 5, 900]).tolist() == [1, 0, 1]
+    assert dictionary.encode([7, 5]).tolist() == [2, 0]
+    assert dictionary.decode(np.array([0, 1, 2])).tolist() == [5, 900, 7]
+
+
+def test_aggregates_match_brute_force():
+    rows = make_rows(2000)
+    store = ColumnStore(max_bytes=10 ** 7)
+    # Appended out of order and with repeats, as late commits and
+    # overlapping refreshes deliver them
+    order = np.random.default_rng(1).permutation(2000)
+    for chunk in np.array_split(order, 7):
+        store.append(*take(rows, chunk))
+    assert store.append(*take(rows, order[:100])) == 0
+    assert store.size == 2000
+    assert (np.diff(store["donation_id"]) > 0).all()
+
+    by_food = defaultdict(lambda: [0, 0.0])
+    by_ngo = defaultdict(lambda: [0, 0.0])
+    by_donor = defaultdict(lambda: [0, 0.0])
+    by_month = defaultdict(lambda: [0, 0.0, set()])
+    for _, food, donor, ngo, day, quantity in zip(*take(rows, slice(None))):
+        for group, key in ((by_food, food), (by_donor, donor)):
+            group[key][0] += 1
+            group[key][1] += quantity
+        if ngo:
+            by_ngo[ngo][0] += 1
+            by_ngo[ngo][1] += quantity
+        month = int(month_of(np.array([day]))[0])
+        by_month[month][0] += 1
+        by_month[month][1] += quantity
+        by_month[month][2].add(donor)
+
+    ids, counts, totals, _, _ = store.by_food_type()
+    assert {i: (c, pytest.approx(t)) for i, c, t in zip(ids.tolist(), counts.tolist(), totals.tolist())} == \
+        {k: (c, pytest.approx(t)) for k, (c, t) in by_food.items()}
+
+    ids, counts, totals = store.by_ngo()
+    assert {i: (c, pytest.approx(t)) for i, c, t in zip(ids.tolist(), counts.tolist(), totals.tolist())} == \
+        {k: (c, pytest.approx(t)) for k, (c, t) in by_ngo.items()}
+
+    months, counts, totals, donors = store.by_month(19000)
+    assert {m: (c, d) for m, c, d in zip(months.tolist(), counts.tolist(), donors.tolist())} == \
+        {k: (c, len(d)) for k, (c, _, d) in by_month.items()}
+
+    ids, counts, totals = store.top_donors(5)
+    expected = sorted(by_donor.items(), key=lambda item: -item[1][1])[:5]
+    assert totals.tolist() == pytest.approx([t for _, (_, t) in expected])
+
+
+def test_assign_updates_ngo():
+    rows = make_rows(10)
+    store = ColumnStore(max_bytes=10 ** 6)
+    store.append(*take(rows, slice(None)))
+    assert store.assign([3, 999], [42, 43]) == 1
+    assert store.ngos.decode(store["ngo"][2:3]).tolist() == [42]
+
+
+def test_eviction_keeps_whole_recent_days():
+    rows = make_rows(1000)
+    store = ColumnStore(max_bytes=500 * ROW_BYTES)
+    store.append(*take(rows, slice(None)))
+    assert 0 < store.size <= 500
+    assert store["day"].min() == store.since
+    # Every donation from the first kept day on is held
+    assert store.size == int((rows["days"] >= store.since).sum())
+    # Donations older than the evicted days are not taken back in
+    assert store.append(*take(rows, slice(0, 10))) == 0
+
+
+def test_day_conversions():
+    days = to_days(["2025-01-31", "2025-02-01"])
+    assert str(from_day(days[0])) == "2025-01-31"
+    assert month_of(days).tolist() == [660, 661]
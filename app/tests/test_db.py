@@ -0,0 +1,172 @@
+import contextlib
+from concurrent.futures import Future
+
+import oracledb
+import pytest
+
+import db
+import sql
+
+
+class FakeVar:
+    def __init__(self, value=None):
+        self.value = value
+
+    def getvalue(self):
+        return [self.value]
+
+
+# Cursor over a dict of food types and aliases, enough for the food type
+# and fulfilment statements; `rowcounts` sets what an UPDATE reports and
+# `hidden_names` clash on insert without being found by name
+class FakeCursor:
+    def __init__(self, names=None, aliases=None, rowcounts=None, hidden_names=()):
+        self.names = dict(names or {})
+        self.hidden_names = set(hidden_names)
+        self.aliases = dict(aliases or {})
+        self.rowcounts = rowcounts or {}
+        self.executed = []
+        self.rowcount = 0
+        self._row = None
+        self._next_id = 100
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def setinputsizes(self, *args, **kwargs):
+        pass
+
+    def var(self, *args, **kwargs):
+        return FakeVar()
+
+    def fetchone(self):
+        return self._row
+
+    def execute(self, text, params=None):
+        self.executed.append(text)
+        self._row = None
+        self.rowcount = 0
+        if text is sql.FOOD_TYPE_BY_ALIAS.text:
+            self._row = (self.aliases[params[0]],) if params[0] in self.aliases else None
+        elif text is sql.FOOD_TYPE_BY_NAME.text:
+            self._row = (self.names[params[0]],) if params[0] in self.names else None
+        elif text is sql.INSERT_FOOD_TYPE_ALIAS.text:
+            if params[0] in self.aliases:
+                raise oracledb.IntegrityError("ORA-00001: unique constraint violated")
+            self.aliases[params[0]] = params[1]
+            self.rowcount = 1
+        elif "INSERT INTO food_types" in text:
+            name, out = params
+            if name in self.names or name in self.hidden_names:
+                raise oracledb.IntegrityError("ORA-00001: unique constraint violated")
+            self._next_id += 1
+            self.names[name] = out.value = self._next_id
+            self.rowcount = 1
+        else:
+            for statement, rowcount in self.rowcounts.items():
+                if text is statement.text:
+                    self.rowcount = rowcount
+
+
+class FakeConnection:
+    def __init__(self, cursor):
+        self._cursor = cursor
+        self.committed = self.rolled_back = False
+
+    def cursor(self):
+        return self._cursor
+
+    def commit(self):
+        self.committed = True
+
+    def rollback(self):
+        self.rolled_back = True
+
+
+@pytest.fixture(autouse=True)
+def food_type_ids(monkeypatch):
+    monkeypatch.setattr(db, "_food_type_ids", {})
+
+
+def test_food_type_id_registers_a_new_type():
+    cursor = FakeCursor()
+    food_type_id = db.get_food_type_id(cursor, "  brown   RICE ")
+    assert cursor.names == {"Brown Rice": food_type_id}
+    assert cursor.aliases == {"brown rice": food_type_id}
+    # Only an id read back from the alias table is cached
+    assert db.get_food_type_id(cursor, "Brown Rice") == food_type_id
+    cursor.executed.clear()
+    assert db.get_food_type_id(cursor, "brown rice") == food_type_id
+    assert cursor.executed == []
+
+
+def test_food_type_id_aliases_a_new_spelling_of_a_known_name():
+    # "RICE" has no alias yet, but its title-cased name already exists
+    cursor = FakeCursor(names={"Rice": 7}, aliases={"white rice": 7})
+    assert db.get_food_type_id(cursor, "RICE") == 7
+    assert cursor.aliases["rice"] == 7
+
+
+def test_food_type_id_reraises_when_nothing_matches():
+    # A name clash neither the alias nor the name lookup can explain
+    cursor = FakeCursor(hidden_names={"Rice"})
+    with pytest.raises(oracledb.IntegrityError):
+        db.get_food_type_id(cursor, "rice")
+
+
+def test_submit_write_reports_a_slow_commit_as_pending(monkeypatch):
+    queued = Future()
+
+    class Queue:
+        def submit(self, item):
+            return queued
+
+    monkeypatch.setattr(db, "get_write_queue", lambda name: Queue())
+    monkeypatch.setattr(db, "WRITE_BEHIND_TIMEOUT", 0.01)
+    assert db.submit_write("create_donation", ("row",)) == db.WRITE_PENDING
+
+    failed = Future()
+    failed.set_exception(oracledb.DatabaseError("ORA-03113"))
+    queued = failed
+    assert db.submit_write("create_donation", ("row",)) is None
+
+
+def test_fulfil_only_touches_pending_requests():
+    assert "status = 'Pending'" in sql.FULFIL_REQUEST.text
+
+
+def test_donation_for_a_request_no_longer_pending_rolls_back(monkeypatch):
+    cursor = FakeCursor(names={"Rice": 7}, aliases={"rice": 7}, rowcounts={sql.FULFIL_REQUEST: 0})
+    conn = FakeConnection(cursor)
+    monkeypatch.setattr(db, "get_connection", contextlib.contextmanager(lambda: (yield conn)))
+    monkeypatch.setattr(db, "record_events", lambda *args: pytest.fail("event recorded"))
+
+    assert db.create_donation_for_request(1, "Rice", None, None, 5.0, 2, 3) is None
+    assert conn.rolled_back and not conn.committed
+
+
+def test_stale_copy_is_refreshed_at_most_once_per_interval(monkeypatch, memory_store):
+    monkeypatch.setattr(db, "_stale_saved", {})
+    monkeypatch.setattr(db, "STALE_REFRESH_INTERVAL", 60)
+    results = iter([(["first"], True), (["second"], True), ([], False)])
+    monkeypatch.setattr(db, "_call_with_retries", lambda func, args: next(results))
+    writes = []
+    set_value = memory_store.set
+    monkeypatch.setattr(memory_store, "set", lambda key, *rest: (writes.append(key), set_value(key, *rest)))
+
+    assert db._read_through("view", None, ())[:2] == (["first"], True)
+    assert db._read_through("view", None, ())[:2] == (["second"], True)
+    assert writes == ["stale:view"]
+
+    # A failed read is served the copy saved earlier
+    result, fresh, saved_at = db._read_through("view", None, ())
+    assert (result, fresh) == (["first"], False) and saved_at is not None
+
+
+def test_paged_and_search_reads_keep_no_stale_copies():
+    for func in (db.get_available_donations, db.search_pending_requests, db.search_available_donations):
+        assert not hasattr(func, "__wrapped__")
+    assert hasattr(db.get_all_pending_requests, "__wrapped__")
@@ -0,0 +1,96 @@
+import threading
+
+import pytest
+
+import events
+from events import EventConsumer
+
+
+def ids(batch):
+    return [event.event_id for event in batch]
+
+
+def test_poll_pages_forward_without_a_commit(event_db):
+    for event_id in range(1, 6):
+        event_db.add(event_id)
+    consumer = EventConsumer("test", batch_size=2)
+    assert [ids(consumer.poll()) for _ in range(4)] == [[1, 2], [3, 4], [5], []]
+    assert "test" not in event_db.checkpoints
+
+
+def test_commit_moves_the_checkpoint(event_db):
+    for event_id in range(1, 4):
+        event_db.add(event_id)
+    consumer = EventConsumer("test")
+    assert consumer.commit(consumer.poll()[-1].event_id)
+    assert event_db.checkpoints["test"] == 3
+
+    event_db.add(4)
+    assert ids(EventConsumer("test").poll()) == [4]
+
+
+def test_late_commit_below_the_read_position_is_delivered_once(event_db):
+    for event_id in (1, 2, 4):
+        event_db.add(event_id)
+    consumer = EventConsumer("test")
+    assert ids(consumer.poll()) == [1, 2, 4]
+    consumer.commit(4)
+
+    # Event 3 took its id before 4 but committed after it was read
+    event_db.add(3)
+    event_db.add(5)
+    assert ids(consumer.poll()) == [3, 5]
+    assert consumer.poll() == []
+
+
+def test_late_events_beyond_the_overlap_are_missed(event_db, monkeypatch):
+    monkeypatch.setattr(events, "EVENT_OVERLAP", 2)
+    for event_id in (1, 2, 3, 4, 5):
+        event_db.add(event_id)
+    del event_db.rows[2]
+    consumer = EventConsumer("test")
+    consumer.poll()
+    event_db.add(2)
+    assert consumer.poll() == []
+
+
+def test_rewind_hands_uncommitted_events_out_again(event_db):
+    for event_id in range(1, 5):
+        event_db.add(event_id)
+    consumer = EventConsumer("test", batch_size=2)
+    consumer.commit(consumer.poll()[-1].event_id)
+    assert ids(consumer.poll()) == [3, 4]
+    consumer.rewind()
+    assert ids(consumer.poll()) == [3, 4]
+
+
+def test_run_rewinds_when_the_handler_fails(event_db):
+    for event_id in range(1, 4):
+        event_db.add(event_id)
+    consumer = EventConsumer("test")
+
+    def handler(batch):
+        raise RuntimeError("handler failed")
+
+    with pytest.raises(RuntimeError):
+        consumer.run(handler)
+    assert "test" not in event_db.checkpoints
+
+    stop = threading.Event()
+    handled = []
+
+    def handler(batch):
+        handled.extend(ids(batch))
+        stop.set()
+
+    consumer.run(handler, stop=stop)
+    assert handled == [1, 2, 3]
+    assert event_db.checkpoints["test"] == 3
+
+
+def test_event_types_filter(event_db):
+    event_db.add(1, "request_created")
+    event_db.add(2, "donation_created")
+    event_db.add(3, "request_fulfilled")
+    consumer = EventConsumer("test", event_types=["request_created", "request_fulfilled"])
+    assert ids(consumer.poll()) == [1, 3]
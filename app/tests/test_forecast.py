@@ -0,0 +1,49 @@
+import datetime
+
+import numpy as np
+import pytest
+
+import forecast
+
+
+def smooth(level, observations, alpha):
+    # One week at a time, the way fold() is defined
+    for x in observations:
+        level = alpha * x + (1 - alpha) * level
+    return level
+
+
+def test_fold_matches_week_by_week_smoothing():
+    rng = np.random.default_rng(5)
+    shape, n_weeks, alpha = (3, 4), 6, 0.3
+    levels = rng.uniform(0, 10, shape)
+    weekly = np.zeros(shape + (n_weeks,))
+    cells, weeks, quantities = [], [], []
+    for cell in range(levels.size):
+        for week in rng.choice(n_weeks, size=3, replace=False):
+            quantity = float(rng.uniform(1, 20))
+            weekly.reshape(levels.size, n_weeks)[cell, week] = quantity
+            cells.append(cell)
+            weeks.append(week)
+            quantities.append(quantity)
+
+    folded = forecast.fold(levels, np.array(cells), np.array(weeks), np.array(quantities), n_weeks, alpha)
+
+    expected = np.array([smooth(level, obs, alpha) for level, obs in
+                         zip(levels.ravel(), weekly.reshape(levels.size, n_weeks))]).reshape(shape)
+    assert folded == pytest.approx(expected)
+
+
+def test_fold_in_two_runs_equals_one():
+    levels = np.zeros((1, 2))
+    cells, weeks, quantities = np.array([0, 1, 0, 1]), np.array([0, 1, 2, 3]), np.array([4.0, 2.0, 6.0, 8.0])
+    once = forecast.fold(levels, cells, weeks, quantities, 4)
+    first = forecast.fold(levels, cells[:2], weeks[:2], quantities[:2], 2)
+    twice = forecast.fold(first, cells[2:], weeks[2:] - 2, quantities[2:], 2)
+    assert twice == pytest.approx(once)
+
+
+def test_week_numbers_start_on_mondays():
+    monday = datetime.date(2025, 1, 6)
+    assert forecast.week_number(monday) == forecast.week_number(monday + datetime.timedelta(days=6))
+    assert forecast.week_start(forecast.week_number(monday + datetime.timedelta(days=3))) == monday
@@ -0,0 +1,59 @@
+import random
+
+import pytest
+
+import geo
+
+
+@pytest.fixture
+def gazetteer(monkeypatch):
+    places = {
+        ("", "kathmandu"): (27.70, 85.32),
+        ("thamel", "kathmandu"): (27.71, 85.31),
+        ("new baneshwor", "kathmandu"): (27.69, 85.34),
+        ("baneshwor", "kathmandu"): (27.68, 85.33),
+        ("thamel", "pokhara"): (28.20, 83.98),
+    }
+    monkeypatch.setattr(geo, "_gazetteer", places)
+    return places
+
+
+def test_geocode_matches_locality_words(gazetteer):
+    assert geo.geocode("Thamel-3, Chaksibari Marg", "Kathmandu") == (27.71, 85.31)
+    # Same name in another city doesn't count
+    assert geo.geocode("Lakeside", "Pokhara") == (None, None)
+
+
+def test_geocode_ignores_locality_inside_a_longer_word(gazetteer):
+    # Falls back to the city centroid rather than Thamel
+    assert geo.geocode("Thamelgunj Marg", "Kathmandu") == (27.70, 85.32)
+
+
+def test_geocode_prefers_the_longest_locality(gazetteer):
+    assert geo.geocode("Shantinagar, New Baneshwor", "kathmandu ") == (27.69, 85.34)
+    assert geo.geocode("Old Baneshwor", "Kathmandu") == (27.68, 85.33)
+
+
+def test_geocode_unknown_city(gazetteer):
+    assert geo.geocode("Thamel", "Biratnagar") == (None, None)
+
+
+def test_nearest_matches_brute_force():
+    rng = random.Random(7)
+    points = [(i, rng.uniform(26.5, 30.0), rng.uniform(80.0, 88.0)) for i in range(500)]
+    index = geo.ProximityIndex(points)
+    for _ in range(50):
+        lat, lon = rng.uniform(26.0, 30.5), rng.uniform(79.5, 88.5)
+        expected = sorted((geo.haversine_km(lat, lon, plat, plon), key) for key, plat, plon in points)
+        assert [key for key, _ in index.nearest(lat, lon, k=5)] == [key for _, key in expected[:5]]
+        within = [key for dist, key in expected if dist <= 40][:5]
+        assert [key for key, _ in index.nearest(lat, lon, k=5, max_km=40)] == within
+
+
+def test_nearest_and_distance_without_a_location():
+    index = geo.ProximityIndex([(1, 27.7, 85.3)])
+    assert index.nearest(None, None) == []
+    assert index.distance_to(1, None, None) is None
+    assert index.distance_to(2, 27.7, 85.3) is None
+    assert index.distance_to(1, 27.7, 85.3) == pytest.approx(0.0)
+    assert geo.ProximityIndex([]).nearest(27.7, 85.3) == []
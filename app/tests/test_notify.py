@@ -0,0 +1,143 @@
+import smtplib
+from email.message import EmailMessage
+
+import oracledb
+import pytest
+
+import notify
+from notify import NotificationDispatcher, SMTPPool
+
+
+class FakeSMTP:
+    def __init__(self, error=None):
+        self.error = error
+        self.sent = []
+        self.closed = False
+
+    def send_message(self, message):
+        if self.error:
+            raise self.error
+        self.sent.append(message)
+
+    def quit(self):
+        self.closed = True
+
+
+def pool_with(monkeypatch, *connections):
+    pool = SMTPPool(size=1)
+    fresh = list(connections)
+    monkeypatch.setattr(pool, "_connect", lambda: fresh.pop(0))
+    return pool
+
+
+def message():
+    message = EmailMessage()
+    message["To"] = "donor@example.org"
+    return message
+
+
+def test_pool_reuses_connections(monkeypatch):
+    smtp = FakeSMTP()
+    pool = pool_with(monkeypatch, smtp)
+    pool.send(message())
+    pool.send(message())
+    assert len(smtp.sent) == 2
+    pool.close()
+    assert smtp.closed
+
+
+def test_pool_reconnects_once_after_a_server_disconnect(monkeypatch):
+    stale, fresh = FakeSMTP(smtplib.SMTPServerDisconnected()), FakeSMTP()
+    pool = pool_with(monkeypatch, fresh)
+    pool._idle.put(stale)
+    pool.send(message())
+    assert len(fresh.sent) == 1
+    assert pool._idle.get_nowait() is fresh
+
+
+def test_pool_discards_a_reconnect_that_fails(monkeypatch):
+    stale, fresh = FakeSMTP(smtplib.SMTPServerDisconnected()), FakeSMTP(smtplib.SMTPDataError(451, "try later"))
+    pool = pool_with(monkeypatch, fresh)
+    pool._idle.put(stale)
+    with pytest.raises(smtplib.SMTPDataError):
+        pool.send(message())
+    assert fresh.closed
+    assert pool._idle.empty()
+
+
+@pytest.fixture
+def dispatcher(monkeypatch, event_db):
+    dispatcher = NotificationDispatcher(pool=SMTPPool(size=1), rate=1000)
+    dispatched = []
+    monkeypatch.setattr(dispatcher, "dispatch", lambda batch: dispatched.append([e.event_id for e in batch]))
+    dispatcher.dispatched = dispatched
+    return dispatcher
+
+
+def test_run_once_drains_the_backlog_and_returns(dispatcher, event_db):
+    dispatcher.consumer.batch_size = 2
+    for event_id in range(1, 6):
+        event_db.add(event_id)
+    assert dispatcher.run_once() == 5
+    assert dispatcher.dispatched == [[1, 2, 3, 4, 5]]
+    assert event_db.checkpoints["notifications"] == 5
+    assert dispatcher.run_once() == 0
+
+
+def test_run_once_stops_at_the_event_cap(dispatcher, event_db, monkeypatch):
+    monkeypatch.setattr(notify, "NOTIFY_MAX_EVENTS", 4)
+    dispatcher.consumer.batch_size = 2
+    for event_id in range(1, 8):
+        event_db.add(event_id)
+    assert dispatcher.run_once() == 4
+    assert dispatcher.run_once() == 3
+    assert dispatcher.dispatched == [[1, 2, 3, 4], [5, 6, 7]]
+
+
+def test_failed_flush_leaves_events_for_the_next_run(dispatcher, event_db, monkeypatch):
+    for event_id in range(1, 3):
+        event_db.add(event_id)
+
+    def fail(batch):
+        raise oracledb.DatabaseError("ORA-03113")
+
+    monkeypatch.setattr(dispatcher, "dispatch", fail)
+    assert dispatcher.run_once() == 2
+    assert "notifications" not in event_db.checkpoints
+
+    monkeypatch.setattr(dispatcher, "dispatch", lambda batch: dispatcher.dispatched.append([e.event_id for e in batch]))
+    assert dispatcher.run_once() == 2
+    assert dispatcher.dispatched == [[1, 2]]
+
+
+def test_send_with_retry_gives_up_on_refused_recipients(dispatcher):
+    class RefusingPool:
+        size = 1
+
+        def send(self, message):
+            raise smtplib.SMTPRecipientsRefused({message["To"]: (550, b"no such user")})
+
+    dispatcher.pool = RefusingPool()
+    assert not dispatcher.send_with_retry(message())
+    assert (dispatcher.metrics.failed, dispatcher.metrics.retries) == (1, 0)
+
+
+def test_checkpoint_covers_events_before_a_late_one(dispatcher, event_db):
+    dispatcher.consumer.batch_size = 2
+    for event_id in (1, 2, 4, 5):
+        event_db.add(event_id)
+    poll = dispatcher.consumer.poll
+    polls = []
+
+    def poll_then_commit_late():
+        polls.append(1)
+        if len(polls) == 3:
+            # Event 3 commits while the run is draining, so the last poll
+            # returns it alone
+            event_db.add(3)
+        return poll()
+
+    dispatcher.consumer.poll = poll_then_commit_late
+    assert dispatcher.run_once() == 5
+    assert dispatcher.dispatched == [[1, 2, 4, 5, 3]]
+    assert event_db.checkpoints["notifications"] == 5
@@ -0,0 +1,49 @@
+import hashlib
+import threading
+
+import pytest
+
+from passwords import PasswordHasher, PasswordHasherBusy, is_legacy
+
+
+@pytest.fixture
+def hasher():
+    # Cheap parameters so the suite stays fast
+    return PasswordHasher(n=16, r=1, p=1, workers=2)
+
+
+def test_hash_and_verify(hasher):
+    stored = hasher.hash("correct horse")
+    assert stored.startswith("scrypt$16$1$1$")
+    assert hasher.verify("correct horse", stored) == (True, False)
+    assert hasher.verify("wrong", stored) == (False, False)
+    # Salted, so the same password hashes differently each time
+    assert hasher.hash("correct horse") != stored
+
+
+def test_legacy_and_old_parameters_need_rehash(hasher):
+    legacy = hashlib.sha256(b"secret").hexdigest()
+    assert is_legacy(legacy)
+    assert hasher.verify("secret", legacy) == (True, True)
+    assert hasher.verify("other", legacy) == (False, False)
+
+    older = PasswordHasher(n=8, r=1, p=1, workers=1).hash("secret")
+    assert hasher.verify("secret", older) == (True, True)
+
+
+def test_hash_many(hasher):
+    stored = hasher.hash_many(["a", "b", "c"])
+    assert [hasher.verify(password, s)[0] for password, s in zip("abc", stored)] == [True] * 3
+
+
+def test_busy_when_queue_is_full():
+    hasher = PasswordHasher(n=16, r=1, p=1, workers=1, max_pending=1, queue_wait=0.01)
+    release = threading.Event()
+    blocked = hasher._submit(release.wait, 5)
+    try:
+        with pytest.raises(PasswordHasherBusy):
+            hasher.hash("x")
+    finally:
+        release.set()
+        blocked.result()
+    hasher.burn("x")
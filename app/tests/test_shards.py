@@ -0,0 +1,145 @@
+import datetime
+import json
+
+import pytest
+
+import db
+import shards
+import sketches
+
+
+def serve(monkeypatch, shard_data, name, table):
+    # Points db.<name> at the current shard's copy of `table`
+    monkeypatch.setattr(db, name, lambda: shard_data[shards.current_shard()].get(table, []))
+
+
+def test_load_shard_config_maps_cities(tmp_path):
+    path = tmp_path / "shards.json"
+    path.write_text(json.dumps({
+        "default": "central",
+        "shards": {"central": {}, "west": {}},
+        "cities": {"Kathmandu": "central", "Pokhara": "west"},
+    }))
+    shard_config, cities, default = shards.load_shard_config(str(path))
+    assert set(shard_config) == {"central", "west"}
+    assert cities == {"kathmandu": "central", "pokhara": "west"}
+    assert default == "central"
+
+
+def test_load_shard_config_rejects_unknown_shard(tmp_path):
+    path = tmp_path / "shards.json"
+    path.write_text(json.dumps({"shards": {"central": {}}, "cities": {"Pokhara": "west"}}))
+    with pytest.raises(ValueError):
+        shards.load_shard_config(str(path))
+
+
+def test_scatter_runs_once_per_shard_in_its_context(shard_data):
+    assert shards.scatter(shards.current_shard) == {"central": "central", "west": "west", "east": "east"}
+    # The caller's own shard is untouched
+    assert shards.current_shard() == "central"
+
+
+def test_donation_statistics_merge_across_shards(monkeypatch, shard_data):
+    shard_data["central"]["statistics"] = [
+        {"food_type": "Rice", "total_donations": 2, "total_quantity": 10.0, "avg_quantity": 5.0,
+         "first_donation": "2025-01-01", "last_donation": "2025-02-01"},
+    ]
+    shard_data["west"]["statistics"] = [
+        {"food_type": "Rice", "total_donations": 3, "total_quantity": 20.0, "avg_quantity": 6.7,
+         "first_donation": "2024-12-01", "last_donation": "2025-01-15"},
+        {"food_type": "Dal", "total_donations": 1, "total_quantity": 4.0, "avg_quantity": 4.0,
+         "first_donation": "2025-03-01", "last_donation": "2025-03-01"},
+    ]
+    serve(monkeypatch, shard_data, "get_shard_donation_statistics", "statistics")
+
+    rice, dal = db.get_donation_statistics()
+    assert rice == {"food_type": "Rice", "total_donations": 5, "total_quantity": 30.0, "avg_quantity": 6.0,
+                    "first_donation": "2024-12-01", "last_donation": "2025-02-01"}
+    assert dal["total_quantity"] == 4.0
+    # Shard results are not changed by the merge
+    assert shard_data["central"]["statistics"][0]["total_donations"] == 2
+
+
+def test_top_donors_merge_across_shards(monkeypatch, shard_data):
+    monkeypatch.setattr(db, "TOP_DONORS_LIMIT", 2)
+    shard_data["central"]["top_donors"] = [{"donor_name": "A", "donation_count": 1, "total_donated": 5.0}]
+    shard_data["west"]["top_donors"] = [{"donor_name": "B", "donation_count": 4, "total_donated": 9.0},
+                                        {"donor_name": "C", "donation_count": 1, "total_donated": 1.0}]
+    serve(monkeypatch, shard_data, "get_shard_top_donors", "top_donors")
+
+    assert [row["donor_name"] for row in db.get_top_donors()] == ["B", "A"]
+
+
+def test_donation_trends_merge_across_shards(monkeypatch, shard_data):
+    shard_data["central"]["trends"] = [
+        {"month": "2025-01", "donation_count": 2, "total_quantity": 3.0, "active_donors": 1},
+    ]
+    shard_data["east"]["trends"] = [
+        {"month": "2024-12", "donation_count": 1, "total_quantity": 1.0, "active_donors": 1},
+        {"month": "2025-01", "donation_count": 1, "total_quantity": 2.0, "active_donors": 1},
+    ]
+    serve(monkeypatch, shard_data, "get_shard_donation_trends", "trends")
+
+    assert db.get_donation_trends() == [
+        {"month": "2024-12", "donation_count": 1, "total_quantity": 1.0, "active_donors": 1},
+        {"month": "2025-01", "donation_count": 3, "total_quantity": 5.0, "active_donors": 2},
+    ]
+
+
+def test_ngo_distribution_merge_across_shards(monkeypatch, shard_data):
+    shard_data["central"]["distribution"] = [{"ngo_name": "A", "donations_received": 1, "total_quantity": 2.0}]
+    shard_data["west"]["distribution"] = [{"ngo_name": "B", "donations_received": 3, "total_quantity": 7.0}]
+    serve(monkeypatch, shard_data, "get_shard_ngo_donation_distribution", "distribution")
+
+    assert [row["ngo_name"] for row in db.get_ngo_donation_distribution()] == ["B", "A"]
+
+
+def test_expected_shortfalls_top_n_is_global(monkeypatch, shard_data):
+    # Dal is second in each shard but first overall
+    shard_data["central"]["shortfalls"] = [
+        {"food_type": "Rice", "shortfall": 5.0, "ngos_short": 1, "forecast_week": "2025-01-06"},
+        {"food_type": "Dal", "shortfall": 4.0, "ngos_short": 1, "forecast_week": "2025-01-06"},
+    ]
+    shard_data["west"]["shortfalls"] = [
+        {"food_type": "Oil", "shortfall": 6.0, "ngos_short": 2, "forecast_week": "2025-01-13"},
+        {"food_type": "Dal", "shortfall": 4.0, "ngos_short": 2, "forecast_week": "2025-01-13"},
+    ]
+    serve(monkeypatch, shard_data, "get_shard_expected_shortfalls", "shortfalls")
+
+    assert db.get_expected_shortfalls(limit=1) == [
+        {"food_type": "Dal", "shortfall": 8.0, "ngos_short": 3, "forecast_week": "2025-01-13"},
+    ]
+
+
+def test_approximate_analytics_merge_sketches_across_shards(monkeypatch, shard_data):
+    first, last = datetime.datetime(2025, 1, 1), datetime.datetime(2025, 1, 31)
+    for shard, donors in (("central", range(0, 600)), ("west", range(600, 1000))):
+        quantiles, hll = sketches.QuantileSketch(), sketches.HyperLogLog()
+        quantiles.add([float(donor % 10 + 1) for donor in donors])
+        hll.add(list(donors))
+        shard_data[shard]["food_types"] = [
+            ("Rice", len(donors), float(len(donors)), first, last, sketches.dumps(quantiles)),
+        ]
+        shard_data[shard]["months"] = [("2025-01", len(donors), float(len(donors)), sketches.dumps(hll))]
+    serve(monkeypatch, shard_data, "_load_shard_food_type_sketches", "food_types")
+    serve(monkeypatch, shard_data, "_load_shard_month_sketches", "months")
+
+    (rice,) = db.get_donation_statistics_approx()
+    assert rice["total_donations"] == 1000
+    assert rice["median_quantity"] == pytest.approx(5.5, rel=0.1)
+
+    (month,) = db.get_donation_trends_approx()
+    assert month["donation_count"] == 1000
+    assert month["active_donors"] == pytest.approx(1000, rel=0.05)
+
+
+def test_approximate_analytics_refuse_sketches_that_dont_load(monkeypatch, shard_data):
+    legacy = b"x\x9c" + b"\0" * 20
+    first = datetime.datetime(2025, 1, 1)
+    shard_data["central"]["food_types"] = [("Rice", 1, 1.0, first, first, legacy)]
+    shard_data["central"]["months"] = [("2025-01", 1, 1.0, legacy)]
+    serve(monkeypatch, shard_data, "_load_shard_food_type_sketches", "food_types")
+    serve(monkeypatch, shard_data, "_load_shard_month_sketches", "months")
+
+    assert db.get_donation_statistics_approx() == []
+    assert db.get_donation_trends_approx() == []
@@ -0,0 +1,71 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from singleflight import SingleFlight
+
+
+def test_concurrent_callers_share_one_call():
+    flights = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def load():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return "rows"
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        leader = executor.submit(flights.do, "k", load)
+        started.wait(5)
+        followers = [executor.submit(flights.do, "k", load) for _ in range(3)]
+        release.set()
+        results = [leader.result()] + [f.result() for f in followers]
+
+    assert results == ["rows"] * 4
+    assert len(calls) == 1
+
+
+def test_leader_error_reaches_followers():
+    flights = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+
+    def load():
+        started.set()
+        release.wait(5)
+        raise ValueError("boom")
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        leader = executor.submit(flights.do, "k", load)
+        started.wait(5)
+        follower = executor.submit(flights.do, "k", lambda: "unused")
+        release.set()
+        with pytest.raises(ValueError):
+            leader.result()
+        with pytest.raises(ValueError):
+            follower.result()
+
+
+def test_follower_runs_its_own_call_after_wait_timeout():
+    flights = SingleFlight(wait_timeout=0.01)
+    started, release = threading.Event(), threading.Event()
+
+    def stuck():
+        started.set()
+        release.wait(5)
+        return "late"
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        leader = executor.submit(flights.do, "k", stuck)
+        started.wait(5)
+        assert flights.do("k", lambda: "own") == "own"
+        release.set()
+        assert leader.result() == "late"
+
+
+def test_nothing_is_kept_after_the_call():
+    flights = SingleFlight()
+    assert flights.do("k", lambda: 1) == 1
+    assert flights.do("k", lambda: 2) == 2
@@ -0,0 +1,79 @@
+import pickle
+import zlib
+
+import numpy as np
+import pytest
+
+import sketches
+
+
+def test_hyperloglog_estimate_and_merge():
+    first, second = sketches.HyperLogLog(), sketches.HyperLogLog()
+    first.add(np.arange(0, 60000))
+    second.add(np.arange(40000, 100000))
+    assert first.estimate() == pytest.approx(60000, rel=0.03)
+
+    first.merge(second)
+    assert first.estimate() == pytest.approx(100000, rel=0.03)
+
+
+def test_hyperloglog_small_counts_and_duplicates():
+    hll = sketches.HyperLogLog()
+    hll.add([5, 5, 5, 6, 7])
+    assert hll.estimate() == pytest.approx(3, abs=0.1)
+
+
+def test_quantiles_within_accuracy():
+    values = np.random.default_rng(3).lognormal(1.0, 1.0, 20000)
+    sketch = sketches.QuantileSketch()
+    sketch.add(values)
+    for q in (0.1, 0.5, 0.9, 0.99):
+        assert sketch.quantile(q) == pytest.approx(np.quantile(values, q), rel=0.02)
+
+
+def test_quantiles_merge_and_empty():
+    assert sketches.QuantileSketch().quantile(0.5) is None
+    low, high = sketches.QuantileSketch(), sketches.QuantileSketch()
+    low.add([1.0] * 100)
+    high.add([100.0] * 100)
+    low.merge(high)
+    assert low.quantile(0.25) == pytest.approx(1.0, rel=0.01)
+    assert low.quantile(0.75) == pytest.approx(100.0, rel=0.01)
+
+
+def test_dumps_round_trip():
+    hll = sketches.HyperLogLog()
+    hll.add(np.arange(1000))
+    restored = sketches.loads(sketches.dumps(hll))
+    assert restored.estimate() == hll.estimate()
+
+    quantiles = sketches.QuantileSketch()
+    quantiles.add([1.0, 2.0, 3.0])
+    assert sketches.loads(sketches.dumps(quantiles)).buckets == quantiles.buckets
+
+
+def test_loads_refuses_pickles_and_tampered_sketches():
+    legacy = zlib.compress(pickle.dumps(("quantiles", 0.01, {1: 2})))
+    with pytest.raises(ValueError):
+        sketches.loads(legacy)
+
+    data = sketches.dumps(sketches.HyperLogLog(precision=10))
+    header = sketches._HEADER
+    for bad in (
+        data[:5],
+        b"XX1" + data[3:],
+        header.pack(sketches.MAGIC, b"H", 12) + data[header.size:],
+        header.pack(sketches.MAGIC, b"Z", 10) + data[header.size:],
+        header.pack(sketches.MAGIC, b"Q", 2.0) + zlib.compress(b"\0" * 16),
+        header.pack(sketches.MAGIC, b"H", 10) + zlib.compress(b"\0" * (1 << 21)),
+        data[:header.size] + b"not zlib",
+    ):
+        with pytest.raises(ValueError):
+            sketches.loads(bad)
+
+
+def test_merge_refuses_other_parameters():
+    with pytest.raises(ValueError):
+        sketches.HyperLogLog().merge(sketches.HyperLogLog(precision=10))
+    with pytest.raises(ValueError):
+        sketches.QuantileSketch().merge(sketches.QuantileSketch(accuracy=0.05))
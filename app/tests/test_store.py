@@ -0,0 +1,78 @@
+import datetime
+import decimal
+import sqlite3
+import time
+
+import store
+
+
+def test_json_round_trip_keeps_row_types():
+    value = [
+        (1, "Rice", datetime.date(2025, 1, 2), datetime.datetime(2025, 1, 2, 3, 4, 5), decimal.Decimal("2.50")),
+        {"nested": (None, 1.5, [True])},
+    ]
+    assert store.loads(store.dumps(value)) == value
+
+
+def test_sqlite_store_shares_json_values(tmp_path):
+    path = str(tmp_path / "store.db")
+    writer, reader = store.SQLiteStore(path), store.SQLiteStore(path)
+    writer.set("session:1", {"user_id": 1, "shard": "west"}, ttl=60)
+    assert reader.get("session:1") == {"user_id": 1, "shard": "west"}
+
+    writer.set("expired", 1, ttl=0.001)
+    time.sleep(0.01)
+    assert reader.get("expired") is None
+
+
+def test_sqlite_store_drops_legacy_pickles(tmp_path):
+    path = str(tmp_path / "store.db")
+    sqlite_store = store.SQLiteStore(path)
+    conn = sqlite3.connect(path)
+    conn.execute("INSERT INTO kv (key, value, expires_at) VALUES (?, ?, NULL)",
+                 ("legacy", store.pickle.dumps({"user_id": 1})))
+    conn.commit()
+    conn.close()
+
+    assert sqlite_store.get("legacy") is None
+    assert sqlite_store.get("legacy", "gone") == "gone"
+
+
+def test_lru_evicts_least_recently_used():
+    entry = len(store.pickle.dumps("x" * 100, protocol=store.pickle.HIGHEST_PROTOCOL))
+    cache = store.LRUCache(max_bytes=entry * 2)
+    cache.set("a", "x" * 100)
+    cache.set("b", "x" * 100)
+    assert cache.get("a") == "x" * 100
+    cache.set("c", "x" * 100)
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+    assert cache.current_bytes <= cache.max_bytes
+    assert (cache.hits, cache.misses) == (3, 1)
+
+
+def test_lru_skips_values_over_budget_and_replaces_keys():
+    cache = store.LRUCache(max_bytes=64)
+    cache.set("big", "x" * 1000)
+    assert cache.get("big") is None
+    cache.set("k", 1)
+    cache.set("k", 2)
+    assert cache.get("k") == 2
+    assert len(cache) == 1
+
+
+def test_memory_store_expiry_and_purge(monkeypatch):
+    monkeypatch.setattr(store, "MEMORY_STORE_PURGE_EVERY", 3)
+    memory = store.MemoryStore()
+    memory.set("old", 1, ttl=0.001)
+    time.sleep(0.01)
+    memory.set("a", 2)
+    assert "old" in memory._data
+    memory.set("b", 3)
+    # The third write swept the expired entry
+    assert "old" not in memory._data
+    assert memory.get("a") == 2
+
+    memory.delete_prefix("a")
+    assert memory.get("a", "missing") == "missing"
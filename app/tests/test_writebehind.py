@@ -0,0 +1,49 @@
+import threading
+
+import pytest
+
+from writebehind import QueueFullError, WriteBehindQueue
+
+
+def test_rows_share_batches_and_get_their_own_results():
+    batches = []
+
+    def flush(items):
+        batches.append(list(items))
+        return [item * 10 for item in items]
+
+    queue = WriteBehindQueue("test", flush, batch_size=50, max_wait=0.05)
+    futures = [queue.submit(i) for i in range(20)]
+    assert [future.result(timeout=5) for future in futures] == [i * 10 for i in range(20)]
+    assert sum(len(batch) for batch in batches) == 20
+    assert queue.rows == 20 and queue.batches == len(batches)
+
+
+def test_a_bad_row_fails_alone():
+    release = threading.Event()
+
+    def flush(items):
+        release.wait(5)
+        if "bad" in items:
+            raise ValueError("bad row")
+        return [item.upper() for item in items]
+
+    queue = WriteBehindQueue("test", flush, batch_size=10, max_wait=0.05)
+    futures = [queue.submit(item) for item in ("a", "bad", "c")]
+    release.set()
+    assert futures[0].result(timeout=5) == "A"
+    assert futures[2].result(timeout=5) == "C"
+    with pytest.raises(ValueError):
+        futures[1].result(timeout=5)
+
+
+def test_submit_gives_up_while_the_queue_is_full():
+    release = threading.Event()
+    queue = WriteBehindQueue("test", lambda items: (release.wait(5), list(items))[1], max_size=1, batch_size=1)
+    try:
+        queue.submit(1)
+        with pytest.raises(QueueFullError):
+            for _ in range(3):
+                queue.submit(2, timeout=0.01)
+    finally:
+        release.set()
@@ -0,0 +1,74 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class QueueFullError(Exception):
+    pass
+
+
+# Bounded in-process queue drained by one background worker that hands
+# whole batches to flush_batch(items) -> [result, ...], so a burst of
+# inserts shares one round trip and one commit
+class WriteBehindQueue:
+    def __init__(self, name, flush_batch, max_size=1000, batch_size=100, max_wait=0.005):
+        self.name = name
+        self.flush_batch = flush_batch
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        self._queue = queue.Queue(maxsize=max_size)
+        self.batches = 0
+        self.rows = 0
+
+        self._worker = threading.Thread(target=self._run, name=f"write-behind-{name}", daemon=True)
+        self._worker.start()
+
+    def submit(self, item, timeout=1.0):
+        future = Future()
+        try:
+            # Blocks the caller while the queue is full, then gives up
+            self._queue.put((item, future), timeout=timeout)
+        except queue.Full:
+            raise QueueFullError(f"{self.name} write queue is full")
+        return future
+
+    def qsize(self):
+        return self._queue.qsize()
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            items = [item for item, _ in batch]
+            futures = [future for _, future in batch]
+
+            try:
+                results = self.flush_batch(items)
+            except Exception as e:
+                if len(batch) == 1:
+                    futures[0].set_exception(e)
+                    continue
+                # One bad row must not fail everyone else's insert, so retry
+                # the batch row by row to find it
+                for item, future in batch:
+                    try:
+                        future.set_result(self.flush_batch([item])[0])
+                    except Exception as row_error:
+                        future.set_exception(row_error)
+                continue
+
+            self.batches += 1
+            self.rows += len(items)
+            for future, result in zip(futures, results):
+                future.set_result(result)